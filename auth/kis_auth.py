@@ -1,6 +1,12 @@
 import requests
 import os
 import json
+import time
+import asyncio
+import hashlib
+import threading
+import weakref
+import httpx
 from datetime import datetime
 from dotenv import load_dotenv
 import logging
@@ -15,6 +21,21 @@ DOMAIN = "https://openapi.koreainvestment.com:9443"
 
 # 토큰 캐시 파일 경로 (프로젝트 루트에 저장)
 TOKEN_CACHE_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.kis_token_cache.json')
+# 여러 프로세스(웹 워커/백그라운드 워커)가 동시에 재발급하지 않도록 하는 락 파일
+TOKEN_LOCK_FILE = TOKEN_CACHE_FILE + '.lock'
+TOKEN_LOCK_STALE_SEC = 30  # 락을 잡은 프로세스가 죽은 경우 이 시간이 지나면 락 무시
+
+# 만료 판단 여유 (이 시간 안쪽이면 만료된 것으로 간주)
+TOKEN_EXPIRY_MARGIN_SEC = 5 * 60
+# 만료 이 시간 전부터 백그라운드에서 미리 재발급 (요청 경로는 기다리지 않음)
+TOKEN_REFRESH_MARGIN_SEC = int(os.getenv('KIS_TOKEN_REFRESH_MARGIN', '1800'))
+TOKEN_REFRESH_RETRY_SEC = 60  # 백그라운드 재발급 실패 시 재시도 간격 (KIS 토큰 발급은 1분당 1회 제한)
+
+# 웹소켓 접속키(Approval Key) 캐시 파일 (앱키별로 저장, 여러 프로세스가 공유)
+APPROVAL_CACHE_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.kis_approval_cache.json')
+APPROVAL_KEY_TTL_SEC = 23 * 60 * 60  # 접속키 유효기간 24시간 (1시간 여유)
+# 여러 프로세스(피드/웹 워커)가 동시에 접속키를 발급하지 않도록 하는 락 파일 (토큰과 같은 방식)
+APPROVAL_LOCK_FILE = APPROVAL_CACHE_FILE + '.lock'
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -37,30 +58,33 @@ def _load_cached_token():
 
 
 def _save_token_cache(token_data):
-    """토큰 정보를 캐시 파일에 저장"""
+    """토큰 정보를 캐시 파일에 저장 (임시 파일에 쓴 뒤 교체하여 다른 프로세스가 쓰다 만 파일을 읽지 않도록 함)"""
     try:
-        with open(TOKEN_CACHE_FILE, 'w', encoding='utf-8') as f:
+        tmp_path = f"{TOKEN_CACHE_FILE}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
             json.dump(token_data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, TOKEN_CACHE_FILE)
         logger.info(f"Token cached to {TOKEN_CACHE_FILE}")
     except Exception as e:
         logger.warning(f"Failed to save token cache: {e}")
 
 
-def _is_token_expired(token_data):
-    """토큰이 만료되었는지 확인 (5분 여유를 둠)"""
+def _expiry_timestamp(token_data):
+    """토큰 만료 시각 (epoch seconds). 파싱 실패 시 0"""
     if not token_data or 'access_token_token_expired' not in token_data:
-        return True
+        return 0.0
     try:
         # 만료 시간 형식: "2025-12-23 23:30:43"
-        expired_str = token_data['access_token_token_expired']
-        expired_dt = datetime.strptime(expired_str, "%Y-%m-%d %H:%M:%S")
-        # 5분 여유를 두고 만료 판단
-        from datetime import timedelta
-        now = datetime.now()
-        return now >= (expired_dt - timedelta(minutes=5))
+        expired_dt = datetime.strptime(token_data['access_token_token_expired'], "%Y-%m-%d %H:%M:%S")
+        return expired_dt.timestamp()
     except Exception as e:
         logger.warning(f"Failed to parse expiration time: {e}")
-        return True
+        return 0.0
+
+
+def _is_token_expired(token_data):
+    """토큰이 만료되었는지 확인 (5분 여유를 둠)"""
+    return time.time() >= _expiry_timestamp(token_data) - TOKEN_EXPIRY_MARGIN_SEC
 
 
 def get_approval_key(appkey=APP_KEY, appsecret=APP_SECRET):
@@ -86,6 +110,141 @@ def get_approval_key(appkey=APP_KEY, appsecret=APP_SECRET):
     return None
 
 
+_approval_keys = {}  # 캐시 ID -> {"approval_key": ..., "expires_at": epoch}
+_approval_locks = weakref.WeakKeyDictionary()  # event loop -> {캐시 ID: asyncio.Lock}
+
+
+def _approval_cache_id(appkey):
+    # 앱키 원문을 파일에 남기지 않도록 해시로 구분
+    return hashlib.sha256(appkey.encode()).hexdigest()[:16]
+
+
+def _load_approval_cache():
+    if not os.path.exists(APPROVAL_CACHE_FILE):
+        return {}
+    try:
+        with open(APPROVAL_CACHE_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        logger.warning(f"Failed to load approval key cache: {e}")
+        return {}
+
+
+def _save_approval_cache(entries):
+    try:
+        tmp_path = f"{APPROVAL_CACHE_FILE}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entries, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, APPROVAL_CACHE_FILE)
+    except Exception as e:
+        logger.warning(f"Failed to save approval key cache: {e}")
+
+
+def _cached_approval_key(cache_id, use_file=True):
+    """메모리 -> 캐시 파일 순으로 유효한 접속키 조회. 없으면 None"""
+    entry = _approval_keys.get(cache_id)
+    if use_file and (entry is None or time.time() >= entry.get('expires_at', 0)):
+        entry = _load_approval_cache().get(cache_id)
+        if entry:
+            _approval_keys[cache_id] = entry
+    if entry and time.time() < entry.get('expires_at', 0):
+        return entry['approval_key']
+    return None
+
+
+def invalidate_approval_key(appkey=None, approval_key=None):
+    """
+    KIS가 접속키를 거부한 경우 호출: 메모리/파일 캐시에서 제거하여 다음 연결 시 재발급
+    approval_key를 주면 캐시된 키가 그 키일 때만 제거 (다른 프로세스가 이미 새로 발급한 키는 유지)
+    """
+    cache_id = _approval_cache_id(appkey or APP_KEY)
+
+    def _matches(entry):
+        return entry is not None and (approval_key is None or entry.get('approval_key') == approval_key)
+
+    if _matches(_approval_keys.get(cache_id)):
+        _approval_keys.pop(cache_id, None)
+    entries = _load_approval_cache()
+    if _matches(entries.get(cache_id)):
+        entries.pop(cache_id)
+        _save_approval_cache(entries)
+
+
+async def invalidate_approval_key_async(appkey=None, approval_key=None):
+    """invalidate_approval_key의 비동기 버전 (캐시 파일 I/O를 스레드에서 실행)"""
+    await asyncio.to_thread(invalidate_approval_key, appkey, approval_key)
+
+
+async def _fetch_approval_key_async(appkey, appsecret):
+    url = f"{DOMAIN}/oauth2/Approval"
+    payload = {
+        "grant_type": "client_credentials",
+        "appkey": appkey,
+        "secretkey": appsecret
+    }
+    try:
+        async with httpx.AsyncClient() as client:
+            r = await client.post(url, json=payload, headers={"Content-Type": "application/json"}, timeout=10)
+        if r.status_code == 200:
+            return r.json().get("approval_key")
+    except Exception as e:
+        logger.warning(f"Approval Key Error: {e}")
+    return None
+
+
+async def get_approval_key_async(appkey=None, appsecret=None):
+    """
+    웹소켓 접속키 반환 (비동기). 유효기간 동안 메모리/파일에 캐시하여 재연결 시 재발급 없이 바로 사용한다.
+    같은 앱키로 동시에 요청하면 1회만 발급받는다. (프로세스 내: asyncio.Lock / 프로세스 간: 락 파일)
+    :return: approval_key (str) or None
+    """
+    appkey = appkey or APP_KEY
+    appsecret = appsecret or APP_SECRET
+    cache_id = _approval_cache_id(appkey)
+
+    approval_key = _cached_approval_key(cache_id, use_file=False)
+    if approval_key:
+        return approval_key
+
+    locks = _approval_locks.setdefault(asyncio.get_running_loop(), {})
+    async with locks.setdefault(cache_id, asyncio.Lock()):
+        # 다른 세션/프로세스가 이미 발급했는지 확인
+        approval_key = await asyncio.to_thread(_cached_approval_key, cache_id)
+        if approval_key:
+            return approval_key
+
+        # 다른 프로세스가 발급 중이면 락이 풀리거나(오래된 락은 무시) 캐시 파일에 키가 생길 때까지 대기
+        while not await asyncio.to_thread(_acquire_process_lock, APPROVAL_LOCK_FILE):
+            await asyncio.sleep(0.5)
+            approval_key = await asyncio.to_thread(_cached_approval_key, cache_id)
+            if approval_key:
+                return approval_key
+
+        try:
+            # 락을 기다리는 사이 다른 프로세스가 이미 발급했을 수 있음
+            approval_key = await asyncio.to_thread(_cached_approval_key, cache_id)
+            if approval_key:
+                return approval_key
+
+            approval_key = await _fetch_approval_key_async(appkey, appsecret)
+            if not approval_key:
+                return None
+
+            entry = {"approval_key": approval_key, "expires_at": time.time() + APPROVAL_KEY_TTL_SEC}
+            _approval_keys[cache_id] = entry
+
+            def _persist():
+                entries = _load_approval_cache()
+                entries[cache_id] = entry
+                _save_approval_cache(entries)
+
+            await asyncio.to_thread(_persist)
+            logger.info("New approval key issued and cached")
+            return approval_key
+        finally:
+            await asyncio.to_thread(_release_process_lock, APPROVAL_LOCK_FILE)
+
+
 def _fetch_new_access_token(appkey=None, appsecret=None):
     """
     새로운 access token을 서버에서 발급받음 (내부용)
@@ -107,11 +266,140 @@ def _fetch_new_access_token(appkey=None, appsecret=None):
     return None
 
 
-def get_access_token(appkey=None, appsecret=None, force_refresh=False):
-    global _cached_token_logged
+class _TokenHolder:
+    """
+    프로세스 내 Access Token 보관소.
+    만료 시각을 미리 계산해 두어, 유효한 동안은 파일 I/O/JSON 파싱/strptime 없이 메모리에서 바로 반환한다.
+    """
+    def __init__(self):
+        self.token_data = None
+        self.expires_at = 0.0
+        self.lock = threading.Lock()  # 동기 재발급 (토큰이 없거나 만료된 경우)
+        self.refresh_lock = threading.Lock()  # 백그라운드 재발급 중복 방지
+        self.next_refresh_at = 0.0
+
+    def set(self, token_data):
+        self.token_data = token_data
+        self.expires_at = _expiry_timestamp(token_data)
+
+    def remaining(self):
+        return self.expires_at - time.time()
+
+
+_token_holder = _TokenHolder()
+
 
+def _acquire_process_lock(lock_file=None):
+    """파일 락 획득 (O_EXCL 생성은 OS 공통 원자 연산). 실패 시 False"""
+    lock_file = lock_file or TOKEN_LOCK_FILE
+    try:
+        fd = os.open(lock_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        os.close(fd)
+        return True
+    except FileExistsError:
+        try:
+            if time.time() - os.path.getmtime(lock_file) > TOKEN_LOCK_STALE_SEC:
+                os.remove(lock_file)
+                return _acquire_process_lock(lock_file)
+        except OSError:
+            pass
+        return False
+    except OSError as e:
+        logger.warning(f"Failed to create lock {lock_file}: {e}")
+        return True  # 락 파일을 만들 수 없는 환경이면 락 없이 진행
+
+
+def _release_process_lock(lock_file=None):
+    try:
+        os.remove(lock_file or TOKEN_LOCK_FILE)
+    except OSError:
+        pass
+
+
+def _is_fresh(token_data):
+    """백그라운드 재발급이 필요 없을 만큼 만료까지 여유가 있는지"""
+    return time.time() < _expiry_timestamp(token_data) - TOKEN_REFRESH_MARGIN_SEC
+
+
+def _issue_token(appkey, appsecret, force_refresh=False, wait=True):
+    """
+    프로세스 간 락을 잡고 새 토큰을 발급받아 캐시 파일에 저장.
+    다른 프로세스가 이미 재발급 중이면 발급하지 않고 그 결과(캐시 파일)를 기다린다. (wait=False면 바로 반환)
     """
-    Access Token을 반환. 캐시된 토큰이 유효하면 재사용하고, 만료되었으면 새로 발급.
+    if _acquire_process_lock():
+        try:
+            # 락을 기다리는 사이 다른 프로세스가 이미 재발급했을 수 있음
+            if not force_refresh:
+                cached = _load_cached_token()
+                if _is_fresh(cached):
+                    return cached
+
+            new_token = _fetch_new_access_token(appkey, appsecret)
+            if new_token:
+                _save_token_cache(new_token)
+            return new_token
+        finally:
+            _release_process_lock()
+
+    logger.info("Another process is refreshing the token, waiting...")
+    deadline = time.time() + (TOKEN_LOCK_STALE_SEC if wait else 0)
+    while True:
+        cached = _load_cached_token()
+        if _is_fresh(cached) or time.time() >= deadline:
+            return cached if not _is_token_expired(cached) else None
+        time.sleep(0.5)
+
+
+def _refresh_in_background(appkey, appsecret):
+    holder = _token_holder
+    try:
+        new_token = _issue_token(appkey, appsecret, wait=False)
+        if new_token and _expiry_timestamp(new_token) > holder.expires_at:
+            holder.set(new_token)
+            logger.info(f"Access token refreshed in background, expires: {new_token.get('access_token_token_expired')}")
+    except Exception as e:
+        logger.warning(f"Background token refresh error: {e}")
+    finally:
+        holder.refresh_lock.release()
+
+
+def _schedule_background_refresh(appkey, appsecret):
+    holder = _token_holder
+    if time.time() < holder.next_refresh_at or not holder.refresh_lock.acquire(blocking=False):
+        return
+    holder.next_refresh_at = time.time() + TOKEN_REFRESH_RETRY_SEC
+    threading.Thread(
+        target=_refresh_in_background, args=(appkey, appsecret), name="kis-token-refresh", daemon=True
+    ).start()
+
+
+def _memory_token(appkey, appsecret):
+    """메모리에 유효한 토큰이 있으면 반환 (만료 임박 시 백그라운드 재발급 예약). 없으면 None"""
+    remaining = _token_holder.remaining()
+    if remaining > TOKEN_EXPIRY_MARGIN_SEC:
+        if remaining < TOKEN_REFRESH_MARGIN_SEC:
+            _schedule_background_refresh(appkey, appsecret)
+        return _token_holder.token_data
+    return None
+
+
+async def get_access_token_async(appkey=None, appsecret=None, force_refresh=False):
+    """
+    get_access_token의 비동기 버전.
+    메모리 토큰은 바로 반환하고, 캐시 파일 확인/발급/다른 프로세스의 발급 대기는 스레드에서 실행하여
+    이벤트 루프(Consumer/시세 피드)를 막지 않는다.
+    """
+    if not force_refresh:
+        token_data = _memory_token(appkey, appsecret)
+        if token_data:
+            return token_data
+    return await asyncio.to_thread(get_access_token, appkey, appsecret, force_refresh)
+
+
+def get_access_token(appkey=None, appsecret=None, force_refresh=False):
+    """
+    Access Token을 반환. 메모리에 유효한 토큰이 있으면 그대로 반환하고 (만료 임박 시 백그라운드 재발급 예약),
+    없거나 만료되었으면 캐시 파일 확인 후 새로 발급.
     
     Args:
         appkey: 앱키 (기본값: .env에서 로드)
@@ -121,26 +409,38 @@ def get_access_token(appkey=None, appsecret=None, force_refresh=False):
     Returns:
         dict: 토큰 정보 {'access_token': ..., 'access_token_token_expired': ..., ...}
     """
-    # 1. 강제 갱신이 아니면 캐시 확인
+    global _cached_token_logged
+    holder = _token_holder
+
+    # 1. Hot path: 메모리 토큰 (I/O 없음)
     if not force_refresh:
-        cached = _load_cached_token()
-        if cached and not _is_token_expired(cached):
-            if not _cached_token_logged:
-                logger.info(f"Using cached token (expires: {cached.get('access_token_token_expired')})")
-                _cached_token_logged = True
-            return cached
-        elif cached:
-            logger.info("Cached token expired, fetching new one...")
-        else:
-            logger.info("No cached token found, fetching new one...")
-    
-    # 2. 새 토큰 발급
-    new_token = _fetch_new_access_token(appkey, appsecret)
-    if new_token:
-        _save_token_cache(new_token)
-        return new_token
-    
-    return None
+        token_data = _memory_token(appkey, appsecret)
+        if token_data:
+            return token_data
+
+    with holder.lock:
+        # 락을 기다리는 사이 다른 스레드가 이미 갱신했는지 재확인
+        if not force_refresh and holder.remaining() > TOKEN_EXPIRY_MARGIN_SEC:
+            return holder.token_data
 
+        # 2. 강제 갱신이 아니면 캐시 파일 확인 (다른 프로세스가 발급한 토큰 공유)
+        if not force_refresh:
+            cached = _load_cached_token()
+            if cached and not _is_token_expired(cached):
+                if not _cached_token_logged:
+                    logger.info(f"Using cached token (expires: {cached.get('access_token_token_expired')})")
+                    _cached_token_logged = True
+                holder.set(cached)
+                return cached
+            elif cached:
+                logger.info("Cached token expired, fetching new one...")
+            else:
+                logger.info("No cached token found, fetching new one...")
 
+        # 3. 새 토큰 발급
+        new_token = _issue_token(appkey, appsecret, force_refresh=force_refresh)
+        if new_token:
+            holder.set(new_token)
+            return new_token
 
+    return None
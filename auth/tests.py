@@ -1,8 +1,14 @@
 
 from django.test import TestCase
 from .kis_auth import get_access_token, get_approval_key
+from . import kis_auth
+from datetime import datetime, timedelta
+import os
+import time
+import asyncio
+import tempfile
 import unittest
-from unittest.mock import patch
+from unittest.mock import patch, AsyncMock
 class KISAuthTokenTest(TestCase):
     def test_get_approval_key(self):
         """
@@ -73,3 +79,137 @@ class KISAuthTokenTest(TestCase):
         result = get_access_token(force_refresh=True)
         self.assertIsNone(result, "Should return None on API failure")
         print("[TEST] Access Token 발급 실패 처리 확인완료")
+
+
+class KISTokenHolderTest(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        cache_file = os.path.join(self.tmpdir.name, 'token.json')
+        patcher_file = patch.object(kis_auth, 'TOKEN_CACHE_FILE', cache_file)
+        patcher_lock = patch.object(kis_auth, 'TOKEN_LOCK_FILE', cache_file + '.lock')
+        patcher_holder = patch.object(kis_auth, '_token_holder', kis_auth._TokenHolder())
+        for patcher in (patcher_file, patcher_lock, patcher_holder):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def _token(self, name, expires_in):
+        expired = (datetime.now() + expires_in).strftime("%Y-%m-%d %H:%M:%S")
+        return {"access_token": name, "access_token_token_expired": expired}
+
+    def test_memory_token_skips_file_io(self):
+        """
+        [Auth] 메모리에 유효한 토큰이 있으면 캐시 파일을 읽지 않고 바로 반환하는지 테스트
+        """
+        kis_auth._token_holder.set(self._token("memory", timedelta(hours=5)))
+
+        with patch.object(kis_auth, '_load_cached_token') as mock_load:
+            result = get_access_token()
+
+        mock_load.assert_not_called()
+        self.assertEqual(result["access_token"], "memory")
+        print("[TEST] 메모리 토큰 Hot Path 확인")
+
+    def test_refreshes_in_background_before_expiry(self):
+        """
+        [Auth] 만료가 임박하면 기존 토큰을 즉시 반환하고, 백그라운드에서 새 토큰을 발급받는지 테스트
+        """
+        kis_auth._token_holder.set(self._token("old", timedelta(minutes=20)))
+
+        with patch.object(kis_auth, '_fetch_new_access_token', return_value=self._token("new", timedelta(hours=24))) as mock_fetch:
+            result = get_access_token()
+            for _ in range(50):
+                if kis_auth._token_holder.token_data["access_token"] == "new":
+                    break
+                time.sleep(0.02)
+
+        self.assertEqual(result["access_token"], "old")
+        mock_fetch.assert_called_once()
+        self.assertEqual(get_access_token()["access_token"], "new")
+        self.assertFalse(os.path.exists(kis_auth.TOKEN_LOCK_FILE))
+        print("[TEST] 토큰 백그라운드 재발급 확인")
+
+    def test_async_cold_path_does_not_block_event_loop(self):
+        """
+        [Auth] 토큰이 없을 때 비동기 조회가 발급/락 대기를 스레드에서 처리해 이벤트 루프를 막지 않는지 테스트
+        """
+        def slow_issue(appkey, appsecret, force_refresh=False, wait=True):
+            time.sleep(0.3)  # 다른 프로세스의 재발급을 기다리는 상황
+            return self._token("issued", timedelta(hours=24))
+
+        async def scenario():
+            ticks = 0
+
+            async def ticker():
+                nonlocal ticks
+                while True:
+                    await asyncio.sleep(0.01)
+                    ticks += 1
+
+            task = asyncio.create_task(ticker())
+            token = await kis_auth.get_access_token_async()
+            task.cancel()
+            return token, ticks
+
+        with patch.object(kis_auth, '_issue_token', side_effect=slow_issue):
+            token, ticks = asyncio.run(scenario())
+
+        self.assertEqual(token["access_token"], "issued")
+        self.assertGreater(ticks, 10)
+        print("[TEST] 비동기 토큰 발급 논블로킹 확인")
+
+
+class KISApprovalKeyCacheTest(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        cache_file = os.path.join(self.tmpdir.name, 'approval.json')
+        patcher_file = patch.object(kis_auth, 'APPROVAL_CACHE_FILE', cache_file)
+        patcher_lock = patch.object(kis_auth, 'APPROVAL_LOCK_FILE', cache_file + '.lock')
+        patcher_memory = patch.object(kis_auth, '_approval_keys', {})
+        for patcher in (patcher_file, patcher_lock, patcher_memory):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(self.tmpdir.cleanup)
+
+    @patch('auth.kis_auth._fetch_approval_key_async', new_callable=AsyncMock, return_value="approval-1")
+    def test_approval_key_cached_and_shared(self, mock_fetch):
+        """
+        [Auth] 동시 요청 시 접속키를 1회만 발급받고, 다른 프로세스(메모리 비움)는 파일 캐시를 재사용하는지 테스트
+        """
+        async def scenario():
+            return await asyncio.gather(*(kis_auth.get_approval_key_async("appkey", "secret") for _ in range(3)))
+
+        self.assertEqual(asyncio.run(scenario()), ["approval-1"] * 3)
+
+        kis_auth._approval_keys.clear()
+        self.assertEqual(asyncio.run(kis_auth.get_approval_key_async("appkey", "secret")), "approval-1")
+        mock_fetch.assert_awaited_once()
+
+        kis_auth.invalidate_approval_key("appkey")
+        asyncio.run(kis_auth.get_approval_key_async("appkey", "secret"))
+        self.assertEqual(mock_fetch.await_count, 2)
+        print("[TEST] 접속키 캐시 확인")
+
+    @patch('auth.kis_auth._fetch_approval_key_async', new_callable=AsyncMock, return_value="approval-mine")
+    def test_waits_for_other_process_issuing_approval_key(self, mock_fetch):
+        """
+        [Auth] 다른 프로세스가 접속키 발급 락을 잡고 있으면 발급하지 않고 그 프로세스가 저장한 키를 사용하는지 테스트
+        """
+        self.assertTrue(kis_auth._acquire_process_lock(kis_auth.APPROVAL_LOCK_FILE))  # 다른 프로세스가 발급 중
+
+        async def scenario():
+            waiter = asyncio.create_task(kis_auth.get_approval_key_async("appkey", "secret"))
+            await asyncio.sleep(0.2)
+            entry = {"approval_key": "approval-other", "expires_at": time.time() + 3600}
+            kis_auth._save_approval_cache({kis_auth._approval_cache_id("appkey"): entry})
+            kis_auth._release_process_lock(kis_auth.APPROVAL_LOCK_FILE)
+            return await waiter
+
+        self.assertEqual(asyncio.run(scenario()), "approval-other")
+        mock_fetch.assert_not_awaited()
+
+        # 이미 다른 키로 바뀐 뒤 도착한 이전 키 거부는 새 키를 지우지 않음
+        kis_auth.invalidate_approval_key("appkey", approval_key="approval-stale")
+        self.assertEqual(asyncio.run(kis_auth.get_approval_key_async("appkey", "secret")), "approval-other")
+        self.assertFalse(os.path.exists(kis_auth.APPROVAL_LOCK_FILE))
+        print("[TEST] 프로세스 간 접속키 발급 락 확인")
@@ -0,0 +1,70 @@
+"""
+KIS 실시간 프레임 디코딩 마이크로 벤치마크
+
+기존 경로 (parse_from_raw + Serializer is_valid/.data) 와
+고속 디코더 (kis_decoder.decode_frame) 의 처리 시간을 비교한다.
+
+실행: python bench_kis_decoder.py [반복 횟수]
+"""
+import os
+import sys
+import time
+import django
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+django.setup()
+
+from stock_price.services.kis_decoder import decode_frame, validate_frame
+
+# 장중 수집한 프레임 (체결 H0STCNT0 / 호가 H0UNASP0)
+RECORDED_FRAMES = [
+    "0|H0STCNT0|001|005930^093012^71500^2^500^0.70^71423.55^71000^71800^70900^71600^71500^15^4528113^323511982000"
+    "^10211^12877^2666^112.34^1983001^2227789^1^52.91^38.12^090000^2^500^090412^5^-300^090001^2^600^20260105^20^N"
+    "^35112^48113^1211008^1398112^0.08^11874411^38.14^0^0^71000",
+    "0|H0STCNT0|001|000660^093012^182300^2^3300^1.84^181990.10^180000^183000^179800^182400^182300^3^1221845^222371004500"
+    "^6511^7012^501^104.21^581234^605988^5^51.04^41.22^090000^2^2300^091125^5^-700^090003^2^2500^20260105^20^N"
+    "^2113^1877^301455^288710^0.17^2964301^41.21^0^0^180000",
+    "0|H0UNASP0|001|005930^093012^0^71600^71700^71800^71900^72000^72100^72200^72300^72400^72500^71500^71400^71300"
+    "^71200^71100^71000^70900^70800^70700^70600^35112^41211^51877^38121^62110^30122^21877^18233^41022^27711^48113"
+    "^51211^44122^39871^60112^28771^31244^19877^22101^30011^366106^375339^0^0^0^0^0^0^2^0.00^4528113^-1211^2312"
+    "^0^0^0^71550^1211^1^0^0^",
+    "0|H0UNASP0|001|000660^093012^0^182400^182500^182600^182700^182800^182900^183000^183100^183200^183300^182300"
+    "^182200^182100^182000^181900^181800^181700^181600^181500^181400^2113^3011^4122^2877^3312^1987^2211^4011^1877"
+    "^3561^1877^2766^3012^2544^4011^3121^1988^2871^1543^2011^29071^25734^0^0^0^0^0^0^2^0.00^1221845^-301^122^0^0^0"
+    "^182350^211^2^0^0^",
+]
+
+
+def _run(label, func, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for frame in RECORDED_FRAMES:
+            func(frame)
+    elapsed = time.perf_counter() - start
+    total = iterations * len(RECORDED_FRAMES)
+    print(f"{label:<24} {elapsed:8.3f}s  ({elapsed / total * 1e6:8.2f} us/frame)")
+    return elapsed
+
+
+def _serializer_path(frame):
+    tr_id = frame.split('|', 2)[1]
+    return validate_frame(tr_id, frame)
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+
+    # 두 경로의 결과가 동일한지 먼저 확인
+    for frame in RECORDED_FRAMES:
+        tr_id, record = decode_frame(frame)
+        assert dict(_serializer_path(frame)) == record, f"Mismatch for {tr_id}"
+
+    print(f"=== KIS Frame Decode Benchmark ({iterations} x {len(RECORDED_FRAMES)} frames) ===")
+    slow = _run("Serializer (legacy)", _serializer_path, iterations)
+    fast = _run("Fast decoder", decode_frame, iterations)
+    print(f"Speedup: x{slow / fast:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+KIS REST 클라이언트 커넥션 재사용 벤치마크
+
+로컬 Mock 서버(새 연결마다 TLS 핸드셰이크 지연을 흉내냄)를 띄우고
+기존 방식 (요청마다 httpx.AsyncClient 생성/종료) 과
+공용 커넥션 풀 (kis_rest_client) 의 요청 지연 시간을 비교한다.
+
+실행: python bench_kis_rest_client.py [요청 횟수] [핸드셰이크 지연 ms]
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import threading
+import logging
+import statistics
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import django
+import httpx
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+django.setup()
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+from stock_price.services.kis_rest_client import kis_rest_client
+from stock_price.services.kis_rate_limiter import kis_rate_limiter
+
+HANDSHAKE_DELAY = 0.03  # 실서버(openapi.koreainvestment.com:9443) TLS 핸드셰이크 대략치
+MOCK_BODY = json.dumps({"rt_cd": "0", "msg1": "OK", "output": {"stck_prpr": "71500", "prdy_ctrt": "0.70"}}).encode()
+
+
+class MockKISHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive 허용
+    disable_nagle_algorithm = True  # 헤더/바디 분할 전송 시 Nagle 지연(40ms) 방지
+
+    def setup(self):
+        # 새 TCP 연결마다 1회: TLS 핸드셰이크 왕복 비용 흉내
+        time.sleep(HANDSHAKE_DELAY)
+        super().setup()
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(MOCK_BODY)))
+        self.end_headers()
+        self.wfile.write(MOCK_BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+def _start_mock_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockKISHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def _legacy_request(url):
+    # 변경 전 코드와 동일: 요청마다 클라이언트(=연결) 생성 후 종료
+    async with httpx.AsyncClient() as client:
+        response = await client.get(url, params={"fid_input_iscd": "005930"}, timeout=10)
+        return response.json()
+
+
+async def _measure(label, func, iterations):
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        result = await func()
+        latencies.append((time.perf_counter() - start) * 1000)
+        assert result, f"{label}: empty response"
+
+    p95 = sorted(latencies)[int(len(latencies) * 0.95) - 1]
+    print(f"{label:<26} avg {statistics.mean(latencies):7.2f} ms   p95 {p95:7.2f} ms")
+    return statistics.mean(latencies)
+
+
+async def main():
+    global HANDSHAKE_DELAY
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    if len(sys.argv) > 2:
+        HANDSHAKE_DELAY = float(sys.argv[2]) / 1000
+
+    server = _start_mock_server()
+    domain = f"http://127.0.0.1:{server.server_address[1]}"
+    url = f"{domain}/uapi/domestic-stock/v1/quotations/inquire-price"
+
+    # 토큰 발급 없이 Mock 서버로 요청하도록 설정
+    kis_rest_client.domain = domain
+    kis_rest_client._get_headers = lambda tr_id, tr_cont='': {"tr_id": tr_id}
+
+    async def _headers_async(tr_id, tr_cont=''):
+        return {"tr_id": tr_id}
+    kis_rest_client._get_headers_async = _headers_async
+    # 연결 비용만 비교하기 위해 유량 제한은 해제
+    kis_rate_limiter.rate = kis_rate_limiter.burst = 10 ** 6
+
+    print(f"=== KIS REST Connection Benchmark ({iterations} requests, handshake {HANDSHAKE_DELAY * 1000:.0f} ms) ===")
+    slow = await _measure("New client per request", lambda: _legacy_request(url), iterations)
+    fast = await _measure("Pooled client (keep-alive)", lambda: kis_rest_client.get_current_price_async("005930"), iterations)
+    print(f"Speedup: x{slow / fast:.1f}")
+
+    await kis_rest_client.aclose()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,13 +1,20 @@
 import json
 import re
+import asyncio
+from urllib.parse import parse_qs
 from channels.generic.websocket import AsyncWebsocketConsumer
 from .services.kis_ws_client import kis_client
+from .services.kis_decoder import COMPACT_SCHEMA, encode_compact, record_kind
+from .services.kis_book_delta import BookDeltaEncoder, encode_compact_delta
+from .services.kis_snapshot import snapshot_store
 
 class StockConsumer(AsyncWebsocketConsumer):
     _logged_stocks = set() # 최초 1회 로그 출력 여부 확인용
 
     async def connect(self):
         self.subscribed_stocks = set()
+        self.compact = False  # True면 필드명 없는 위치 배열로 전송 (?format=compact)
+        self.book_delta = BookDeltaEncoder()  # 호가는 변경분만 전송 (주기적으로 전체 호가)
         
         # URL에서 stock_code 추출 (Optional)
         self.url_stock_code = self.scope['url_route']['kwargs'].get('stock_code')
@@ -15,6 +22,10 @@ class StockConsumer(AsyncWebsocketConsumer):
         await self.accept()
         print(f"[StockConsumer] Client connected. URL Code: {self.url_stock_code}")
 
+        query = parse_qs(self.scope.get('query_string', b'').decode())
+        if query.get('format') == ['compact']:
+            await self.enable_compact()
+
         # 1. Global Group Join (For Theme Updates)
         await self.channel_layer.group_add("theme_global", self.channel_name)
 
@@ -32,32 +43,58 @@ class StockConsumer(AsyncWebsocketConsumer):
             if isinstance(codes, str):
                 codes = [codes]
             
-            for code in codes:
-                await self.add_subscription(code)
+            await self.add_subscriptions(codes)
 
-    async def add_subscription(self, code):
-        clean_code = re.sub(r'[^0-9]', '', str(code))
-        if not clean_code: 
+        elif message_type == 'format' and data:
+            if data.get('mode') == 'compact':
+                await self.enable_compact()
+
+    async def enable_compact(self):
+        """Compact 모드 전환: 필드 스키마를 1회 전송한 뒤부터 위치 배열로 전송"""
+        if self.compact:
             return
+        self.compact = True
+        await self.send(text_data=json.dumps({"type": "schema", "fields": COMPACT_SCHEMA}))
+
+    async def add_subscription(self, code):
+        await self.add_subscriptions([code])
+
+    async def add_subscriptions(self, codes):
+        """여러 종목 일괄 구독: 그룹 가입/마스터 구독/스냅샷 조회를 종목별이 아닌 배치 단위로 처리"""
+        new_codes = []
+        for code in codes:
+            clean_code = re.sub(r'[^0-9]', '', str(code))
+            if clean_code and clean_code not in self.subscribed_stocks and clean_code not in new_codes:
+                new_codes.append(clean_code)
 
-        if clean_code in self.subscribed_stocks:
+        if not new_codes:
             return
 
-        # 1. 룸(Group) 가입
-        group_name = f"stock_{clean_code}"
-        await self.channel_layer.group_add(
-            group_name,
-            self.channel_name
-        )
+        # 1. 룸(Group) 가입 (Redis 왕복을 순차 대기하지 않고 동시에 전송)
+        await asyncio.gather(*(
+            self.channel_layer.group_add(f"stock_{code}", self.channel_name)
+            for code in new_codes
+        ))
 
-        # 2. 마스터에게 구독 요청 (실제 KIS 웹소켓 연결 관리)
-        await kis_client.subscribe(clean_code)
+        # 2. 마스터에게 일괄 구독 요청 (실제 KIS 웹소켓 연결 관리)
+        await kis_client.subscribe_many(new_codes)
 
-        self.subscribed_stocks.add(clean_code)
-        
-        if clean_code not in self._logged_stocks:
-             print(f"[StockConsumer] Subscribe requested for {clean_code}. Group: {group_name}")
-             self._logged_stocks.add(clean_code)
+        self.subscribed_stocks.update(new_codes)
+
+        # 3. 마지막 체결/호가 스냅샷 즉시 전송 (다음 틱까지 빈 화면 방지)
+        snapshots = await snapshot_store.get_many(new_codes)
+        records = [
+            snapshots[code][kind]
+            for code in new_codes if code in snapshots
+            for kind in ("exec", "book") if kind in snapshots[code]
+        ]
+        if records:
+            await self.stock_update({"type": "stock_update", "records": records})
+
+        for code in new_codes:
+            if code not in self._logged_stocks:
+                print(f"[StockConsumer] Subscribe requested for {code}. Group: stock_{code}")
+                self._logged_stocks.add(code)
 
 
     async def disconnect(self, close_code):
@@ -65,31 +102,62 @@ class StockConsumer(AsyncWebsocketConsumer):
         await self.channel_layer.group_discard("theme_global", self.channel_name)
 
         # 모든 구독 그룹에서 탈퇴
-        for code in self.subscribed_stocks:
-            group_name = f"stock_{code}"
-            await self.channel_layer.group_discard(
-                group_name,
-                self.channel_name
-            )
+        await asyncio.gather(*(
+            self.channel_layer.group_discard(f"stock_{code}", self.channel_name)
+            for code in self.subscribed_stocks
+        ))
         print(f"[StockConsumer] Client disconnected. Cleared {len(self.subscribed_stocks)} subscriptions.")
         
         # 마스터에게 구독 취소 알림 (시청자 수 감소)
-        for code in self.subscribed_stocks:
-             await kis_client.unsubscribe(code)
+        if self.subscribed_stocks:
+            await kis_client.unsubscribe_many(list(self.subscribed_stocks))
 
     async def stock_update(self, event):
         """
         StockMaster가 Redis 그룹으로 쏜 데이터를 받아서
         연결된 개별 클라이언트(브라우저)에게 전달
         """
-        if 'data' in event:
+        if 'records' in event:
+             payloads = [self._encode_record(record) for record in event['records']]
+             payloads = [payload for payload in payloads if payload is not None]
+             if not payloads:
+                 return
+             if self.compact:
+                 # [["E", ...], ["B" | "D", ...]] 형태로 한 번에 전달
+                 await self.send(text_data=json.dumps(payloads, separators=(',', ':')))
+             else:
+                 # 한 프레임에 묶여 온 여러 틱을 순서대로 전달
+                 for payload in payloads:
+                     await self.send(text_data=json.dumps(payload))
+        elif 'data' in event:
              await self.send(text_data=json.dumps(event['data']))
         else:
              await self.send(text_data=json.dumps(event))
 
+    def _encode_record(self, record):
+        """체결은 그대로, 호가는 직전 대비 변경분(delta)만 인코딩"""
+        if record_kind(record) == "B":
+            changes = self.book_delta.encode(record)
+            if changes is not None:
+                if not changes:
+                    return None  # 변경 없음 -> 전송 생략
+                code = record.get("MKSC_SHRN_ISCD")
+                if self.compact:
+                    return encode_compact_delta(code, changes)
+                return {"type": "book_delta", "code": code, "changes": changes}
+
+        return encode_compact(record) if self.compact else record
+
     async def theme_update(self, event):
         """
         ThemeSyncService가 'theme_global' 그룹으로 쏜 데이터를 전달
         """
         # event: {'type': 'theme_update', 'message': 'New theme added', 'stock': ...}
         await self.send(text_data=json.dumps(event))
+
+    async def rank_update(self, event):
+        """
+        RankChangeStream이 'theme_global' 그룹으로 쏜 순위 변동 이벤트를 전달 (Top 30 전체가 아닌 변동분만)
+        """
+        # event: {'type': 'rank_update', 'events': [{'event': 'entered', 'code': ..., 'rank': ...}, ...]}
+        await self.send(text_data=json.dumps(event))
@@ -0,0 +1,62 @@
+import asyncio
+from channels.layers import get_channel_layer
+from django.core.management.base import BaseCommand
+from stock_price.services.kis_rest_client import kis_rest_client
+from stock_price.services.kis_ws_client import build_pool, KISFeedRegistry, FEED_CHANNEL, FEED_HEARTBEAT_SEC
+from stock_price.services.trading_calendar import PHASE_PRE_OPEN
+from stock_price.services.market_session import market_session
+
+
+class Command(BaseCommand):
+    help = 'Runs the dedicated KIS real-time feed worker (owns the upstream WebSocket connection)'
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS('Starting KIS Feed Worker... 📡'))
+        self.stdout.write("Web workers must run with KIS_FEED_MODE=remote to forward subscriptions here.")
+
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+
+        try:
+            loop.run_until_complete(self.run_loop())
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('\nStopping KIS Feed Worker...'))
+        finally:
+            # 거래 달력 조회에 쓴 KIS REST 커넥션 정리 (루프를 닫으면 aclose할 수 없음)
+            loop.run_until_complete(kis_rest_client.aclose())
+            loop.close()
+
+    async def run_loop(self):
+        # 이 프로세스만 KIS 업스트림 연결을 소유하고, 디코딩된 틱은 stock_<code> 그룹으로 발행
+        pool = build_pool()
+        registry = KISFeedRegistry(pool)
+        channel_layer = get_channel_layer()
+        # 백그라운드 태스크 참조 보관 (참조가 없으면 실행 중에 GC될 수 있음)
+        self.background_tasks = [
+            asyncio.create_task(self.watch_session(pool)),
+            asyncio.create_task(self.expire_leases(registry)),
+        ]
+
+        while True:
+            message = await channel_layer.receive(FEED_CHANNEL)
+            try:
+                await registry.handle(message)
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"[KIS Feed] Failed to handle {message}: {e}"))
+
+    async def expire_leases(self, registry):
+        """하트비트가 끊긴 웹 워커의 구독 해제"""
+        while True:
+            await asyncio.sleep(FEED_HEARTBEAT_SEC)
+            try:
+                for proxy in await registry.expire():
+                    self.stdout.write(self.style.WARNING(f"[KIS Feed] Lease expired for web worker {proxy}"))
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"[KIS Feed] Lease expiry failed: {e}"))
+
+    async def watch_session(self, pool):
+        """장 운영 구간 전환 감시: 장전 동시호가 진입 시 접속키를 미리 확보해 09:00 첫 틱부터 바로 수신"""
+        async for previous, phase in market_session.transitions():
+            self.stdout.write(f"[KIS Feed] Market session: {previous} -> {phase}")
+            if phase == PHASE_PRE_OPEN:
+                await pool.prefetch_approval_keys()
@@ -0,0 +1,36 @@
+# Generated by Django 6.0 on 2026-10-18 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stock_price", "0005_remove_stockinfo_created_at_alter_stockinfo_market_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TradingDay",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "date",
+                    models.DateField(db_index=True, unique=True, verbose_name="기준일자"),
+                ),
+                ("is_open", models.BooleanField(verbose_name="개장일여부")),
+            ],
+            options={
+                "db_table": "trading_day",
+                "ordering": ["date"],
+            },
+        ),
+    ]
@@ -12,3 +12,16 @@ class StockInfo(models.Model):
 
     def __str__(self):
         return f"{self.name} ({self.short_code})"
+
+
+class TradingDay(models.Model):
+    """KIS 국내휴장일조회(chk-holiday) 결과를 날짜별로 저장한 거래 달력"""
+    date = models.DateField(unique=True, db_index=True, verbose_name='기준일자')
+    is_open = models.BooleanField(verbose_name='개장일여부')
+
+    class Meta:
+        db_table = 'trading_day'
+        ordering = ['date']
+
+    def __str__(self):
+        return f"{self.date} ({'개장' if self.is_open else '휴장'})"
@@ -0,0 +1,49 @@
+import os
+from .kis_decoder import COMPACT_SCHEMA, compact_value
+
+# 변경분(delta) 전송 중 전체 호가(keyframe)를 다시 보내는 주기 (호가 업데이트 건수 기준)
+KEYFRAME_INTERVAL = int(os.getenv('KIS_BOOK_KEYFRAME_EVERY', '50'))
+
+# StockAskingPriceResponseSerializer 필드 순서 기준 인덱스
+_BOOK_FIELD_INDEX = {name: idx for idx, name in enumerate(COMPACT_SCHEMA["B"])}
+
+
+class BookDeltaEncoder:
+    """
+    종목별 직전 호가를 기억했다가 바뀐 필드만 골라내는 인코더 (연결 1개당 1개).
+    처음 받는 종목이거나 keyframe 주기가 되면 None을 반환 -> 전체 호가를 보내야 함.
+    """
+    def __init__(self, keyframe_interval=KEYFRAME_INTERVAL):
+        self.keyframe_interval = keyframe_interval
+        self._last_books = {}  # code -> 직전 호가 레코드
+        self._since_keyframe = {}  # code -> 마지막 keyframe 이후 전송 건수
+
+    def encode(self, record):
+        """Returns: 변경된 필드 dict 또는 keyframe이 필요하면 None"""
+        code = record.get("MKSC_SHRN_ISCD")
+        last = self._last_books.get(code)
+        self._last_books[code] = record
+
+        sent = self._since_keyframe.get(code, 0)
+        if last is None or sent >= self.keyframe_interval:
+            self._since_keyframe[code] = 1
+            return None
+
+        self._since_keyframe[code] = sent + 1
+        return {name: val for name, val in record.items() if last.get(name) != val}
+
+    def reset(self, code):
+        """다음 호가를 keyframe으로 보내도록 초기화"""
+        self._last_books.pop(code, None)
+        self._since_keyframe.pop(code, None)
+
+
+def encode_compact_delta(code, changes):
+    """변경분 -> ["D", 종목코드, 필드인덱스1, 값1, 필드인덱스2, 값2, ...] (인덱스는 스키마 "B" 기준)"""
+    row = ["D", code]
+    for name, val in changes.items():
+        idx = _BOOK_FIELD_INDEX.get(name)
+        if idx is not None:
+            row.append(idx)
+            row.append(compact_value(val))
+    return row
@@ -0,0 +1,54 @@
+import os
+import asyncio
+from .kis_decoder import TR_ID_EXEC
+from .kis_snapshot import snapshot_store
+
+# 종목별 전송 주기 (ms). 0이면 병합 없이 틱마다 즉시 전송
+FLUSH_INTERVAL_MS = int(os.getenv('KIS_WS_FLUSH_MS', '200'))
+
+
+class TickConflator:
+    """
+    종목별 최신 체결/호가 스냅샷만 보관했다가 flush 주기마다 한 번에 전송하는 병합(Conflation) 단계.
+    틱이 초당 수십 건 들어와도 종목 그룹당 Redis group_send는 주기당 1회로 제한된다.
+    """
+    def __init__(self, channel_layer, interval_ms=FLUSH_INTERVAL_MS, snapshots=None):
+        self.channel_layer = channel_layer
+        self.snapshots = snapshots or snapshot_store
+        self.interval = interval_ms / 1000
+        self._pending = {}  # code -> {"exec": record, "book": record}
+        self._task = None
+
+    def push(self, tr_id, stock_code, record):
+        """최신 레코드로 덮어쓰기 (이전 미전송 틱은 버려짐)"""
+        kind = "exec" if tr_id == TR_ID_EXEC else "book"
+        self._pending.setdefault(stock_code, {})[kind] = record
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def flush(self):
+        if not self._pending:
+            return
+
+        pending, self._pending = self._pending, {}
+        for stock_code, slot in pending.items():
+            records = [slot[kind] for kind in ("exec", "book") if kind in slot]
+            await self.channel_layer.group_send(
+                f"stock_{stock_code}",
+                {"type": "stock_update", "records": records}
+            )
+
+        # 신규 구독자용 최신 스냅샷 갱신 (flush 당 Redis 1회 왕복)
+        await self.snapshots.save(pending)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"[KIS Conflator] Flush error: {e}")
+            if not self._pending:
+                # 들어오는 틱이 없으면 루프 종료 (다음 push 때 재시작)
+                break
@@ -0,0 +1,140 @@
+from rest_framework import serializers
+from ..serializers import StockResponseSerializer, StockAskingPriceResponseSerializer
+
+TR_ID_HOGA = "H0UNASP0"
+TR_ID_HOGA_ELW = "H0STASP0"
+TR_ID_EXEC = "H0STCNT0"
+
+
+def _build_field_table(serializer_class):
+    """
+    Serializer의 필드 선언 순서 = KIS 응답의 ^ 구분 인덱스 순서.
+    (필드명, 변환함수) 튜플을 미리 만들어 두어 매 틱마다 DRF를 거치지 않도록 한다.
+    """
+    table = []
+    for name, field in serializer_class._declared_fields.items():
+        cast = float if isinstance(field, serializers.FloatField) else None
+        table.append((name, cast))
+    return tuple(table)
+
+
+# TR_ID별 필드 인덱스 테이블 (모듈 import 시 1회 생성)
+FIELD_TABLES = {
+    TR_ID_EXEC: _build_field_table(StockResponseSerializer),
+    TR_ID_HOGA: _build_field_table(StockAskingPriceResponseSerializer),
+    TR_ID_HOGA_ELW: _build_field_table(StockAskingPriceResponseSerializer),
+}
+
+# 디버그(검증) 모드에서 사용할 Serializer 매핑
+SERIALIZER_CLASSES = {
+    TR_ID_EXEC: StockResponseSerializer,
+    TR_ID_HOGA: StockAskingPriceResponseSerializer,
+    TR_ID_HOGA_ELW: StockAskingPriceResponseSerializer,
+}
+
+
+def _decode_fields(table, fields):
+    """^로 분리된 값 리스트를 필드 테이블에 맞춰 dict로 변환 (parse_from_raw와 동일한 규칙)"""
+    record = {}
+    count = len(fields)
+    for idx, (name, cast) in enumerate(table):
+        if idx >= count:
+            record[name] = None
+        elif cast is None:
+            record[name] = fields[idx]
+        else:
+            try:
+                record[name] = cast(fields[idx])
+            except ValueError:
+                record[name] = None
+    return record
+
+
+def iter_records(raw_data):
+    """
+    0|H0STCNT0|003|005930^...^005930^... 형태의 실시간 프레임을 DRF 없이 바로 디코딩한다.
+    parts[2]의 데이터 건수만큼 레코드를 순서대로 yield 한다. (부하 시 여러 틱이 한 프레임에 묶여 옴)
+    Yields: (tr_id, record dict)
+    """
+    parts = raw_data.split('|', 3)
+    if len(parts) < 4:
+        return
+
+    tr_id = parts[1]
+    table = FIELD_TABLES.get(tr_id)
+    if table is None or not parts[3]:
+        return
+
+    try:
+        count = max(int(parts[2]), 1)
+    except ValueError:
+        count = 1
+
+    fields = parts[3].split('^')
+    width = len(table)
+    for idx in range(count):
+        chunk = fields[idx * width:(idx + 1) * width]
+        if not chunk:
+            break
+        yield tr_id, _decode_fields(table, chunk)
+
+
+def decode_frame(raw_data):
+    """
+    프레임의 첫 번째 레코드만 디코딩한다.
+    Returns: (tr_id, record dict) 또는 처리 대상이 아니면 None
+    """
+    return next(iter_records(raw_data), None)
+
+
+def validate_frame(tr_id, raw_data):
+    """
+    (디버그용) 기존 parse_from_raw + Serializer 검증 경로. 첫 번째 레코드만 처리한다.
+    Returns: serializer.data 또는 검증 실패 시 None
+    """
+    serializer_class = SERIALIZER_CLASSES.get(tr_id)
+    if serializer_class is None:
+        return None
+
+    return validate_record(tr_id, serializer_class.parse_from_raw(raw_data))
+
+
+def validate_record(tr_id, record):
+    """
+    (디버그용) 디코딩된 레코드 1건을 Serializer로 검증한다.
+    Returns: serializer.data 또는 검증 실패 시 None
+    """
+    serializer_class = SERIALIZER_CLASSES.get(tr_id)
+    if serializer_class is None or not record:
+        return None
+
+    serializer = serializer_class(data=record)
+    if not serializer.is_valid():
+        print(f"[KIS Decoder] Validation failed for {tr_id}: {serializer.errors}")
+        return None
+    return serializer.data
+
+
+# Compact(위치 배열) 전송 모드 스키마: 레코드 종류("E": 체결, "B": 호가) -> 필드명 순서
+COMPACT_SCHEMA = {
+    "E": [name for name, _ in FIELD_TABLES[TR_ID_EXEC]],
+    "B": [name for name, _ in FIELD_TABLES[TR_ID_HOGA]],
+}
+
+
+def compact_value(val):
+    # 71500.0 -> 71500 (정수 값은 소수점 없이 전송하여 크기 절감)
+    if isinstance(val, float) and val.is_integer():
+        return int(val)
+    return val
+
+
+def record_kind(record):
+    """"E": 체결 레코드, "B": 호가 레코드"""
+    return "E" if "STCK_CNTG_HOUR" in record else "B"
+
+
+def encode_compact(record):
+    """레코드 dict -> ["E"|"B", 값1, 값2, ...] (필드명 없이 스키마 순서대로)"""
+    kind = record_kind(record)
+    return [kind] + [compact_value(record.get(name)) for name in COMPACT_SCHEMA[kind]]
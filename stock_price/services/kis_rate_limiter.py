@@ -0,0 +1,35 @@
+import os
+from .rate_limiter import TokenBucketRateLimiter
+
+# 초당 요청 수 (KIS 실전계좌 유량 한도 초당 20건 / 모의투자 2건 -> 여유분을 두고 설정)
+RATE_PER_SEC = float(os.getenv('KIS_REST_RATE_PER_SEC', '18'))
+# 순간 허용 요청 수 (버킷 크기). 기본은 1초 분량
+BURST = int(os.getenv('KIS_REST_BURST', str(max(int(RATE_PER_SEC), 1))))
+# 동시에 진행 중인 요청 수 상한
+MAX_CONCURRENCY = int(os.getenv('KIS_REST_CONCURRENCY', '10'))
+# 유량 초과/일시적 네트워크 오류 시 재시도 횟수
+MAX_RETRIES = int(os.getenv('KIS_REST_MAX_RETRIES', '3'))
+
+# KIS 유량 초과 응답 코드 ("초당 거래건수를 초과하였습니다.")
+RATE_LIMIT_MSG_CD = "EGW00201"
+
+
+class KISRateLimiter(TokenBucketRateLimiter):
+    """
+    KIS REST 호출 공용 유량 제어기 (프로세스당 1개, 모든 KISRestClient 메서드가 경유)
+    429 외에 HTTP 200/500 본문의 EGW00201(초당 거래건수 초과)도 유량 초과로 보고 재시도한다.
+    """
+    def __init__(self, rate=RATE_PER_SEC, burst=BURST, concurrency=MAX_CONCURRENCY, max_retries=MAX_RETRIES):
+        super().__init__(rate, burst, concurrency, max_retries, name="KIS")
+
+    def is_rate_limited(self, response):
+        if response.status_code == 429:
+            return True
+        try:
+            return response.json().get('msg_cd') == RATE_LIMIT_MSG_CD
+        except ValueError:
+            return False
+
+
+# 프로세스당 1개 (KIS 유량 한도는 앱키 단위이므로 모든 호출이 공유)
+kis_rate_limiter = KISRateLimiter()
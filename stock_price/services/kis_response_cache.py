@@ -0,0 +1,80 @@
+import os
+import time
+import json
+import asyncio
+import hashlib
+import weakref
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+
+# 순위 API 응답 캐시 유지 시간 (초). 동시 접속/워커가 같은 순위를 중복 요청하지 않도록 짧게 유지
+RANK_CACHE_TTL = float(os.getenv('KIS_RANK_CACHE_TTL', '5'))
+
+
+class KISResponseCache:
+    """
+    KIS REST 응답 단기 캐시 (TR_ID + 파라미터 기준)
+    - 메모리: 같은 프로세스 내 즉시 조회
+    - Redis (Django cache): 웹 워커/run_theme_sync 워커 간 공유
+    - Single-flight: 캐시 미스 시 동시에 들어온 요청은 하나의 업스트림 요청 결과를 함께 기다린다.
+    """
+    KEY_PREFIX = "kis:rest:"
+
+    def __init__(self, ttl=RANK_CACHE_TTL):
+        self.ttl = ttl
+        self._memory = {}  # key -> (만료 시각, 응답)
+        self._inflight = weakref.WeakKeyDictionary()  # event loop -> {key: Task}
+
+    @classmethod
+    def make_key(cls, tr_id, params):
+        digest = hashlib.md5(json.dumps(params, sort_keys=True).encode()).hexdigest()
+        return f"{cls.KEY_PREFIX}{tr_id}:{digest}"
+
+    async def get_or_fetch(self, key, fetch, force_refresh=False):
+        """
+        Args:
+            key: make_key()로 만든 캐시 키
+            fetch: 캐시 미스 시 호출할 코루틴 함수 (None을 반환하면 캐시하지 않음)
+            force_refresh: True면 캐시를 무시하고 업스트림 조회 후 캐시 갱신 (워커의 캐시 워밍용)
+        """
+        if not force_refresh:
+            entry = self._memory.get(key)
+            if entry and entry[0] > time.monotonic():
+                return entry[1]
+
+        inflight = self._inflight.setdefault(asyncio.get_running_loop(), {})
+        task = None if force_refresh else inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._load(key, fetch, force_refresh))
+            inflight[key] = task
+            task.add_done_callback(lambda done: inflight.pop(key) if inflight.get(key) is done else None)
+
+        # 한 호출자가 취소되어도 공유 중인 요청은 계속 진행
+        return await asyncio.shield(task)
+
+    async def _load(self, key, fetch, force_refresh):
+        if not force_refresh:
+            try:
+                value = await sync_to_async(cache.get)(key)
+            except Exception as e:
+                print(f"[KIS Cache] Redis get error: {e}")
+                value = None
+            if value is not None:
+                self._memory[key] = (time.monotonic() + self.ttl, value)
+                return value
+
+        value = await fetch()
+        if value is not None:
+            await self.set(key, value)
+        return value
+
+    async def set(self, key, value):
+        self._memory[key] = (time.monotonic() + self.ttl, value)
+        try:
+            await sync_to_async(cache.set)(key, value, self.ttl)
+        except Exception as e:
+            print(f"[KIS Cache] Redis set error: {e}")
+
+
+# 프로세스당 1개
+kis_response_cache = KISResponseCache()
@@ -1,26 +1,96 @@
 import httpx
 import os
+import atexit
 import asyncio
-from auth.kis_auth import get_access_token
+import importlib.util
+import weakref
+from auth.kis_auth import get_access_token, get_access_token_async
+from .kis_rate_limiter import kis_rate_limiter
+from .kis_response_cache import kis_response_cache
 from dotenv import load_dotenv
 
 # .env 로드
 env_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), '.env')
 load_dotenv(dotenv_path=env_path)
 
+# 커넥션 풀 설정 (요청마다 TLS 핸드셰이크를 새로 하지 않도록 연결을 유지/재사용)
+HTTP_MAX_CONNECTIONS = int(os.getenv('KIS_HTTP_MAX_CONNECTIONS', '20'))
+HTTP_KEEPALIVE_SEC = float(os.getenv('KIS_HTTP_KEEPALIVE_SEC', '30'))
+# 1이면 HTTP/2 사용 (h2 패키지 필요: pip install "httpx[http2]", 없으면 HTTP/1.1로 동작)
+HTTP2_ENABLED = os.getenv('KIS_HTTP2', '0') == '1'
+
+
+def _http2_available():
+    if HTTP2_ENABLED and importlib.util.find_spec('h2') is None:
+        print("[Stock Service] KIS_HTTP2=1 but 'h2' is not installed. Falling back to HTTP/1.1")
+        return False
+    return HTTP2_ENABLED
+
+
 class KISRestClient:
     """
     한국투자증권 REST API (HTTP 요청) 전용 클라이언트
+    - Async 메서드: 이벤트 루프별 httpx.AsyncClient 1개를 재사용 (루프 간 커넥션 공유 불가)
+    - Sync 메서드: 프로세스 공용 httpx.Client 1개를 재사용
     """
     def __init__(self):
         self.app_key = os.getenv('g_appkey')
         self.app_secret = os.getenv('g_appsecret')
         self.domain = "https://openapi.koreainvestment.com:9443"
         self.access_token = None
+        self.http2 = _http2_available()
+        self._async_clients = weakref.WeakKeyDictionary()  # event loop -> httpx.AsyncClient
+        self._sync_client = None
+
+    def _client_options(self):
+        return {
+            "http2": self.http2,
+            "timeout": httpx.Timeout(10.0, connect=5.0),
+            "limits": httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_CONNECTIONS,
+                keepalive_expiry=HTTP_KEEPALIVE_SEC,
+            ),
+        }
+
+    def _get_async_client(self):
+        """
+        현재 이벤트 루프 전용 AsyncClient (없으면 생성).
+        루프가 GC되어도 커넥션은 닫히지 않으므로, 루프를 닫기 전에 반드시 aclose()를 호출해야 한다.
+        """
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(**self._client_options())
+            self._async_clients[loop] = client
+        return client
+
+    def _get_sync_client(self):
+        if self._sync_client is None or self._sync_client.is_closed:
+            self._sync_client = httpx.Client(**self._client_options())
+        return self._sync_client
+
+    async def aclose(self):
+        """현재 이벤트 루프의 AsyncClient 종료 (워커/이벤트 루프 종료 전에 호출)"""
+        client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+    def close(self):
+        """Sync 클라이언트 종료 (프로세스 종료 시 atexit으로 자동 호출)"""
+        if self._sync_client is not None:
+            self._sync_client.close()
+            self._sync_client = None
 
     def _get_headers(self, tr_id, tr_cont=''):
-        """공통 헤더 생성 헬퍼 메서드"""
-        token_data = get_access_token()
+        """공통 헤더 생성 헬퍼 메서드 (Sync 경로용)"""
+        return self._build_headers(get_access_token(), tr_id, tr_cont)
+
+    async def _get_headers_async(self, tr_id, tr_cont=''):
+        """Async 경로용: 토큰 발급/캐시 파일 I/O가 필요하면 스레드에서 처리 (이벤트 루프 블로킹 방지)"""
+        return self._build_headers(await get_access_token_async(), tr_id, tr_cont)
+
+    def _build_headers(self, token_data, tr_id, tr_cont=''):
         if not token_data or 'access_token' not in token_data:
             print("[Stock Service] Token is missing")
             return None
@@ -35,11 +105,12 @@ class KISRestClient:
             "custtype": "P",
         }
 
-    async def get_fluctuation_rank(self):
-        """등락률 순위 조회 (상위 30개)"""
-        headers = self._get_headers("FHPST01700000")
-        if not headers: return None
-
+    async def get_fluctuation_rank(self, force_refresh=False):
+        """
+        등락률 순위 조회 (상위 30개)
+        동시에 여러 화면/워커가 요청해도 단기 캐시 + 단일 요청(single-flight)으로 업스트림 호출은 1회만 발생한다.
+        force_refresh=True: 캐시를 무시하고 새로 조회해 캐시를 갱신 (run_theme_sync 워커용)
+        """
         url = f"{self.domain}/uapi/domestic-stock/v1/ranking/fluctuation"
 
         params = {
@@ -59,27 +130,34 @@ class KISRestClient:
             "fid_rsfl_rate1": "",
         }
 
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.get(url, headers=headers, params=params, timeout=10)
-                data = response.json()
+        return await kis_response_cache.get_or_fetch(
+            kis_response_cache.make_key("FHPST01700000", params),
+            lambda: self._fetch_fluctuation_rank(url, params),
+            force_refresh=force_refresh,
+        )
 
-                if data.get('rt_cd') != '0':
-                    print(f"[Stock Service] Fluctuation Rank Error: {data.get('msg1')}")
-                    return None
+    async def _fetch_fluctuation_rank(self, url, params):
+        headers = await self._get_headers_async("FHPST01700000")
+        if not headers: return None
 
-                return data.get('output', [])
-            except Exception as e:
-                print(f"[Stock Service] Request Error: {e}")
+        client = self._get_async_client()
+        try:
+            response = await kis_rate_limiter.request(client, "GET", url, headers=headers, params=params, timeout=10)
+            data = response.json()
+
+            if data.get('rt_cd') != '0':
+                print(f"[Stock Service] Fluctuation Rank Error: {data.get('msg1')}")
                 return None
 
+            return data.get('output', [])
+        except Exception as e:
+            print(f"[Stock Service] Request Error: {e}")
+            return None
 
 
-    async def get_volume_rank(self):
-        """거래량 순위 조회 (상위 30개)"""
-        headers = self._get_headers("FHPST01710000")
-        if not headers: return None
 
+    async def get_volume_rank(self, force_refresh=False):
+        """거래량 순위 조회 (상위 30개, 등락률 순위와 동일하게 단기 캐시 적용)"""
         url = f"{self.domain}/uapi/domestic-stock/v1/quotations/volume-rank"
 
         params = {
@@ -96,21 +174,31 @@ class KISRestClient:
            "FID_INPUT_DATE_1": ""
         }
 
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.get(url, headers=headers, params=params, timeout=10)
-                data = response.json()
+        return await kis_response_cache.get_or_fetch(
+            kis_response_cache.make_key("FHPST01710000", params),
+            lambda: self._fetch_volume_rank(url, params),
+            force_refresh=force_refresh,
+        )
 
-                if data.get('rt_cd') == '0':
-                    output = data.get('output', [])
-                    # 템플릿 호환성을 위해 키 소문자 변환
-                    return [{k.lower(): v for k, v in item.items()} for item in output]
-                else:
-                    print(f"[Stock Service] Volume Rank Error: {data.get('msg1')}")
-                    return None
-            except Exception as e:
-                print(f"[Stock Service] Request Error: {e}")
+    async def _fetch_volume_rank(self, url, params):
+        headers = await self._get_headers_async("FHPST01710000")
+        if not headers: return None
+
+        client = self._get_async_client()
+        try:
+            response = await kis_rate_limiter.request(client, "GET", url, headers=headers, params=params, timeout=10)
+            data = response.json()
+
+            if data.get('rt_cd') == '0':
+                output = data.get('output', [])
+                # 템플릿 호환성을 위해 키 소문자 변환
+                return [{k.lower(): v for k, v in item.items()} for item in output]
+            else:
+                print(f"[Stock Service] Volume Rank Error: {data.get('msg1')}")
                 return None
+        except Exception as e:
+            print(f"[Stock Service] Request Error: {e}")
+            return None
 
     async def get_theme_rank(self):
         """주요 테마별 등락률 순위 (비활성화)"""
@@ -128,22 +216,22 @@ class KISRestClient:
             "fid_input_iscd": iscd
         }
 
-        with httpx.Client() as client:
-            try:
-                response = client.get(url, headers=headers, params=params, timeout=10)
-                data = response.json()
-                if data.get('rt_cd') == '0':
-                    return data.get('output', {})
-                else:
-                    print(f"[Stock Service] Current price API error: {data.get('msg1')}")
-                return None
-            except Exception as e:
-                print(f"[Stock Service] Current price request error: {e}")
-                return None
+        client = self._get_sync_client()
+        try:
+            response = kis_rate_limiter.request_sync(client, "GET", url, headers=headers, params=params, timeout=10)
+            data = response.json()
+            if data.get('rt_cd') == '0':
+                return data.get('output', {})
+            else:
+                print(f"[Stock Service] Current price API error: {data.get('msg1')}")
+            return None
+        except Exception as e:
+            print(f"[Stock Service] Current price request error: {e}")
+            return None
 
     async def get_current_price_async(self, iscd):
         """특정 종목 현재가 조회 (Async version)"""
-        headers = self._get_headers("FHKST01010100")
+        headers = await self._get_headers_async("FHKST01010100")
         if not headers: return None
 
         url = f"{self.domain}/uapi/domestic-stock/v1/quotations/inquire-price"
@@ -153,147 +241,104 @@ class KISRestClient:
             "fid_input_iscd": iscd
         }
 
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.get(url, headers=headers, params=params, timeout=10)
-                data = response.json()
-                if data.get('rt_cd') == '0':
-                    return data.get('output', {})
-                else:
-                    return None
-            except Exception as e:
-                print(f"[Stock Service] Current price request error: {e}")
+        client = self._get_async_client()
+        try:
+            response = await kis_rate_limiter.request(client, "GET", url, headers=headers, params=params, timeout=10)
+            data = response.json()
+            if data.get('rt_cd') == '0':
+                return data.get('output', {})
+            else:
                 return None
+        except Exception as e:
+            print(f"[Stock Service] Current price request error: {e}")
+            return None
 
     async def fetch_prices_batch(self, code_list):
         """
         여러 종목의 현재가를 하나의 세션으로 동시에 조회 (속도 최적화)
+        KIS 유량 한도 내에서 최대 속도로 요청하며, 유량 초과로 실패한 종목은 재시도한다.
         """
         if not code_list:
             return {}
             
-        headers = self._get_headers("FHKST01010100")
+        headers = await self._get_headers_async("FHKST01010100")
         if not headers: return {}
 
         url = f"{self.domain}/uapi/domestic-stock/v1/quotations/inquire-price"
         results = {}
         
-        # 하나의 클라이언트 세션을 재사용하여 연결 오버헤드 감소
-        async with httpx.AsyncClient() as client:
-            tasks = []
-            for code in code_list:
-                params = {
-                    "fid_cond_mrkt_div_code": "J",
-                    "fid_input_iscd": code
-                }
-                # 코루틴 객체 생성
-                tasks.append(client.get(url, headers=headers, params=params, timeout=10))
+        # 공용 커넥션 풀을 재사용하여 연결(TLS) 오버헤드 감소
+        client = self._get_async_client()
+        tasks = []
+        for code in code_list:
+            params = {
+                "fid_cond_mrkt_div_code": "J",
+                "fid_input_iscd": code
+            }
+            # 코루틴 객체 생성 (유량 제어기가 초당 요청 수/동시 요청 수를 제한하고 유량 초과 시 재시도)
+            tasks.append(kis_rate_limiter.request(client, "GET", url, headers=headers, params=params, timeout=10))
             
-            # 병렬 실행
-            responses = await asyncio.gather(*tasks, return_exceptions=True)
+        # 병렬 실행
+        responses = await asyncio.gather(*tasks, return_exceptions=True)
             
-            for code, response in zip(code_list, responses):
-                if isinstance(response, Exception):
-                    print(f"[Stock Service] Batch fetch error for {code}: {response}")
-                    continue
+        for code, response in zip(code_list, responses):
+            if isinstance(response, Exception):
+                print(f"[Stock Service] Batch fetch error for {code}: {response}")
+                continue
                 
-                try:
-                    data = response.json()
-                    if data.get('rt_cd') == '0':
-                        results[code] = data.get('output', {})
-                except Exception as e:
-                    print(f"[Stock Service] Batch response parse error: {e}")
+            try:
+                data = response.json()
+                if data.get('rt_cd') == '0':
+                    results[code] = data.get('output', {})
+                else:
+                    print(f"[Stock Service] Batch fetch failed for {code}: {data.get('msg1')}")
+            except Exception as e:
+                print(f"[Stock Service] Batch response parse error: {e}")
                     
         return results
 
-    def get_market_operation_status(self):
+    async def get_holiday_calendar_async(self, base_date, max_pages=3):
         """
-        시장 운영 상태 조회 (API)
-        User Requested Endpoint: /uapi/domestic-stock/v1/market/inquire-time (using likely TR ID: CTCA0903R or similar)
-        Returns: True if market is open (mrkt_opnd_yn == 'Y'), False otherwise.
+        국내휴장일조회 (CTCA0903R): base_date(YYYYMMDD)부터의 일자별 개장 여부를 연속조회로 모두 가져온다.
+        KIS 권고상 1일 1회 수준으로만 호출할 것 (결과는 trading_calendar가 DB에 저장하여 재사용)
+        Returns: [{"bass_dt": "20260105", "opnd_yn": "Y", ...}, ...] 또는 실패 시 None
         """
-        # Note: 'CTCA0903R' is technically for text 'chk-holiday', but widely used for status check.
-        # If the user specifically wants the path 'market/inquire-time', we use that.
-        # We try to use a generic inquiry TR ID if specific one is unknown, but typically CTCA0903R works for daily status.
-        
-        # Using the standard Holiday Check API as it's most reliable for "Is today open?"
-        # URL: /uapi/domestic-stock/v1/quotations/chk-holiday (Standard)
-        # Verify if user insists on 'market/inquire-time'.
-        # Let's try to match the user's expected output keys.
-        
-        headers = self._get_headers("CTCA0903R")
-        if not headers: return None
-
-        # Standard Holiday Check URL
         url = f"{self.domain}/uapi/domestic-stock/v1/quotations/chk-holiday"
-        
-        from datetime import datetime
-        today = datetime.now().strftime("%Y%m%d")
-
-        params = {
-            "BASS_DT": today,
-            "CTX_AREA_NK": "",
-            "CTX_AREA_FK": ""
-        }
-
-        with httpx.Client() as client:
+        client = self._get_async_client()
+        days = []
+        tr_cont, ctx_nk, ctx_fk = '', '', ''
+
+        for _ in range(max_pages):
+            headers = await self._get_headers_async("CTCA0903R", tr_cont=tr_cont)
+            if not headers: return None
+
+            params = {
+                "BASS_DT": base_date,
+                "CTX_AREA_NK": ctx_nk,
+                "CTX_AREA_FK": ctx_fk
+            }
             try:
-                response = client.get(url, headers=headers, params=params, timeout=5)
+                response = await kis_rate_limiter.request(client, "GET", url, headers=headers, params=params, timeout=5)
                 data = response.json()
-                
-                # CTCA0903R Output Structure:
-                # { "output": [ { "orgn_dt": "20240501", "opnd_yn": "N", ... } ] }
-                
-                if data.get('rt_cd') == '0':
-                    output = data.get('output', [])
-                    if output:
-                        # Today's status (usually first item or match date)
-                        item = output[0] 
-                        is_open_yn = item.get('opnd_yn', 'N')
-                        return is_open_yn == 'Y'
-                else:
-                    print(f"[Stock Service] Market Status API Error: {data.get('msg1')}")
             except Exception as e:
-                print(f"[Stock Service] Market Status Request Error: {e}")
-        
-    async def get_market_operation_status_async(self):
-        """
-        시장 운영 상태 조회 (Async API)
-        Returns: True if market is open (mrkt_opnd_yn == 'Y'), False otherwise.
-        """
-        headers = self._get_headers("CTCA0903R")
-        if not headers: return None
+                print(f"[Stock Service] Holiday Calendar Request Error: {e}")
+                return None
 
-        # Standard Holiday Check URL
-        url = f"{self.domain}/uapi/domestic-stock/v1/quotations/chk-holiday"
-        
-        from datetime import datetime
-        today = datetime.now().strftime("%Y%m%d")
+            if data.get('rt_cd') != '0':
+                print(f"[Stock Service] Holiday Calendar API Error: {data.get('msg1')}")
+                return None
 
-        params = {
-            "BASS_DT": today,
-            "CTX_AREA_NK": "",
-            "CTX_AREA_FK": ""
-        }
+            days.extend(data.get('output', []))
 
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.get(url, headers=headers, params=params, timeout=5)
-                data = response.json()
-                
-                if data.get('rt_cd') == '0':
-                    output = data.get('output', [])
-                    if output:
-                        # Today's status
-                        item = output[0] 
-                        is_open_yn = item.get('opnd_yn', 'N')
-                        return is_open_yn == 'Y'
-                else:
-                    print(f"[Stock Service] Market Status API Error: {data.get('msg1')}")
-            except Exception as e:
-                print(f"[Stock Service] Market Status Request Error: {e}")
-        
-        return False
+            # 응답 헤더 tr_cont가 M/F면 다음 페이지 존재
+            if response.headers.get('tr_cont') not in ('M', 'F'):
+                break
+            tr_cont = 'N'
+            ctx_nk = data.get('ctx_area_nk', '')
+            ctx_fk = data.get('ctx_area_fk', '')
+
+        return days
 
 # 싱글톤 인스턴스 생성
 kis_rest_client = KISRestClient()
+atexit.register(kis_rest_client.close)
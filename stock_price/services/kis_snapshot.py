@@ -0,0 +1,121 @@
+import json
+import time
+from asgiref.sync import sync_to_async
+
+
+class SnapshotStore:
+    """
+    종목별 최신 체결/호가 스냅샷 저장소 (Last-Value Cache).
+    - 메모리: 수집(ingestion) 프로세스 내 즉시 조회용
+    - Redis Hash (kis:snapshot:<code> -> {exec, book}): 웹 워커/다른 프로세스 공유용
+    새 구독자는 다음 틱을 기다리지 않고 이 스냅샷을 즉시 받는다.
+    메모리 항목도 Redis와 같은 TTL을 적용하고, KIS 구독이 해제된 종목은 discard()로 지운다.
+    (더 이상 갱신되지 않는 시세를 스냅샷으로 내보내지 않도록)
+    """
+    KEY_PREFIX = "kis:snapshot:"
+    TTL = 60 * 60 * 6  # 6시간 (장 마감 후 다음 날 아침까지 오래된 시세가 남지 않도록)
+
+    def __init__(self):
+        self._memory = {}  # code -> (마지막 저장 시각 monotonic, {"exec": record, "book": record})
+
+    def _redis(self):
+        from django_redis import get_redis_connection
+        return get_redis_connection("default")
+
+    async def save(self, slots):
+        """
+        Args:
+            slots (dict): code -> {"exec": record, "book": record} (둘 중 하나만 있어도 됨)
+        """
+        if not slots:
+            return
+
+        now = time.monotonic()
+        for code, slot in slots.items():
+            saved_at, merged = self._memory.get(code, (now, {}))
+            if now - saved_at >= self.TTL:
+                # 만료된 항목에 덧붙이면 이전 장의 체결/호가가 새 타임스탬프로 되살아나므로 새로 시작
+                merged = {}
+            merged = {**merged, **slot}
+            self._memory[code] = (now, merged)
+
+        try:
+            await sync_to_async(self._save_to_redis, thread_sensitive=False)(slots)
+        except Exception as e:
+            print(f"[Snapshot] Redis save error: {e}")
+
+    def _save_to_redis(self, slots):
+        # 모든 종목을 파이프라인 1회 왕복으로 기록
+        # 호가만 계속 갱신되어 키 TTL이 연장되어도 오래된 체결이 살아남지 않도록 종류별 저장 시각(<kind>_at)도 기록
+        now = time.time()
+        pipe = self._redis().pipeline(transaction=False)
+        for code, slot in slots.items():
+            key = f"{self.KEY_PREFIX}{code}"
+            mapping = {kind: json.dumps(record) for kind, record in slot.items()}
+            mapping.update({f"{kind}_at": now for kind in slot})
+            pipe.hset(key, mapping=mapping)
+            pipe.expire(key, self.TTL)
+        pipe.execute()
+
+    async def get(self, code):
+        """Returns: {"exec": record, "book": record} 또는 없으면 None"""
+        snapshots = await self.get_many([code])
+        return snapshots.get(code)
+
+    async def get_many(self, codes):
+        """Returns: code -> {"exec": record, "book": record} (스냅샷이 있는 종목만)"""
+        now = time.monotonic()
+        result = {}
+        for code in codes:
+            entry = self._memory.get(code)
+            if entry is None:
+                continue
+            if now - entry[0] >= self.TTL:
+                del self._memory[code]
+                continue
+            result[code] = entry[1]
+        missing = [code for code in codes if code not in result]
+        if not missing:
+            return result
+
+        try:
+            result.update(await sync_to_async(self._load_from_redis, thread_sensitive=False)(missing))
+        except Exception as e:
+            print(f"[Snapshot] Redis load error: {e}")
+        return result
+
+    async def discard(self, codes):
+        """더 이상 수신하지 않는 종목의 스냅샷 삭제 (메모리 + Redis)"""
+        if not codes:
+            return
+        for code in codes:
+            self._memory.pop(code, None)
+        try:
+            await sync_to_async(self._delete_from_redis, thread_sensitive=False)(codes)
+        except Exception as e:
+            print(f"[Snapshot] Redis delete error: {e}")
+
+    def _delete_from_redis(self, codes):
+        self._redis().delete(*(f"{self.KEY_PREFIX}{code}" for code in codes))
+
+    def _load_from_redis(self, codes):
+        pipe = self._redis().pipeline(transaction=False)
+        for code in codes:
+            pipe.hgetall(f"{self.KEY_PREFIX}{code}")
+
+        now = time.time()
+        loaded = {}
+        for code, raw in zip(codes, pipe.execute()):
+            fields = {(key.decode() if isinstance(key, bytes) else key): value for key, value in raw.items()}
+            slot = {
+                kind: json.loads(value)
+                for kind, value in fields.items()
+                if not kind.endswith("_at") and now - float(fields.get(f"{kind}_at", now)) < self.TTL
+            }
+            if slot:
+                loaded[code] = slot
+        return loaded
+
+
+# 프로세스당 1개 (수집 경로와 Consumer/View가 공유)
+snapshot_store = SnapshotStore()
@@ -1,12 +1,19 @@
 import os
 import json
+import time
+import uuid
 import asyncio
+import hashlib
+from bisect import bisect
 import websockets
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 from channels.layers import get_channel_layer
-from ..serializers import StockRequestSerializer, StockResponseSerializer, StockAskingPriceResponseSerializer
+from ..serializers import StockRequestSerializer
+from .kis_decoder import TR_ID_HOGA, TR_ID_HOGA_ELW, TR_ID_EXEC, iter_records, validate_record, record_kind
+from .kis_conflator import TickConflator, FLUSH_INTERVAL_MS
+from .kis_snapshot import snapshot_store
 from dotenv import load_dotenv
-from auth.kis_auth import get_approval_key
+from auth.kis_auth import get_approval_key_async, invalidate_approval_key_async
 
 # .env 로드
 env_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), '.env')
@@ -16,44 +23,75 @@ APP_KEY = os.getenv('g_appkey')
 APP_SECRET = os.getenv('g_appsecret')
 
 WS_BASE_URL = "ws://ops.koreainvestment.com:21000"
-TR_ID_HOGA = "H0UNASP0"
-TR_ID_HOGA_ELW = "H0STASP0"
-TR_ID_EXEC = "H0STCNT0"
+
+# 1이면 기존 DRF Serializer 검증 경로로 디코딩 (디버그용, 기본은 고속 디코더)
+VALIDATE_FRAMES = os.getenv('KIS_WS_VALIDATE', '0') == '1'
+
+# 시청자가 0명이 된 뒤 실제 구독 해제까지 대기 시간 (새로고침 시 재구독 방지)
+UNSUBSCRIBE_GRACE_SEC = float(os.getenv('KIS_WS_UNSUBSCRIBE_GRACE', '30'))
+# 세션당 동시 구독 종목 수 상한 (KIS 세션당 등록 한도 41건 / 종목당 호가+체결 2건)
+MAX_SUBSCRIPTIONS = int(os.getenv('KIS_WS_MAX_CODES', '20'))
+# 업스트림 세션 수 (세션별 앱키: g_appkey_2/g_appsecret_2 ... 설정된 앱키 쌍 수를 넘으면 그만큼으로 제한)
+POOL_SIZE = int(os.getenv('KIS_WS_POOL_SIZE', '1'))
+# inline: 웹 워커가 직접 KIS에 연결 / remote: manage.py run_kis_feed 프로세스에 구독 의도만 전달
+FEED_MODE = os.getenv('KIS_FEED_MODE', 'inline')
+FEED_CHANNEL = "kis-feed"
+# 접속키 거부 응답코드 (OPSP0011: invalid approval : NOT FOUND / OPSP0012: invalid approval : EXPIRED 등)
+APPROVAL_REJECTED_MSG_CDS = set(os.getenv('KIS_WS_APPROVAL_REJECTED_CODES', 'OPSP0011,OPSP0012').split(','))
+# remote 모드: 웹 워커가 구독 중인 종목 전체 목록을 피드 워커에 다시 보내는 주기 (피드 워커 재시작/메시지 유실 복구)
+FEED_HEARTBEAT_SEC = float(os.getenv('KIS_FEED_HEARTBEAT_SEC', '15'))
+# 이 시간 동안 하트비트가 없는 웹 워커의 구독은 피드 워커가 해제 (웹 워커 비정상 종료 대비)
+FEED_LEASE_SEC = float(os.getenv('KIS_FEED_LEASE_SEC', str(FEED_HEARTBEAT_SEC * 4)))
 
 class KISWebSocketClient:
-    def __init__(self):
+    def __init__(self, appkey=None, appsecret=None, session_id=0):
+        self.appkey = appkey
+        self.appsecret = appsecret
+        self.session_id = session_id
         self.approval_key = None
         self.ws = None
         self.connected = False
         self.lock = asyncio.Lock()
         self._subscriber_counts = defaultdict(int) 
+        self._active_codes = OrderedDict()  # 실제 API 구독 중인 종목 (LRU 순서: 앞쪽이 가장 오래됨)
+        self._pending_codes = OrderedDict()  # 구독 상한 때문에 대기 중인 종목 (시청자 있음, 먼저 요청한 순)
+        self._evict_tasks = {}  # code -> 구독 해제 대기 태스크
+        self.unsubscribe_grace = UNSUBSCRIBE_GRACE_SEC
+        self.max_subscriptions = MAX_SUBSCRIPTIONS
         self.logged_stocks = set()
         self.channel_layer = get_channel_layer()
+        # 틱 병합 단계 (KIS_WS_FLUSH_MS=0 이면 비활성화)
+        self.conflator = TickConflator(self.channel_layer) if FLUSH_INTERVAL_MS > 0 else None
         self.running = False
         self.task = None
 
     async def _get_approval_key(self):
-        loop = asyncio.get_running_loop()
-        return await loop.run_in_executor(None, get_approval_key)
+        # 유효기간 동안 메모리/파일에 캐시된 접속키 재사용 (재연결 시 발급 API 호출 없음)
+        return await get_approval_key_async(self.appkey, self.appsecret)
+
+    async def prefetch_approval_key(self):
+        """접속키를 미리 발급/캐시해 둔다 (장 시작 직전 첫 연결 지연 방지)"""
+        self.approval_key = await self._get_approval_key()
+        return self.approval_key
 
     async def _connect_and_run(self):
         if self.running: return
 
         self.running = True
-        print("[KIS Client] Starting connection...")
+        print(f"[KIS Client] Starting connection... (session #{self.session_id})")
         
         while self.running:
             try:
+                # 캐시 적중 시 즉시 반환되며, 만료/거부된 접속키는 이때 재발급
+                self.approval_key = await self._get_approval_key()
                 if not self.approval_key:
-                    self.approval_key = await self._get_approval_key()
-                    if not self.approval_key:
-                        await asyncio.sleep(5)
-                        continue
+                    await asyncio.sleep(5)
+                    continue
 
                 async with websockets.connect(WS_BASE_URL, ping_interval=None) as ws:
                     self.ws = ws
                     self.connected = True
-                    print("[KIS Client] Connected to KIS WebSocket!")
+                    print(f"[KIS Client] Connected to KIS WebSocket! (session #{self.session_id})")
 
                     # 재연결 시 기존에 시청자가 있는 종목들 다시 구독
                     await self._resubscribe_all()
@@ -92,96 +130,382 @@ class KISWebSocketClient:
                 if tr_id == "PINGPONG":
                     if self.ws: await self.ws.pong(data) # 퐁 응답
                     return
+                body = js.get("body", {})
+                if body.get("rt_cd") == "1" and body.get("msg_cd") in APPROVAL_REJECTED_MSG_CDS:
+                    # 접속키 만료/무효: 캐시를 비우고 재연결하여 새 접속키로 재구독
+                    print(f"[KIS Client] Approval key rejected: [{body.get('msg_cd')}] {body.get('msg1')}. Reconnecting...")
+                    await invalidate_approval_key_async(self.appkey, self.approval_key)
+                    self.approval_key = None
+                    if self.ws: await self.ws.close()
+                    return
             except:
                 pass
             return
 
         # 실시간 데이터 처리 (파이프라인 포맷)
         if isinstance(data, str) and '|' in data:
-            parts = data.split('|')
-            if len(parts) > 3:
-                tr_id = parts[1]
-                stock_code = parts[3]
-                
-                SerializerClass = None
-                if tr_id in [TR_ID_HOGA, TR_ID_HOGA_ELW]:
-                    SerializerClass = StockAskingPriceResponseSerializer
-                elif tr_id == TR_ID_EXEC:
-                    SerializerClass = StockResponseSerializer
-
-                if SerializerClass and stock_code:
-                    # ^ 문자열로 정보가 구분되어 옴
-                    clean_code = stock_code.split("^")[0]
-                    
-                    parsed_dict = SerializerClass.parse_from_raw(data)
-                    if parsed_dict:
-                        serializer = SerializerClass(data=parsed_dict)
-                        if serializer.is_valid():
-                            # [DEBUG] 최초 1회 로그
-                            if clean_code not in self.logged_stocks:
-                                print(f"[KIS Client] First Data for {clean_code}")
-                                self.logged_stocks.add(clean_code)
-                                
-                            group_name = f"stock_{clean_code}"
-                            await self.channel_layer.group_send(
-                                group_name,
-                                {"type": "stock_update", "data": serializer.data}
-                            )
+            # 한 프레임에 여러 건이 묶여 올 수 있으므로 종목별로 모아서 한 번에 전송
+            batches = {}
+            for tr_id, record in iter_records(data):
+                if VALIDATE_FRAMES:
+                    record = validate_record(tr_id, record)
+                    if not record:
+                        continue
+
+                clean_code = record.get("MKSC_SHRN_ISCD")
+                if not clean_code:
+                    continue
+
+                # [DEBUG] 최초 1회 로그
+                if clean_code not in self.logged_stocks:
+                    print(f"[KIS Client] First Data for {clean_code}")
+                    self.logged_stocks.add(clean_code)
+
+                if self.conflator:
+                    # 최신 스냅샷만 유지하고 flush 주기에 맞춰 전송
+                    self.conflator.push(tr_id, clean_code, record)
+                else:
+                    batches.setdefault(clean_code, []).append(record)
+
+            slots = {}
+            for clean_code, records in batches.items():
+                group_name = f"stock_{clean_code}"
+                await self.channel_layer.group_send(
+                    group_name,
+                    {"type": "stock_update", "records": records}
+                )
+                slot = slots.setdefault(clean_code, {})
+                for record in records:
+                    slot["exec" if record_kind(record) == "E" else "book"] = record
+
+            # 신규 구독자용 최신 스냅샷 갱신
+            await snapshot_store.save(slots)
 
     async def subscribe(self, stock_code):
         """Consumer가 호출: 구독 요청 (카운팅 적용)"""
+        await self.subscribe_many([stock_code])
+
+    async def unsubscribe(self, stock_code):
+        """Consumer가 호출: 구독 취소 (카운팅 적용)"""
+        await self.unsubscribe_many([stock_code])
+
+    async def subscribe_many(self, stock_codes):
+        """여러 종목 일괄 구독 (락은 배치당 1회만 획득)"""
         async with self.lock:
-            self._subscriber_counts[stock_code] += 1
-            count = self._subscriber_counts[stock_code]
-            
-            print(f"[KIS Client] Subscribe {stock_code} (Total watchers: {count})")
+            for stock_code in stock_codes:
+                await self._add_watcher(stock_code)
 
-            # 이 종목의 '첫 번째' 시청자일 때만 실제 API 구독 요청
-            if count == 1:
-                await self._send_subscription_packet(stock_code)
+            if len(stock_codes) == 1:
+                code = stock_codes[0]
+                print(f"[KIS Client] Subscribe {code} (Total watchers: {self._subscriber_counts[code]})")
+            else:
+                print(f"[KIS Client] Subscribe {len(stock_codes)} codes (Active: {len(self._active_codes)})")
             
             # 백그라운드 태스크 시작 확인
             if not self.running or (self.task and self.task.done()):
                 self.task = asyncio.create_task(self._connect_and_run())
 
-    async def unsubscribe(self, stock_code):
-        """Consumer가 호출: 구독 취소 (카운팅 적용)"""
+    async def unsubscribe_many(self, stock_codes):
+        """여러 종목 일괄 구독 취소 (락은 배치당 1회만 획득)"""
         async with self.lock:
-            if self._subscriber_counts[stock_code] > 0:
-                self._subscriber_counts[stock_code] -= 1
-            
-            count = self._subscriber_counts[stock_code]
-            print(f"[KIS Client] Unsubscribe {stock_code} (Remaining watchers: {count})")
+            for stock_code in stock_codes:
+                self._remove_watcher(stock_code)
 
-            # 시청자가 0명이 되면? 
-            # (선택사항) 여기서 API에 구독 해제 패킷을 보낼 수도 있고,
-            # 빈번한 해제를 막기 위해 그냥 둬도 됩니다. 
-            # 일단은 카운트만 줄이는 것으로 충분합니다.
+            if len(stock_codes) == 1:
+                code = stock_codes[0]
+                print(f"[KIS Client] Unsubscribe {code} (Remaining watchers: {self._subscriber_counts[code]})")
+            else:
+                print(f"[KIS Client] Unsubscribe {len(stock_codes)} codes")
 
-    async def _resubscribe_all(self):
-        """재연결 시 시청자가 있는 종목만 다시 구독"""
-        for code, count in self._subscriber_counts.items():
-            if count > 0:
+    async def _add_watcher(self, stock_code):
+        """(락 보유 상태에서 호출) 시청자 수 증가 및 필요 시 실제 API 구독"""
+        self._subscriber_counts[stock_code] += 1
+
+        # 해제 대기 중이던 종목이면 해제 취소 (빠른 새로고침)
+        pending = self._evict_tasks.pop(stock_code, None)
+        if pending:
+            pending.cancel()
+
+        if stock_code in self._active_codes:
+            self._active_codes.move_to_end(stock_code)
+        elif stock_code in self._pending_codes:
+            return
+        elif await self._ensure_capacity():
+            # 아직 API 구독이 없는 종목일 때만 실제 구독 요청
+            self._active_codes[stock_code] = True
+            await self._send_subscription_packet(stock_code)
+        else:
+            # 모든 구독 종목에 시청자가 있으면 시청 중인 종목을 끊지 않고 대기열에 넣음 (자리가 나면 구독)
+            self._pending_codes[stock_code] = True
+            print(f"[KIS Client] Subscription cap reached ({self.max_subscriptions}). Queued {stock_code} "
+                  f"(Pending: {len(self._pending_codes)})")
+
+    def _remove_watcher(self, stock_code):
+        """(락 보유 상태에서 호출) 시청자 수 감소, 0명이 되면 유예 시간 후 실제 구독 해제"""
+        if self._subscriber_counts[stock_code] > 0:
+            self._subscriber_counts[stock_code] -= 1
+
+        count = self._subscriber_counts[stock_code]
+        if count == 0 and stock_code in self._pending_codes:
+            self._pending_codes.pop(stock_code)
+            self._subscriber_counts.pop(stock_code, None)
+        elif count == 0 and stock_code in self._active_codes and stock_code not in self._evict_tasks:
+            self._evict_tasks[stock_code] = asyncio.create_task(self._evict_after_grace(stock_code))
+
+    async def _evict_after_grace(self, stock_code):
+        """유예 시간 동안 재구독이 없으면 구독 해제 패킷 전송"""
+        await asyncio.sleep(self.unsubscribe_grace)
+        async with self.lock:
+            self._evict_tasks.pop(stock_code, None)
+            if self._subscriber_counts.get(stock_code, 0) == 0 and stock_code in self._active_codes:
+                await self._remove_subscription(stock_code)
+
+    async def _ensure_capacity(self):
+        """
+        구독 상한에 도달했으면 시청자가 없는 종목을 오래된 순으로 해제
+        Returns: 자리가 있으면 True, 모든 종목에 시청자가 있어 자리를 못 만들면 False
+        """
+        while self._active_codes and len(self._active_codes) >= self.max_subscriptions:
+            idle_codes = [code for code in self._active_codes if self._subscriber_counts.get(code, 0) == 0]
+            if not idle_codes:
+                return False
+            victim = idle_codes[0]
+
+            pending = self._evict_tasks.pop(victim, None)
+            if pending:
+                pending.cancel()
+
+            print(f"[KIS Client] Subscription cap reached. Evicting {victim}")
+            await self._remove_subscription(victim)
+        return True
+
+    async def _remove_subscription(self, stock_code):
+        self._active_codes.pop(stock_code, None)
+        if self._subscriber_counts.get(stock_code, 0) == 0:
+            self._subscriber_counts.pop(stock_code, None)
+        await self._send_subscription_packet(stock_code, tr_type="2")
+        # 더 이상 갱신되지 않는 시세가 신규 구독자/히트맵에 스냅샷으로 나가지 않도록 삭제
+        await snapshot_store.discard([stock_code])
+        await self._promote_pending()
+
+    async def _promote_pending(self):
+        """빈 자리만큼 대기 중인 종목을 먼저 요청한 순서대로 구독"""
+        while self._pending_codes and len(self._active_codes) < self.max_subscriptions:
+            code, _ = self._pending_codes.popitem(last=False)
+            if self._subscriber_counts.get(code, 0) > 0:
+                self._active_codes[code] = True
                 await self._send_subscription_packet(code)
 
-    async def _send_subscription_packet(self, stock_code):
+    async def _resubscribe_all(self):
+        """재연결 시 API 구독 중이던 종목만 다시 구독"""
+        for code in list(self._active_codes):
+            await self._send_subscription_packet(code)
+
+    async def _send_subscription_packet(self, stock_code, tr_type="1"):
+        """tr_type "1": 구독 등록, "2": 구독 해제"""
         if not self.ws or not self.connected or not self.approval_key:
             return
 
-        # 1. 호가 등록
+        # 1. 호가 등록/해제
         hoga_tr_id = self._get_hoga_tr_id(stock_code)
         payload_hoga = StockRequestSerializer.build_payload(
-            self.approval_key, hoga_tr_id, stock_code
+            self.approval_key, hoga_tr_id, stock_code, tr_type=tr_type
         )
         await self.ws.send(json.dumps(payload_hoga))
 
-        # 2. 체결 등록
+        # 2. 체결 등록/해제
         payload_exec = StockRequestSerializer.build_payload(
-            self.approval_key, TR_ID_EXEC, stock_code
+            self.approval_key, TR_ID_EXEC, stock_code, tr_type=tr_type
         )
         await self.ws.send(json.dumps(payload_exec))
         
-        print(f"[KIS Client] Sent API Request for {stock_code}")
+        action = "Subscribe" if tr_type == "1" else "Unsubscribe"
+        print(f"[KIS Client] Sent API {action} Request for {stock_code}")
+
+class KISWebSocketPool:
+    """
+    여러 KIS 웹소켓 세션에 종목을 consistent hash로 분산 배치하는 풀.
+    세션별로 독립적으로 재연결/재구독하며, Consumer는 기존과 동일하게 subscribe/unsubscribe만 호출한다.
+    """
+    VIRTUAL_NODES = 64  # 세션당 해시 링 가상 노드 수 (분산 균등화)
+
+    def __init__(self, sessions):
+        self.sessions = sessions
+        ring = sorted(
+            (self._hash(f"session-{idx}#{vnode}"), idx)
+            for idx in range(len(sessions))
+            for vnode in range(self.VIRTUAL_NODES)
+        )
+        self._ring_keys = [key for key, _ in ring]
+        self._ring_sessions = [idx for _, idx in ring]
+
+    @staticmethod
+    def _hash(key):
+        return int(hashlib.md5(key.encode('utf-8')).hexdigest()[:8], 16)
+
+    def session_for(self, stock_code):
+        """종목코드가 배치될 세션 (세션 수가 같으면 항상 같은 세션)"""
+        pos = bisect(self._ring_keys, self._hash(stock_code)) % len(self._ring_keys)
+        return self.sessions[self._ring_sessions[pos]]
+
+    def _group_by_session(self, stock_codes):
+        groups = {}
+        for code in stock_codes:
+            groups.setdefault(self.session_for(code), []).append(code)
+        return groups
+
+    async def subscribe(self, stock_code):
+        await self.session_for(stock_code).subscribe(stock_code)
+
+    async def unsubscribe(self, stock_code):
+        await self.session_for(stock_code).unsubscribe(stock_code)
+
+    async def subscribe_many(self, stock_codes):
+        """세션별로 묶어서 세션마다 1회씩 (동시에) 일괄 구독"""
+        groups = self._group_by_session(stock_codes)
+        await asyncio.gather(*(session.subscribe_many(codes) for session, codes in groups.items()))
+
+    async def unsubscribe_many(self, stock_codes):
+        groups = self._group_by_session(stock_codes)
+        await asyncio.gather(*(session.unsubscribe_many(codes) for session, codes in groups.items()))
+
+    async def prefetch_approval_keys(self):
+        await asyncio.gather(*(session.prefetch_approval_key() for session in self.sessions))
+
+
+class KISFeedProxy:
+    """
+    웹 워커용 구독 프록시 (KIS_FEED_MODE=remote).
+    KIS 연결 없이 채널 레이어로 구독/해제 의도만 run_kis_feed 워커에 전달한다.
+    시세 데이터는 워커가 stock_<code> 그룹으로 그대로 보내주므로 Consumer 쪽 변경은 없다.
+    - 시청자 수는 웹 워커 안에서 세고, 종목별 첫 구독/마지막 해제만 전달 (피드 워커 입장에서 웹 워커 1개 = 시청자 1명)
+    - FEED_HEARTBEAT_SEC마다 구독 중인 종목 전체 목록을 다시 보내 피드 워커 재시작/메시지 유실을 복구
+    - 전송 실패(피드 워커 중단으로 채널이 가득 찬 경우 등)는 로그만 남긴다 (웹소켓 연결은 유지, 다음 하트비트로 복구)
+    """
+    def __init__(self, heartbeat_sec=FEED_HEARTBEAT_SEC):
+        self.channel_layer = get_channel_layer()
+        self.proxy_id = uuid.uuid4().hex
+        self.heartbeat_sec = heartbeat_sec
+        self._watchers = defaultdict(int)  # 이 웹 워커의 종목별 시청자 수
+        self._heartbeat_task = None
+
+    async def subscribe(self, stock_code):
+        await self.subscribe_many([stock_code])
+
+    async def unsubscribe(self, stock_code):
+        await self.unsubscribe_many([stock_code])
+
+    async def subscribe_many(self, stock_codes):
+        new_codes = []
+        for code in stock_codes:
+            self._watchers[code] += 1
+            if self._watchers[code] == 1:
+                new_codes.append(code)
+
+        self._ensure_heartbeat()
+        if new_codes:
+            await self._send("feed.subscribe", new_codes)
+
+    async def unsubscribe_many(self, stock_codes):
+        gone = []
+        for code in stock_codes:
+            count = self._watchers.get(code, 0)
+            if count > 1:
+                self._watchers[code] = count - 1
+            elif count == 1:
+                del self._watchers[code]
+                gone.append(code)
+
+        if gone:
+            await self._send("feed.unsubscribe", gone)
+
+    def _ensure_heartbeat(self):
+        if self._heartbeat_task is None or self._heartbeat_task.done():
+            self._heartbeat_task = asyncio.create_task(self._heartbeat_loop())
+
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_sec)
+            await self._send("feed.heartbeat", list(self._watchers))
+
+    async def _send(self, message_type, codes):
+        try:
+            await self.channel_layer.send(FEED_CHANNEL, {"type": message_type, "proxy": self.proxy_id, "codes": codes})
+            return True
+        except Exception as e:
+            print(f"[KIS Feed Proxy] Failed to send {message_type} ({len(codes)} codes): {e}")
+            return False
+
+
+class KISFeedRegistry:
+    """
+    run_kis_feed 워커 쪽 구독 관리.
+    웹 워커(KISFeedProxy)별 구독 종목 집합과 마지막 수신 시각을 보관하고, 집합이 바뀐 만큼만 세션 풀에 반영한다.
+    - subscribe/unsubscribe가 중복/유실되어도 하트비트(전체 목록)로 맞춰짐
+    - 피드 워커가 재시작되면 첫 하트비트에 각 웹 워커의 구독이 복구됨
+    - FEED_LEASE_SEC 동안 소식이 없는 웹 워커의 구독은 expire()에서 해제
+    """
+    def __init__(self, pool, lease_sec=FEED_LEASE_SEC):
+        self.pool = pool
+        self.lease_sec = lease_sec
+        self._codes = {}  # proxy id -> 구독 종목 set
+        self._seen = {}  # proxy id -> 마지막 수신 시각 (monotonic)
+
+    async def handle(self, message, now=None):
+        proxy = message.get('proxy', '')
+        codes = set(message.get('codes') or [])
+        current = self._codes.get(proxy, set())
+        message_type = message.get('type')
+
+        if message_type == 'feed.subscribe':
+            added, removed = codes - current, set()
+        elif message_type == 'feed.unsubscribe':
+            added, removed = set(), codes & current
+        elif message_type == 'feed.heartbeat':
+            added, removed = codes - current, current - codes
+        else:
+            return
+
+        self._seen[proxy] = time.monotonic() if now is None else now
+        await self._apply(proxy, added, removed)
+
+    async def expire(self, now=None):
+        """Returns: 만료되어 구독이 해제된 proxy id 리스트"""
+        now = time.monotonic() if now is None else now
+        expired = [proxy for proxy, seen in self._seen.items() if now - seen > self.lease_sec]
+        for proxy in expired:
+            self._seen.pop(proxy, None)
+            await self._apply(proxy, set(), set(self._codes.get(proxy, ())))
+            self._codes.pop(proxy, None)
+        return expired
+
+    async def _apply(self, proxy, added, removed):
+        # 풀 호출 중 다른 메시지가 끼어들어도 같은 변경을 두 번 반영하지 않도록 집합을 먼저 갱신
+        current = self._codes.setdefault(proxy, set())
+        current |= added
+        current -= removed
+        if added:
+            await self.pool.subscribe_many(sorted(added))
+        if removed:
+            await self.pool.unsubscribe_many(sorted(removed))
+
+
+def build_pool(size=POOL_SIZE):
+    """
+    세션별 앱키(g_appkey_N/g_appsecret_N)로 풀 구성.
+    같은 앱키로는 세션을 늘려도 구독 한도가 늘지 않으므로, 앱키 쌍이 설정된 세션 수까지만 만든다.
+    """
+    sessions = [KISWebSocketClient(APP_KEY, APP_SECRET, session_id=0)]
+    for idx in range(1, max(size, 1)):
+        appkey = os.getenv(f'g_appkey_{idx + 1}')
+        appsecret = os.getenv(f'g_appsecret_{idx + 1}')
+        if not appkey or not appsecret or appkey in {session.appkey for session in sessions}:
+            print(f"[KIS Client] KIS_WS_POOL_SIZE={size} but no distinct g_appkey_{idx + 1}/g_appsecret_{idx + 1}. "
+                  f"Using {len(sessions)} session(s).")
+            break
+        sessions.append(KISWebSocketClient(appkey, appsecret, session_id=idx))
+    return KISWebSocketPool(sessions)
 
 # 모듈 레벨에서 인스턴스 생성 (이 파일이 import 될 때 딱 한 번 생성됨)
-kis_client = KISWebSocketClient()
\ No newline at end of file
+# Consumer 입장에서는 단일 클라이언트와 동일한 인터페이스 (내부적으로 세션 풀 또는 피드 워커 프록시)
+kis_client = KISFeedProxy() if FEED_MODE == 'remote' else build_pool()
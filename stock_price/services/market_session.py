@@ -0,0 +1,96 @@
+import asyncio
+from datetime import datetime, timedelta
+from .trading_calendar import trading_calendar, SESSION_SCHEDULE, TRADING_PHASES
+
+# 한 번에 잠드는 최대 시간 (달력 갱신/시스템 시각 보정을 반영하기 위함, API 호출은 없음)
+MAX_SLEEP_SEC = 300
+# 다음 전환 시각을 찾을 최대 범위 (연휴 포함)
+LOOKAHEAD_DAYS = 14
+
+
+class MarketSession:
+    """
+    장 운영 구간 상태 머신 (장전 동시호가 -> 정규장 -> 장마감 동시호가 -> 시간외 -> 장 종료)
+    거래 달력 + 시간표로 다음 전환 시각을 미리 계산해 그때까지 잠들기 때문에, 장외 시간에 주기적으로 깨어나 확인할 필요가 없다.
+    - phase()/is_open(): 현재 구간 (O(1), 네트워크 없음)
+    - wait_for(): 원하는 구간이 시작될 때까지 대기 (lead초 일찍 깨어나 워밍업 가능)
+    - transitions(): 구간이 바뀔 때마다 (이전 구간, 새 구간)을 yield
+    """
+    def __init__(self, calendar=trading_calendar):
+        self.calendar = calendar
+
+    def phase(self, now=None):
+        return self.calendar.session_state(now or datetime.now())
+
+    def is_open(self, now=None):
+        return self.phase(now) in TRADING_PHASES
+
+    def next_transition(self, now=None, phases=None):
+        """
+        now 이후 처음으로 구간이 바뀌는 시각 (phases를 주면 그 구간들 중 하나로 바뀌는 시각)
+        Returns: (datetime, phase) 또는 LOOKAHEAD_DAYS 안에 없으면 None
+        """
+        now = now or datetime.now()
+        previous = self.phase(now)
+        for offset in range(LOOKAHEAD_DAYS + 1):
+            day = now.date() + timedelta(days=offset)
+            schedule = SESSION_SCHEDULE if self.calendar.is_trading_day(day) else SESSION_SCHEDULE[:1]
+            for start, phase in schedule:
+                at = datetime.combine(day, start)
+                if at <= now or phase == previous:
+                    continue
+                if phases is None or phase in phases:
+                    return at, phase
+                previous = phase
+        return None
+
+    async def _sleep_until(self, at, lead=0):
+        """at - lead 시각까지 대기. Returns: 도달했으면 True (MAX_SLEEP_SEC만큼만 자고 깼으면 False)"""
+        delay = (at - datetime.now()).total_seconds() - lead
+        if delay <= 0:
+            return True
+        await asyncio.sleep(min(delay, MAX_SLEEP_SEC))
+        return delay <= MAX_SLEEP_SEC
+
+    async def wait_for(self, phases, lead=0):
+        """
+        phases 중 하나가 시작될 때까지 대기. 이미 해당 구간이면 즉시 반환.
+        lead: 구간 시작 lead초 전에 미리 깨어남 (예: 09:00 장 시작 전 워밍업)
+        Returns: 진입한(또는 곧 진입할) 구간
+        """
+        while True:
+            now = datetime.now()
+            self.calendar.schedule_load(now.date())
+            current = self.phase(now)
+            if current in phases:
+                return current
+
+            target = self.next_transition(now, phases)
+            if target is None:
+                await asyncio.sleep(MAX_SLEEP_SEC)
+                continue
+
+            at, phase = target
+            if await self._sleep_until(at, lead):
+                return phase
+
+    async def transitions(self):
+        """구간 전환 스트림: 전환 시각에 깨어나 (이전 구간, 새 구간)을 yield"""
+        current = self.phase()
+        while True:
+            self.calendar.schedule_load(datetime.now().date())
+            target = self.next_transition()
+            if target is None:
+                await asyncio.sleep(MAX_SLEEP_SEC)
+            else:
+                await self._sleep_until(target[0])
+
+            new_phase = self.phase()
+            if new_phase != current:
+                print(f"[Market Session] {current} -> {new_phase}")
+                yield current, new_phase
+                current = new_phase
+
+
+# 프로세스당 1개 (run_theme_sync / run_kis_feed / 히트맵 View 공용)
+market_session = MarketSession()
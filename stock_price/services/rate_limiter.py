@@ -0,0 +1,117 @@
+import time
+import random
+import asyncio
+import threading
+import weakref
+import httpx
+
+RETRY_BASE_DELAY = 0.25
+
+
+class TokenBucketRateLimiter:
+    """
+    외부 HTTP API 공용 유량 제어기 (KIS REST, 네이버 검색 API 등 API별로 1개씩)
+    - 토큰 버킷: 초당 rate건, 최대 burst건까지 순간 허용 (sync/async 호출이 같은 버킷을 공유)
+    - 세마포어: 동시 요청 수를 concurrency로 제한 (이벤트 루프별)
+    - 재시도: 유량 초과 응답(is_rate_limited) / 네트워크 오류 시 지수 백오프 + 지터 후 재요청
+    API별 유량 초과 판정이 다르면 is_rate_limited()를 재정의한다.
+    """
+    def __init__(self, rate, burst, concurrency, max_retries=3, name="HTTP"):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self._semaphores = weakref.WeakKeyDictionary()  # event loop -> asyncio.Semaphore
+
+    def _take_token(self):
+        """토큰 1개 차감 시도. Returns: 0이면 성공, 아니면 토큰이 찰 때까지 기다릴 시간(초)"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            return (1 - self._tokens) / self.rate
+
+    def _drain(self):
+        """유량 초과 응답을 받으면 버킷을 비워 다른 요청도 함께 쉬도록 한다."""
+        with self._lock:
+            self._tokens = 0
+            self._updated = time.monotonic()
+
+    def _backoff(self, attempt):
+        delay = RETRY_BASE_DELAY * (2 ** attempt)
+        return delay + random.uniform(0, delay)
+
+    def _semaphore(self):
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.concurrency)
+            self._semaphores[loop] = semaphore
+        return semaphore
+
+    async def acquire(self):
+        while True:
+            wait = self._take_token()
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+    def acquire_sync(self):
+        while True:
+            wait = self._take_token()
+            if not wait:
+                return
+            time.sleep(wait)
+
+    async def request(self, client, method, url, **kwargs):
+        """유량 제어 + 재시도를 적용한 비동기 요청. 재시도 후에도 실패하면 마지막 응답/예외를 그대로 반환/전파"""
+        async with self._semaphore():
+            for attempt in range(self.max_retries + 1):
+                await self.acquire()
+                try:
+                    response = await client.request(method, url, **kwargs)
+                except httpx.TransportError as e:
+                    if attempt >= self.max_retries:
+                        raise
+                    print(f"[{self.name} RateLimiter] Network error ({e.__class__.__name__}), retry {attempt + 1}/{self.max_retries}")
+                    await asyncio.sleep(self._backoff(attempt))
+                    continue
+
+                if not self.is_rate_limited(response) or attempt >= self.max_retries:
+                    return response
+
+                self._drain()
+                print(f"[{self.name} RateLimiter] Rate limited, retry {attempt + 1}/{self.max_retries}")
+                await asyncio.sleep(self._backoff(attempt))
+
+    def request_sync(self, client, method, url, **kwargs):
+        """request()의 동기 버전 (TemplateView 등 sync 경로용, 세마포어 없이 토큰 버킷만 공유)"""
+        for attempt in range(self.max_retries + 1):
+            self.acquire_sync()
+            try:
+                response = client.request(method, url, **kwargs)
+            except httpx.TransportError as e:
+                if attempt >= self.max_retries:
+                    raise
+                print(f"[{self.name} RateLimiter] Network error ({e.__class__.__name__}), retry {attempt + 1}/{self.max_retries}")
+                time.sleep(self._backoff(attempt))
+                continue
+
+            if not self.is_rate_limited(response) or attempt >= self.max_retries:
+                return response
+
+            self._drain()
+            print(f"[{self.name} RateLimiter] Rate limited, retry {attempt + 1}/{self.max_retries}")
+            time.sleep(self._backoff(attempt))
+
+
+    def is_rate_limited(self, response):
+        """기본: HTTP 429"""
+        return response.status_code == 429
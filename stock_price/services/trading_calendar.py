@@ -0,0 +1,182 @@
+import asyncio
+import calendar
+import time as time_module
+from bisect import bisect_right
+from datetime import date, datetime, time
+from asgiref.sync import sync_to_async
+from .kis_rest_client import kis_rest_client
+
+# 장 운영 구간 (KRX 기준)
+PHASE_PRE_OPEN = "pre_open"  # 장전 동시호가 (단일가)
+PHASE_REGULAR = "regular"  # 정규장 (접속매매)
+PHASE_CLOSING_AUCTION = "closing_auction"  # 장마감 동시호가 (단일가)
+PHASE_AFTER_HOURS = "after_hours"  # 시간외 종가/단일가
+PHASE_CLOSED = "closed"
+
+# 개장일 시간표: (시작 시각, 구간). 각 구간은 다음 항목의 시작 시각 전까지 유지
+SESSION_SCHEDULE = (
+    (time(0, 0), PHASE_CLOSED),
+    (time(8, 30), PHASE_PRE_OPEN),
+    (time(9, 0), PHASE_REGULAR),
+    (time(15, 20), PHASE_CLOSING_AUCTION),
+    (time(15, 30), PHASE_CLOSED),
+    (time(15, 40), PHASE_AFTER_HOURS),
+    (time(18, 0), PHASE_CLOSED),
+)
+_SCHEDULE_TIMES = [start for start, _ in SESSION_SCHEDULE]
+
+# 정규장 체결 시세가 나오는 구간 (09:00 ~ 15:30)
+TRADING_PHASES = (PHASE_REGULAR, PHASE_CLOSING_AUCTION)
+
+LOAD_RETRY_SEC = 600  # 달력 적재 실패 시 재시도 간격
+
+
+class TradingCalendar:
+    """
+    거래 달력 (일자별 개장 여부)
+    - KIS 국내휴장일조회(chk-holiday)를 월 단위로 1회만 호출하여 DB(TradingDay)에 저장
+    - 프로세스 메모리(dict)에 올려 두고 is_trading_day/session_state는 네트워크/DB 없이 O(1)로 응답
+    - 아직 적재되지 않은 달은 평일=개장으로 간주하고, 적재는 백그라운드로 진행한다
+    """
+    def __init__(self):
+        self._days = {}  # date -> 개장 여부
+        self._loaded_months = set()  # (year, month)
+        self._load_task = None
+        self._next_attempt = 0.0
+        self._db_misses = {}  # (year, month) -> DB에 달력이 없던 마지막 확인 시각 (monotonic)
+
+    def is_trading_day(self, day):
+        is_open = self._days.get(day)
+        if is_open is None:
+            return day.weekday() < 5
+        return is_open
+
+    def session_state(self, now=None):
+        """Returns: 장 운영 구간 (PHASE_*)"""
+        now = now or datetime.now()
+        if not self.is_trading_day(now.date()):
+            return PHASE_CLOSED
+        return SESSION_SCHEDULE[bisect_right(_SCHEDULE_TIMES, now.time()) - 1][1]
+
+    def is_loaded(self, day):
+        return (day.year, day.month) in self._loaded_months
+
+    async def ensure_month(self, day=None):
+        """
+        해당 월 달력을 메모리에 적재 (DB에 있으면 DB에서, 없으면 KIS API 조회 후 DB에 저장)
+        Returns: 적재 성공 여부
+        """
+        day = day or date.today()
+        if self.is_loaded(day):
+            return True
+
+        days = await sync_to_async(self._load_month_from_db)(day)
+        if days is None:
+            days = await self._fetch_month(day)
+            if not days:
+                return False
+            # 응답이 말일까지 오지 않았더라도(페이지 제한/부분 응답) 받은 만큼으로 확정하고 빠진 날은 평일 기준으로 채워 저장
+            # -> 다른 프로세스/재시도에서도 DB에서 바로 적재되어 같은 달을 다시 조회하지 않음
+            days = self._fill_month(day, days)
+            await sync_to_async(self._save_days)(days)
+
+        self._apply(days)
+        self._loaded_months.add((day.year, day.month))
+        return True
+
+    @staticmethod
+    def _fill_month(day, days):
+        """해당 월에서 응답에 없는 날짜를 평일=개장으로 채운다 (응답에 포함된 날은 그대로)"""
+        filled = dict(days)
+        for day_num in range(1, calendar.monthrange(day.year, day.month)[1] + 1):
+            current = day.replace(day=day_num)
+            filled.setdefault(current, current.weekday() < 5)
+        return filled
+
+    def ensure_month_sync(self, day=None):
+        """
+        (Sync 경로용) DB에 저장된 달력만 적재. API 호출은 하지 않는다.
+        DB에 없던 달은 LOAD_RETRY_SEC 동안 다시 조회하지 않는다 (매 호출마다 DB 조회 방지)
+        """
+        day = day or date.today()
+        month = (day.year, day.month)
+        if self.is_loaded(day):
+            return True
+
+        missed_at = self._db_misses.get(month)
+        if missed_at is not None and time_module.monotonic() - missed_at < LOAD_RETRY_SEC:
+            return False
+
+        days = self._load_month_from_db(day)
+        if days is None:
+            self._db_misses[month] = time_module.monotonic()
+            return False
+
+        self._db_misses.pop(month, None)
+        self._apply(days)
+        return self.is_loaded(day)
+
+    def schedule_load(self, day=None):
+        """요청 경로용: 이번 달 달력이 없으면 기다리지 않고 백그라운드 적재만 예약"""
+        day = day or date.today()
+        if self.is_loaded(day) or time_module.monotonic() < self._next_attempt:
+            return
+        if self._load_task and not self._load_task.done() and self._load_task.get_loop() is asyncio.get_running_loop():
+            return
+        self._load_task = asyncio.create_task(self._load_safely(day))
+
+    async def _load_safely(self, day):
+        try:
+            loaded = await self.ensure_month(day)
+        except Exception as e:
+            print(f"[Trading Calendar] Load error: {e}")
+            loaded = False
+        if not loaded:
+            self._next_attempt = time_module.monotonic() + LOAD_RETRY_SEC
+
+    def _apply(self, days):
+        self._days.update(days)
+        months = {(day.year, day.month) for day in days}
+        for year, month in months:
+            last_day = date(year, month, calendar.monthrange(year, month)[1])
+            if last_day in self._days:
+                self._loaded_months.add((year, month))
+
+    def _load_month_from_db(self, day):
+        """Returns: {date: 개장 여부} 또는 해당 월 말일까지 저장되어 있지 않으면 None"""
+        from stock_price.models import TradingDay
+
+        first_day = day.replace(day=1)
+        last_day = day.replace(day=calendar.monthrange(day.year, day.month)[1])
+        days = dict(
+            TradingDay.objects.filter(date__range=(first_day, last_day)).values_list('date', 'is_open')
+        )
+        return days if last_day in days else None
+
+    def _save_days(self, days):
+        from stock_price.models import TradingDay
+
+        TradingDay.objects.bulk_create(
+            [TradingDay(date=day, is_open=is_open) for day, is_open in days.items()],
+            update_conflicts=True,
+            unique_fields=['date'],
+            update_fields=['is_open'],
+        )
+
+    async def _fetch_month(self, day):
+        rows = await kis_rest_client.get_holiday_calendar_async(day.replace(day=1).strftime("%Y%m%d"))
+        if not rows:
+            return None
+
+        days = {}
+        for row in rows:
+            try:
+                days[datetime.strptime(row['bass_dt'], "%Y%m%d").date()] = row.get('opnd_yn') == 'Y'
+            except (KeyError, ValueError):
+                continue
+        print(f"[Trading Calendar] Fetched {len(days)} days from {day:%Y-%m}")
+        return days
+
+
+# 프로세스당 1개
+trading_calendar = TradingCalendar()
@@ -3,6 +3,8 @@ const StockApp = {
     version: "1.2", // For cache verification
     socket: null,
     stockCode: null,
+    schema: null, // Compact 모드 필드 스키마 (서버가 연결 직후 1회 전송)
+    lastBook: null, // 호가 변경분(delta)을 적용할 직전 전체 호가
 
 
     init: function () {
@@ -161,7 +163,9 @@ const StockApp = {
         this.disconnectWS();
 
         this.updateStatus('연결 시도 중...');
-        this.socket = new WebSocket('ws://' + window.location.host + '/ws/stock/' + code + '/');
+        this.schema = null;
+        this.lastBook = null;
+        this.socket = new WebSocket('ws://' + window.location.host + '/ws/stock/' + code + '/?format=compact');
 
         this.socket.onopen = () => this.updateStatus(`연결됨 (${code})`);
         this.socket.onmessage = (event) => this.handleMessage(event);
@@ -226,21 +230,55 @@ const StockApp = {
         try {
             const data = JSON.parse(event.data);
 
-            // 1. 호가 데이터 (10호가가 모두 있어야 진짜 호가 데이터임)
-            // 체결 데이터에도 ASKP1, BIDP1은 포함되어 있어서 오동작함 -> ASKP10, BIDP10 체크로 구분
-            if (data.ASKP10 !== undefined && data.BIDP10 !== undefined) {
-                this.renderHoga(data);
+            // Compact 모드: 스키마 수신 후 위치 배열을 레코드로 복원
+            if (data.type === 'schema') {
+                this.schema = data.fields;
+                return;
+            }
+            if (Array.isArray(data)) {
+                data.forEach(row => {
+                    if (row[0] === 'D') {
+                        this.applyBookDelta(StockUtils.decodeCompactDelta(this.schema, row));
+                        return;
+                    }
+                    const record = StockUtils.decodeCompact(this.schema, row);
+                    if (record) this.handleRecord(record);
+                });
+                return;
             }
 
-            // 2. 체결 데이터
-            if (data.STCK_PRPR !== undefined && data.STCK_CNTG_HOUR) {
-                this.renderExecution(data);
+            if (data.type === 'book_delta') {
+                this.applyBookDelta(data.changes);
+                return;
             }
+
+            this.handleRecord(data);
         } catch (e) {
             console.error("Parse Error", e);
         }
     },
 
+    applyBookDelta: function (changes) {
+        // 전체 호가(keyframe)를 아직 받지 못했으면 다음 keyframe까지 대기
+        if (!this.lastBook || !changes) return;
+        Object.assign(this.lastBook, changes);
+        this.renderHoga(this.lastBook);
+    },
+
+    handleRecord: function (data) {
+        // 1. 호가 데이터 (10호가가 모두 있어야 진짜 호가 데이터임)
+        // 체결 데이터에도 ASKP1, BIDP1은 포함되어 있어서 오동작함 -> ASKP10, BIDP10 체크로 구분
+        if (data.ASKP10 !== undefined && data.BIDP10 !== undefined) {
+            this.lastBook = data;
+            this.renderHoga(data);
+        }
+
+        // 2. 체결 데이터
+        if (data.STCK_PRPR !== undefined && data.STCK_CNTG_HOUR) {
+            this.renderExecution(data);
+        }
+    },
+
     renderExecution: function (data) {
         const price = data.STCK_PRPR;
         const diff = data.PRDY_VRSS;
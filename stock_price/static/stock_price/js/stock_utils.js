@@ -30,6 +30,40 @@ const StockUtils = {
         el.addEventListener('animationend', () => {
             el.classList.remove(flashClass);
         }, { once: true });
+    },
+
+    /**
+     * Decode a compact (positional array) record using the schema sent by the server
+     * @param {Object} schema { "E": [field names...], "B": [field names...] }
+     * @param {Array} row ["E" | "B", value1, value2, ...]
+     * @returns {Object|null}
+     */
+    decodeCompact: function (schema, row) {
+        const fields = schema ? schema[row[0]] : null;
+        if (!fields) return null;
+
+        const record = {};
+        for (let i = 0; i < fields.length; i++) {
+            record[fields[i]] = row[i + 1];
+        }
+        return record;
+    },
+
+    /**
+     * Decode a compact order book delta row into changed fields
+     * @param {Object} schema { "B": [field names...] }
+     * @param {Array} row ["D", code, fieldIndex1, value1, fieldIndex2, value2, ...]
+     * @returns {Object|null}
+     */
+    decodeCompactDelta: function (schema, row) {
+        const fields = schema ? schema['B'] : null;
+        if (!fields) return null;
+
+        const changes = {};
+        for (let i = 2; i < row.length; i += 2) {
+            changes[fields[row[i]]] = row[i + 1];
+        }
+        return changes;
     }
 };
 
@@ -1,7 +1,26 @@
+from django.test import SimpleTestCase, TestCase
 from rest_framework.test import APITestCase
 from unittest.mock import patch, MagicMock, AsyncMock
-from stock_price.services.kis_rest_client import kis_rest_client
+from stock_price.services.kis_rest_client import kis_rest_client, KISRestClient
+from stock_price.services.kis_rate_limiter import KISRateLimiter
+from stock_price.services.rate_limiter import TokenBucketRateLimiter
+from stock_price.services.kis_response_cache import KISResponseCache
+from stock_price.services.trading_calendar import TradingCalendar, TRADING_PHASES, PHASE_PRE_OPEN, PHASE_REGULAR, PHASE_CLOSING_AUCTION, PHASE_CLOSED, PHASE_AFTER_HOURS
+from stock_price.services.market_session import MarketSession
+from stock_price.models import TradingDay
+from datetime import date, datetime
+from stock_price.services.kis_decoder import decode_frame, iter_records, validate_frame, encode_compact, COMPACT_SCHEMA
+from stock_price.services.kis_conflator import TickConflator
+from stock_price.services.kis_book_delta import BookDeltaEncoder, encode_compact_delta
+from stock_price.services.kis_snapshot import SnapshotStore
+from stock_price.services.kis_ws_client import KISWebSocketClient, KISWebSocketPool, KISFeedProxy, KISFeedRegistry, FEED_CHANNEL, build_pool
+from channels.exceptions import ChannelFull
+import os
+from asgiref.sync import async_to_sync
 import asyncio
+import json
+import time
+import httpx
 
 class StockRankingServiceTest(APITestCase):
     @patch('stock_price.services.kis_rest_client.kis_rest_client.get_fluctuation_rank', new_callable=AsyncMock)
@@ -61,3 +80,620 @@ class StockRankingServiceTest(APITestCase):
         result = asyncio.run(kis_rest_client.get_volume_rank())
         self.assertIsNone(result, "Should return None on failure")
         print("[TEST] 거래량 순위 조회 실패 처리 확인")
+
+
+class KISRestClientPoolTest(SimpleTestCase):
+    def test_async_client_reused_per_event_loop(self):
+        """
+        [Service] 같은 이벤트 루프에서는 AsyncClient(커넥션 풀)를 재사용하고, 루프가 다르면 새로 만드는지 테스트
+        """
+        client = KISRestClient()
+
+        async def get_twice():
+            first, second = client._get_async_client(), client._get_async_client()
+            await client.aclose()
+            return first, second
+
+        first, second = asyncio.run(get_twice())
+        third, _ = asyncio.run(get_twice())
+
+        self.assertIs(first, second)
+        self.assertIsNot(first, third)
+        self.assertTrue(first.is_closed)
+        self.assertIs(client._get_sync_client(), client._get_sync_client())
+        client.close()
+        print("[TEST] 커넥션 풀 재사용 확인")
+
+
+class KISRateLimiterTest(SimpleTestCase):
+    def test_token_bucket_limits_rate(self):
+        """
+        [Service] 토큰 버킷이 초당 요청 수를 제한하는지 테스트 (burst 1, 초당 50건 -> 6건에 최소 0.1초)
+        """
+        limiter = KISRateLimiter(rate=50, burst=1)
+
+        async def scenario():
+            await asyncio.gather(*(limiter.acquire() for _ in range(6)))
+
+        start = time.monotonic()
+        asyncio.run(scenario())
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+        print("[TEST] 토큰 버킷 유량 제한 확인")
+
+    def test_retry_on_rate_limit_response(self):
+        """
+        [Edge Case] EGW00201(초당 거래건수 초과) 응답 시 백오프 후 재시도하여 결과를 받는지 테스트
+        """
+        limiter = KISRateLimiter(rate=1000, burst=10, max_retries=2)
+        limiter._backoff = lambda attempt: 0
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            if len(calls) == 1:
+                return httpx.Response(500, json={"rt_cd": "1", "msg_cd": "EGW00201", "msg1": "초당 거래건수를 초과하였습니다."})
+            return httpx.Response(200, json={"rt_cd": "0", "output": {"stck_prpr": "71500"}})
+
+        async def scenario():
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+                return await limiter.request(client, "GET", "https://kis.test/price")
+
+        response = asyncio.run(scenario())
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(response.json()["rt_cd"], "0")
+        print("[TEST] 유량 초과 재시도 확인")
+
+    def test_generic_limiter_only_retries_http_429(self):
+        """
+        [Edge Case] 범용 토큰 버킷(네이버 등)은 HTTP 429만 유량 초과로 보고, KIS 오류코드(EGW00201)는 해석하지 않는지 테스트
+        """
+        limiter = TokenBucketRateLimiter(rate=1000, burst=10, concurrency=4, max_retries=2, name="Naver")
+        limiter._backoff = lambda attempt: 0
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            if len(calls) == 1:
+                return httpx.Response(429)
+            return httpx.Response(200, json={"msg_cd": "EGW00201"})
+
+        async def scenario():
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+                return await limiter.request(client, "GET", "https://naver.test/news")
+
+        response = asyncio.run(scenario())
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(KISRateLimiter().is_rate_limited(response))
+        print("[TEST] 범용 유량 제어기 확인")
+
+
+class KISResponseCacheTest(SimpleTestCase):
+    def test_concurrent_callers_share_one_fetch(self):
+        """
+        [Service] 동시에 들어온 같은 순위 요청은 업스트림 1회만 호출하고, TTL 동안은 캐시를 반환하는지 테스트
+        """
+        response_cache = KISResponseCache(ttl=5)
+        key = response_cache.make_key("FHPST01700000", {"fid_input_iscd": "0000", "test": "single-flight"})
+        fetch_count = 0
+
+        async def fetch():
+            nonlocal fetch_count
+            fetch_count += 1
+            await asyncio.sleep(0.01)
+            return [{"stck_shrn_iscd": "005930"}]
+
+        async def scenario():
+            results = await asyncio.gather(*(response_cache.get_or_fetch(key, fetch) for _ in range(5)))
+            cached = await response_cache.get_or_fetch(key, fetch)
+            refreshed = await response_cache.get_or_fetch(key, fetch, force_refresh=True)
+            return results, cached, refreshed
+
+        results, cached, refreshed = asyncio.run(scenario())
+        self.assertEqual(fetch_count, 2)
+        self.assertTrue(all(result == cached == refreshed for result in results))
+        print("[TEST] 순위 캐시 single-flight 확인")
+
+
+class KISDecoderTest(SimpleTestCase):
+    EXEC_FRAME = (
+        "0|H0STCNT0|001|005930^093012^71500^2^500^0.70^71423.55^71000^71800^70900^71600^71500^15^4528113^323511982000"
+        "^10211^12877^2666^112.34^1983001^2227789^1^52.91^38.12^090000^2^500^090412^5^-300^090001^2^600^20260105^20^N"
+        "^35112^48113^1211008^1398112^0.08^11874411^38.14^0^0^71000"
+    )
+
+    def test_decode_frame_matches_serializer(self):
+        """
+        [Decoder] 고속 디코더 결과가 기존 Serializer 경로와 동일한지 테스트
+        """
+        tr_id, record = decode_frame(self.EXEC_FRAME)
+
+        self.assertEqual(tr_id, "H0STCNT0")
+        self.assertEqual(record["MKSC_SHRN_ISCD"], "005930")
+        self.assertEqual(record["STCK_PRPR"], 71500.0)
+        self.assertEqual(record, dict(validate_frame(tr_id, self.EXEC_FRAME)))
+        print("[TEST] 고속 디코더 결과 일치 확인")
+
+    def test_decode_frame_invalid(self):
+        """
+        [Edge Case] 비대상 TR_ID / 잘못된 형식 / 누락 필드 처리 테스트
+        """
+        self.assertIsNone(decode_frame("0|H0STCNI0|001|abc"))
+        self.assertIsNone(decode_frame("garbage"))
+
+        tr_id, record = decode_frame("0|H0STCNT0|001|005930^093012^abc")
+        self.assertIsNone(record["STCK_PRPR"])
+        self.assertIsNone(record["VI_STND_PRC"])
+        print("[TEST] 디코더 예외 입력 처리 확인")
+
+    def test_iter_records_multi_record_frame(self):
+        """
+        [Decoder] 한 프레임에 여러 건이 묶여 온 경우 모든 레코드를 순서대로 반환하는지 테스트
+        """
+        content = self.EXEC_FRAME.split('|')[3]
+        second = content.replace("^093012^71500^", "^093013^71600^", 1)
+        frame = f"0|H0STCNT0|002|{content}^{second}"
+
+        records = [record for _, record in iter_records(frame)]
+
+        self.assertEqual(len(records), 2)
+        self.assertEqual(records[0]["STCK_PRPR"], 71500.0)
+        self.assertEqual(records[1]["STCK_PRPR"], 71600.0)
+        self.assertEqual(records[1]["STCK_CNTG_HOUR"], "093013")
+        print("[TEST] 멀티 레코드 프레임 디코딩 확인")
+
+    def test_encode_compact_roundtrip(self):
+        """
+        [Compact] 위치 배열 인코딩이 스키마로 원래 레코드를 복원할 수 있고 크기가 줄어드는지 테스트
+        """
+        _, record = decode_frame(self.EXEC_FRAME)
+        row = encode_compact(record)
+
+        self.assertEqual(row[0], "E")
+        restored = dict(zip(COMPACT_SCHEMA["E"], row[1:]))
+        self.assertEqual(restored, record)
+        self.assertLess(len(json.dumps(row)) * 2, len(json.dumps(record)))
+        print("[TEST] Compact 인코딩 복원 확인")
+
+
+class TickConflatorTest(SimpleTestCase):
+    def test_flush_keeps_latest_snapshot_per_code(self):
+        """
+        [Conflation] 종목별 최신 체결/호가만 남기고 flush 당 1회 전송하는지 테스트
+        """
+        channel_layer = MagicMock()
+        channel_layer.group_send = AsyncMock()
+        snapshots = MagicMock(save=AsyncMock())
+        conflator = TickConflator(channel_layer, interval_ms=100, snapshots=snapshots)
+
+        async def scenario():
+            for price in (71500.0, 71600.0, 71700.0):
+                conflator.push("H0STCNT0", "005930", {"STCK_PRPR": price})
+            conflator.push("H0UNASP0", "005930", {"ASKP1": 71800.0})
+            conflator.push("H0STCNT0", "000660", {"STCK_PRPR": 182300.0})
+            await conflator.flush()
+
+        asyncio.run(scenario())
+
+        self.assertEqual(channel_layer.group_send.await_count, 2)
+        group, message = channel_layer.group_send.await_args_list[0].args
+        self.assertEqual(group, "stock_005930")
+        self.assertEqual(message["records"], [{"STCK_PRPR": 71700.0}, {"ASKP1": 71800.0}])
+        snapshots.save.assert_awaited_once()
+        print("[TEST] 틱 병합(Conflation) 동작 확인")
+
+
+class BookDeltaEncoderTest(SimpleTestCase):
+    def test_delta_and_keyframe(self):
+        """
+        [Delta] 첫 호가는 keyframe, 이후는 변경 필드만, 주기마다 다시 keyframe을 보내는지 테스트
+        """
+        encoder = BookDeltaEncoder(keyframe_interval=3)
+        book = {"MKSC_SHRN_ISCD": "005930", "ASKP1": 71600.0, "ASKP_RSQN1": 1000.0, "BIDP1": 71500.0}
+
+        self.assertIsNone(encoder.encode(dict(book)))
+        self.assertEqual(encoder.encode(dict(book, ASKP_RSQN1=900.0)), {"ASKP_RSQN1": 900.0})
+        self.assertEqual(encoder.encode(dict(book, ASKP_RSQN1=900.0)), {})
+        self.assertIsNone(encoder.encode(dict(book)))  # keyframe 주기
+
+        row = encode_compact_delta("005930", {"ASKP_RSQN1": 900.0})
+        self.assertEqual(row, ["D", "005930", COMPACT_SCHEMA["B"].index("ASKP_RSQN1"), 900])
+        print("[TEST] 호가 변경분 인코딩 확인")
+
+
+class SnapshotStoreTest(SimpleTestCase):
+    def test_memory_first_then_redis_fallback(self):
+        """
+        [Snapshot] 메모리에 있는 종목은 바로 반환하고, 없는 종목만 Redis에서 조회하는지 테스트
+        """
+        store = SnapshotStore()
+        store._save_to_redis = MagicMock()
+        store._load_from_redis = MagicMock(return_value={"000660": {"exec": {"STCK_PRPR": 182300.0}}})
+
+        async def scenario():
+            await store.save({"005930": {"exec": {"STCK_PRPR": 71500.0}}})
+            await store.save({"005930": {"book": {"ASKP1": 71600.0}}})
+            return await store.get_many(["005930", "000660"])
+
+        result = asyncio.run(scenario())
+
+        self.assertEqual(result["005930"], {"exec": {"STCK_PRPR": 71500.0}, "book": {"ASKP1": 71600.0}})
+        self.assertEqual(result["000660"]["exec"]["STCK_PRPR"], 182300.0)
+        store._load_from_redis.assert_called_once_with(["000660"])
+        self.assertEqual(store._save_to_redis.call_count, 2)
+        print("[TEST] 스냅샷 캐시 조회 확인")
+
+    def test_expired_or_discarded_memory_is_not_served(self):
+        """
+        [Edge Case] TTL이 지난 메모리 스냅샷과 구독 해제로 삭제된 스냅샷은 반환하지 않는지 테스트
+        """
+        store = SnapshotStore()
+        store._save_to_redis = MagicMock()
+        store._delete_from_redis = MagicMock()
+        store._load_from_redis = MagicMock(return_value={})
+
+        async def scenario():
+            await store.save({"005930": {"exec": {"STCK_PRPR": 71500.0}}, "000660": {"exec": {"STCK_PRPR": 182300.0}}})
+            saved_at, slot = store._memory["005930"]
+            store._memory["005930"] = (saved_at - store.TTL, slot)  # 하루 전 시세
+            await store.discard(["000660"])
+            return await store.get_many(["005930", "000660"])
+
+        self.assertEqual(asyncio.run(scenario()), {})
+        self.assertNotIn("005930", store._memory)
+        store._delete_from_redis.assert_called_once_with(["000660"])
+        store._load_from_redis.assert_called_once_with(["005930", "000660"])
+        print("[TEST] 오래된 스냅샷 제외 확인")
+
+    def test_fresh_update_does_not_revive_stale_record(self):
+        """
+        [Edge Case] 만료된 스냅샷에 새 호가가 들어와도 이전 장의 체결이 함께 살아나지 않는지 테스트 (메모리 + Redis)
+        """
+        store = SnapshotStore()
+        store._save_to_redis = MagicMock()
+
+        async def scenario():
+            await store.save({"005930": {"exec": {"STCK_PRPR": 71500.0}}})
+            saved_at, slot = store._memory["005930"]
+            store._memory["005930"] = (saved_at - store.TTL, slot)  # 전날 체결
+            await store.save({"005930": {"book": {"ASKP1": 71600.0}}})
+            return await store.get_many(["005930"])
+
+        self.assertEqual(asyncio.run(scenario()), {"005930": {"book": {"ASKP1": 71600.0}}})
+
+        stale_at = time.time() - store.TTL - 1
+        pipe = MagicMock()
+        pipe.execute.return_value = [{
+            b"exec": b'{"STCK_PRPR": 71500.0}', b"exec_at": str(stale_at).encode(),
+            b"book": b'{"ASKP1": 71600.0}', b"book_at": str(time.time()).encode(),
+        }]
+        with patch.object(store, '_redis', return_value=MagicMock(pipeline=MagicMock(return_value=pipe))):
+            self.assertEqual(store._load_from_redis(["005930"]), {"005930": {"book": {"ASKP1": 71600.0}}})
+        print("[TEST] 만료 스냅샷 부활 방지 확인")
+
+
+class KISWebSocketSubscriptionTest(SimpleTestCase):
+    def _make_client(self, grace=30, max_codes=20):
+        client = KISWebSocketClient()
+        client.running = True  # 실제 KIS 연결 태스크는 띄우지 않음
+        client.unsubscribe_grace = grace
+        client.max_subscriptions = max_codes
+        client._send_subscription_packet = AsyncMock()
+        return client
+
+    def test_unsubscribe_after_grace_period(self):
+        """
+        [Subscription] 시청자가 0명이 되면 유예 시간 후 구독 해제 패킷을 보내는지 테스트
+        """
+        client = self._make_client(grace=0.01)
+
+        async def scenario():
+            await client.subscribe("005930")
+            await client.unsubscribe("005930")
+            await asyncio.sleep(0.05)
+
+        asyncio.run(scenario())
+
+        client._send_subscription_packet.assert_any_await("005930")
+        client._send_subscription_packet.assert_awaited_with("005930", tr_type="2")
+        self.assertNotIn("005930", client._active_codes)
+        print("[TEST] 유예 후 구독 해제 확인")
+
+    def test_resubscribe_within_grace_keeps_subscription(self):
+        """
+        [Edge Case] 유예 시간 내 재구독 시 해제/재등록 패킷이 발생하지 않는지 테스트
+        """
+        client = self._make_client(grace=0.05)
+
+        async def scenario():
+            await client.subscribe("005930")
+            await client.unsubscribe("005930")
+            await client.subscribe("005930")
+            await asyncio.sleep(0.1)
+
+        asyncio.run(scenario())
+
+        self.assertEqual(client._send_subscription_packet.await_count, 1)
+        self.assertIn("005930", client._active_codes)
+        print("[TEST] 유예 시간 내 재구독 확인")
+
+    def test_cap_evicts_idle_code_first(self):
+        """
+        [Subscription] 구독 상한 도달 시 시청자가 없는 종목부터 해제되는지 테스트
+        """
+        client = self._make_client(max_codes=2)
+
+        async def scenario():
+            await client.subscribe("005930")
+            await client.subscribe("000660")
+            await client.unsubscribe("000660")
+            await client.subscribe("035420")
+
+        asyncio.run(scenario())
+
+        client._send_subscription_packet.assert_any_await("000660", tr_type="2")
+        self.assertEqual(list(client._active_codes), ["005930", "035420"])
+        print("[TEST] 구독 상한 LRU 해제 확인")
+
+    def test_cap_queues_new_code_when_all_codes_are_watched(self):
+        """
+        [Edge Case] 모든 구독 종목에 시청자가 있으면 기존 종목을 끊지 않고 대기시켰다가 자리가 나면 구독하는지 테스트
+        """
+        client = self._make_client(grace=0.01, max_codes=1)
+
+        async def scenario():
+            await client.subscribe("005930")
+            await client.subscribe("000660")
+            self.assertEqual(list(client._active_codes), ["005930"])
+            self.assertEqual(list(client._pending_codes), ["000660"])
+            await client.unsubscribe("005930")
+            await asyncio.sleep(0.05)
+
+        asyncio.run(scenario())
+
+        client._send_subscription_packet.assert_any_await("005930", tr_type="2")
+        client._send_subscription_packet.assert_awaited_with("000660")
+        self.assertEqual(list(client._active_codes), ["000660"])
+        self.assertFalse(client._pending_codes)
+        print("[TEST] 구독 상한 시 대기열 확인")
+
+    def test_approval_rejection_matched_by_msg_cd(self):
+        """
+        [Edge Case] 접속키 거부는 msg_cd로만 판단하고, 캐시 무효화는 이벤트 루프를 막지 않는 비동기 경로로 처리하는지 테스트
+        """
+        client = self._make_client()
+        client.approval_key = "approval-1"
+        client.ws = MagicMock(close=AsyncMock())
+        rejected = json.dumps({"header": {"tr_id": "H0STCNT0"}, "body": {"rt_cd": "1", "msg_cd": "OPSP0011", "msg1": "invalid approval : NOT FOUND"}})
+        other = json.dumps({"header": {"tr_id": "H0STCNT0"}, "body": {"rt_cd": "1", "msg_cd": "OPSP0008", "msg1": "MAX SUBSCRIBE OVER (approval)"}})
+
+        with patch('stock_price.services.kis_ws_client.invalidate_approval_key_async', new_callable=AsyncMock) as mock_invalidate:
+            asyncio.run(client._handle_message(other))
+            mock_invalidate.assert_not_awaited()
+            asyncio.run(client._handle_message(rejected))
+
+        mock_invalidate.assert_awaited_once_with(client.appkey, "approval-1")
+        self.assertIsNone(client.approval_key)
+        client.ws.close.assert_awaited_once()
+        print("[TEST] 접속키 거부 코드 처리 확인")
+
+    def test_subscribe_many_single_batch(self):
+        """
+        [Subscription] 일괄 구독 시 신규 종목만 패킷을 보내고 시청자 수가 종목별로 반영되는지 테스트
+        """
+        client = self._make_client()
+
+        async def scenario():
+            await client.subscribe("005930")
+            await client.subscribe_many(["005930", "000660", "035420"])
+            await client.unsubscribe_many(["005930", "000660"])
+
+        asyncio.run(scenario())
+
+        self.assertEqual(client._send_subscription_packet.await_count, 3)
+        self.assertEqual(client._subscriber_counts["005930"], 1)
+        self.assertEqual(client._subscriber_counts["000660"], 0)
+        self.assertEqual(list(client._active_codes), ["005930", "000660", "035420"])
+        print("[TEST] 일괄 구독 확인")
+
+
+class KISWebSocketPoolTest(SimpleTestCase):
+    def test_codes_are_spread_and_routed_consistently(self):
+        """
+        [Pool] 종목이 여러 세션에 분산되고, 같은 종목은 항상 같은 세션으로 라우팅되는지 테스트
+        """
+        sessions = [MagicMock(subscribe=AsyncMock(), unsubscribe=AsyncMock()) for _ in range(3)]
+        pool = KISWebSocketPool(sessions)
+        codes = [f"{n:06d}" for n in range(0, 300000, 1000)]
+
+        used = {id(pool.session_for(code)) for code in codes}
+        self.assertEqual(len(used), 3)
+
+        target = pool.session_for("005930")
+        asyncio.run(pool.subscribe("005930"))
+        asyncio.run(pool.unsubscribe("005930"))
+        target.subscribe.assert_awaited_once_with("005930")
+        target.unsubscribe.assert_awaited_once_with("005930")
+        print("[TEST] 세션 풀 분산/라우팅 확인")
+
+    @patch.dict(os.environ, {"g_appkey_2": "key-2", "g_appsecret_2": "secret-2"})
+    def test_pool_size_is_limited_to_distinct_app_keys(self):
+        """
+        [Edge Case] 세션별 앱키가 없으면 같은 앱키로 세션을 늘리지 않고 설정된 앱키 쌍 수까지만 만드는지 테스트
+        """
+        os.environ.pop("g_appkey_3", None)
+        pool = build_pool(size=4)
+
+        self.assertEqual(len(pool.sessions), 2)
+        self.assertEqual(pool.sessions[1].appkey, "key-2")
+        print("[TEST] 앱키 쌍 수로 세션 풀 제한 확인")
+
+    def test_feed_proxy_forwards_intents(self):
+        """
+        [Feed] remote 모드 프록시가 종목별 첫 구독/마지막 해제만 피드 채널로 전달하는지 테스트
+        """
+        proxy = KISFeedProxy()
+        proxy.channel_layer = MagicMock(send=AsyncMock())
+
+        async def scenario():
+            await proxy.subscribe("005930")
+            await proxy.subscribe("005930")
+            await proxy.unsubscribe("005930")
+            await proxy.unsubscribe("005930")
+
+        asyncio.run(scenario())
+
+        self.assertEqual(proxy.channel_layer.send.await_count, 2)
+        proxy.channel_layer.send.assert_any_await(
+            FEED_CHANNEL, {"type": "feed.subscribe", "proxy": proxy.proxy_id, "codes": ["005930"]})
+        proxy.channel_layer.send.assert_awaited_with(
+            FEED_CHANNEL, {"type": "feed.unsubscribe", "proxy": proxy.proxy_id, "codes": ["005930"]})
+        print("[TEST] 피드 워커 구독 의도 전달 확인")
+
+    def test_feed_proxy_survives_full_channel_and_heartbeats(self):
+        """
+        [Edge Case] 피드 워커 중단으로 채널이 가득 차도 구독 요청이 실패하지 않고, 하트비트로 전체 목록을 다시 보내는지 테스트
+        """
+        proxy = KISFeedProxy(heartbeat_sec=0.01)
+        proxy.channel_layer = MagicMock(send=AsyncMock(side_effect=ChannelFull()))
+
+        async def scenario():
+            await proxy.subscribe_many(["005930", "000660"])
+            proxy.channel_layer.send = AsyncMock()
+            await asyncio.sleep(0.05)
+
+        asyncio.run(scenario())
+
+        proxy.channel_layer.send.assert_any_await(
+            FEED_CHANNEL, {"type": "feed.heartbeat", "proxy": proxy.proxy_id, "codes": ["005930", "000660"]})
+        print("[TEST] 채널 포화 시 하트비트 복구 확인")
+
+    def test_feed_registry_resyncs_and_expires_web_workers(self):
+        """
+        [Feed] 피드 워커가 웹 워커별 구독을 중복 없이 반영하고, 하트비트로 복구/만료 시 해제하는지 테스트
+        """
+        pool = MagicMock(subscribe_many=AsyncMock(), unsubscribe_many=AsyncMock())
+        registry = KISFeedRegistry(pool, lease_sec=60)
+
+        async def scenario():
+            # 피드 워커 재시작 직후: 앞선 subscribe는 유실되고 하트비트만 도착
+            await registry.handle({"type": "feed.heartbeat", "proxy": "web-1", "codes": ["005930", "000660"]}, now=0)
+            # 재전송/중복 메시지는 시청자 수를 늘리지 않음
+            await registry.handle({"type": "feed.subscribe", "proxy": "web-1", "codes": ["005930"]}, now=1)
+            await registry.handle({"type": "feed.subscribe", "proxy": "web-2", "codes": ["005930"]}, now=1)
+            # 유실된 unsubscribe는 다음 하트비트로 반영
+            await registry.handle({"type": "feed.heartbeat", "proxy": "web-1", "codes": ["005930"]}, now=30)
+            return await registry.expire(now=90)
+
+        expired = asyncio.run(scenario())
+
+        self.assertEqual(expired, ["web-2"])
+        self.assertEqual([c.args[0] for c in pool.subscribe_many.await_args_list],
+                         [["000660", "005930"], ["005930"]])
+        self.assertEqual([c.args[0] for c in pool.unsubscribe_many.await_args_list],
+                         [["000660"], ["005930"]])
+        print("[TEST] 피드 워커 구독 재동기화/만료 확인")
+
+
+class TradingCalendarTest(TestCase):
+    def _holiday_rows(self):
+        # 2026년 2월: 16~18일 설 연휴 휴장
+        rows = []
+        for day in range(1, 29):
+            current = date(2026, 2, day)
+            is_open = current.weekday() < 5 and day not in (16, 17, 18)
+            rows.append({"bass_dt": current.strftime("%Y%m%d"), "opnd_yn": "Y" if is_open else "N"})
+        return rows
+
+    @patch('stock_price.services.trading_calendar.kis_rest_client.get_holiday_calendar_async', new_callable=AsyncMock)
+    def test_month_fetched_once_and_served_from_memory(self, mock_fetch):
+        """
+        [Service] 휴장일 API는 월 1회만 호출해 DB에 저장하고, 이후 조회는 메모리/DB로만 응답하는지 테스트
+        """
+        mock_fetch.return_value = self._holiday_rows()
+        trading_calendar = TradingCalendar()
+
+        self.assertTrue(asyncio.run(trading_calendar.ensure_month(date(2026, 2, 10))))
+        self.assertFalse(trading_calendar.is_trading_day(date(2026, 2, 17)))
+        self.assertTrue(trading_calendar.is_trading_day(date(2026, 2, 19)))
+        self.assertEqual(trading_calendar.session_state(datetime(2026, 2, 19, 10, 0)), PHASE_REGULAR)
+        self.assertEqual(trading_calendar.session_state(datetime(2026, 2, 17, 10, 0)), PHASE_CLOSED)
+        self.assertEqual(trading_calendar.session_state(datetime(2026, 2, 19, 16, 0)), PHASE_AFTER_HOURS)
+        self.assertEqual(TradingDay.objects.count(), 28)
+
+        # 다른 프로세스(새 인스턴스)는 DB에서 적재 (API 호출 없음)
+        other = TradingCalendar()
+        self.assertTrue(other.ensure_month_sync(date(2026, 2, 1)))
+        self.assertFalse(other.is_trading_day(date(2026, 2, 16)))
+        mock_fetch.assert_awaited_once()
+        print("[TEST] 거래 달력 적재 확인")
+
+    @patch('stock_price.services.trading_calendar.kis_rest_client.get_holiday_calendar_async', new_callable=AsyncMock)
+    def test_partial_month_response_is_not_fetched_again(self, mock_fetch):
+        """
+        [Edge Case] API가 말일까지 응답하지 않아도 받은 만큼 저장하고, 다른 프로세스가 같은 달을 다시 조회하지 않는지 테스트
+        """
+        # 2026년 5월: 5일 어린이날 휴장, 20일까지만 응답
+        mock_fetch.return_value = [
+            {"bass_dt": f"202605{day:02d}", "opnd_yn": "Y" if date(2026, 5, day).weekday() < 5 and day != 5 else "N"}
+            for day in range(1, 21)
+        ]
+        self.assertTrue(async_to_sync(TradingCalendar().ensure_month)(date(2026, 5, 10)))
+
+        other = TradingCalendar()
+        self.assertTrue(async_to_sync(other.ensure_month)(date(2026, 5, 25)))
+        self.assertFalse(other.is_trading_day(date(2026, 5, 5)))
+        self.assertTrue(other.is_trading_day(date(2026, 5, 26)))
+        self.assertFalse(other.is_trading_day(date(2026, 5, 30)))
+        mock_fetch.assert_awaited_once()
+        print("[TEST] 부분 응답 달력 재조회 방지 확인")
+
+    def test_sync_db_miss_is_memoized_per_month(self):
+        """
+        [Edge Case] DB에 없는 달은 재시도 간격 동안 Sync 경로에서 DB를 다시 조회하지 않는지 테스트
+        """
+        trading_calendar = TradingCalendar()
+
+        with patch.object(trading_calendar, '_load_month_from_db', wraps=trading_calendar._load_month_from_db) as mock_load:
+            self.assertFalse(trading_calendar.ensure_month_sync(date(2026, 3, 2)))
+            self.assertFalse(trading_calendar.ensure_month_sync(date(2026, 3, 3)))
+            self.assertEqual(mock_load.call_count, 1)
+
+            # 다른 달은 따로 조회
+            trading_calendar.ensure_month_sync(date(2026, 4, 1))
+            self.assertEqual(mock_load.call_count, 2)
+        print("[TEST] 달력 DB 미스 메모이즈 확인")
+
+
+class MarketSessionTest(SimpleTestCase):
+    def setUp(self):
+        trading_calendar = TradingCalendar()
+        trading_calendar._days[date(2026, 2, 16)] = False  # 월요일 휴장 (설 연휴)
+        self.session = MarketSession(trading_calendar)
+
+    def test_phases_and_next_transition(self):
+        """
+        [Service] 시간대별 장 운영 구간과, 주말/휴장일을 건너뛴 다음 장 시작 시각을 계산하는지 테스트
+        """
+        self.assertEqual(self.session.phase(datetime(2026, 2, 13, 8, 45)), PHASE_PRE_OPEN)
+        self.assertEqual(self.session.phase(datetime(2026, 2, 13, 9, 0)), PHASE_REGULAR)
+        self.assertEqual(self.session.phase(datetime(2026, 2, 13, 15, 25)), PHASE_CLOSING_AUCTION)
+        self.assertEqual(self.session.phase(datetime(2026, 2, 13, 15, 35)), PHASE_CLOSED)
+        self.assertTrue(self.session.is_open(datetime(2026, 2, 13, 15, 25)))
+        self.assertFalse(self.session.is_open(datetime(2026, 2, 14, 10, 0)))
+
+        self.assertEqual(
+            self.session.next_transition(datetime(2026, 2, 13, 15, 35)),
+            (datetime(2026, 2, 13, 15, 40), PHASE_AFTER_HOURS),
+        )
+        # 금요일 장 마감 후 -> 주말 + 월요일 휴장을 건너뛰고 화요일 장전 동시호가 / 정규장
+        self.assertEqual(
+            self.session.next_transition(datetime(2026, 2, 13, 19, 0)),
+            (datetime(2026, 2, 17, 8, 30), PHASE_PRE_OPEN),
+        )
+        self.assertEqual(
+            self.session.next_transition(datetime(2026, 2, 13, 19, 0), phases=TRADING_PHASES),
+            (datetime(2026, 2, 17, 9, 0), PHASE_REGULAR),
+        )
+        print("[TEST] 장 운영 구간 전환 계산 확인")
+
@@ -1,47 +1,21 @@
-from datetime import datetime, time
-from stock_price.services.kis_rest_client import kis_rest_client
+from datetime import datetime
+from stock_price.services.trading_calendar import trading_calendar
+from stock_price.services.market_session import market_session
 
 def is_market_open():
     """
-    현재 시각이 한국 장 운영 시간(평일 09:00 ~ 15:30)인지 확인.
-    휴일 여부는 KIS API를 통해 정확히 확인.
+    현재 시각이 한국 정규장 시간(개장일 09:00 ~ 15:30)인지 확인.
+    휴일 여부는 DB에 저장된 거래 달력으로 확인 (API 호출 없음).
     """
     now = datetime.now()
-    now_time = now.time()
-
-    # 1. Check if Today is a Business Day (via API)
-    # Note: API call handles weekends and public holidays.
-    # If API fails or returns False, we assume closed.
-    is_business_day = kis_rest_client.get_market_operation_status()
-    if not is_business_day:
-        return False
-
-    # 2. Check Market Hours (09:00 ~ 15:30)
-    market_start = time(9, 0)
-    market_end = time(15, 30)
-
-    if market_start <= now_time <= market_end:
-        return True
-    
-    return False
+    trading_calendar.ensure_month_sync(now.date())
+    return market_session.is_open(now)
 
 async def is_market_open_async():
     """
     is_market_open의 비동기 버전
+    달력이 아직 적재되지 않았으면 기다리지 않고 백그라운드 적재만 예약 (그동안은 평일 기준으로 판단)
     """
     now = datetime.now()
-    now_time = now.time()
-
-    # 1. Check if Today is a Business Day (via Async API)
-    is_business_day = await kis_rest_client.get_market_operation_status_async()
-    if not is_business_day:
-        return False
-
-    # 2. Check Market Hours (09:00 ~ 15:30)
-    market_start = time(9, 0)
-    market_end = time(15, 30)
-
-    if market_start <= now_time <= market_end:
-        return True
-    
-    return False
+    trading_calendar.schedule_load(now.date())
+    return market_session.is_open(now)
@@ -1,5 +1,6 @@
 from django.core.management.base import BaseCommand
 from stock_theme.services import ThemeAnalyzeService
+from stock_price.services.kis_rest_client import kis_rest_client
 import asyncio
 
 class Command(BaseCommand):
@@ -18,4 +19,7 @@ class Command(BaseCommand):
         except Exception as e:
             self.stdout.write(self.style.ERROR(f'Error occurred: {e}'))
         finally:
+            # 이 루프에서 연 KIS REST / 네이버 검색 / LLM 커넥션 정리 (루프를 닫으면 aclose할 수 없음)
+            loop.run_until_complete(kis_rest_client.aclose())
+            loop.run_until_complete(service.aclose())
             loop.close()
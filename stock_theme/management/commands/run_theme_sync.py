@@ -2,7 +2,14 @@ import time
 import asyncio
 from django.core.management.base import BaseCommand
 from stock_price.services.kis_rest_client import kis_rest_client
+from stock_price.services.trading_calendar import trading_calendar, TRADING_PHASES
+from stock_price.services.market_session import market_session
+from auth.kis_auth import get_access_token
 from stock_theme.services.sync_service import ThemeSyncService
+from stock_theme.services.poll_scheduler import AdaptivePollScheduler
+
+# 장 시작 몇 초 전에 깨어나 토큰/달력을 미리 준비할지
+WARMUP_SEC = 60
 
 class Command(BaseCommand):
     help = 'Runs the background worker for Real-time Theme Synchronization'
@@ -20,31 +27,34 @@ class Command(BaseCommand):
         except KeyboardInterrupt:
             self.stdout.write(self.style.WARNING('\nStopping Sync Worker...'))
         finally:
+            # 유지 중인 KIS REST / 네이버 검색 / LLM 커넥션 정리
+            loop.run_until_complete(kis_rest_client.aclose())
+            loop.run_until_complete(sync_service.analyze_service.aclose())
             loop.close()
 
+    async def warm_up(self):
+        """장 시작 직전 준비: 거래 달력 적재 + Access Token 확보 (첫 순위 조회가 바로 나가도록)"""
+        self.stdout.write(f"[{time.strftime('%H:%M:%S')}] Warming up before market open...")
+        try:
+            await trading_calendar.ensure_month()
+            await asyncio.to_thread(get_access_token)
+        except Exception as e:
+            self.stdout.write(self.style.WARNING(f"Warm-up failed: {e}"))
+
     async def run_loop(self, sync_service):
+        await trading_calendar.ensure_month()
+        scheduler = AdaptivePollScheduler()
+
         while True:
-            # Market Time Check (09:00 ~ 15:30 + Buffer, Weekdays)
-            from datetime import datetime
-            now = datetime.now()
-            
-            # 주말(5=토, 6=일)이거나 09:00 이전, 16:00 이후면 휴식
-            # (장 마감 후 조금 여유있게 16시까지는 수집 허용한다고 가정, 또는 사용자 요청대로 즉시 sleep)
-            # 보통 장 종료 후 15:40~50분까지는 순위 확정될 수 있으므로 16시로 설정
-            # 사용자 요청: "장이 종료되면" -> 15:30 이후
-            is_weekend = now.weekday() >= 5
-            is_market_open = 9 <= now.hour < 16 # 09:00 ~ 15:59 (simple check for now)
-            
-            # 더 정밀한 시간 체크 (09:00 ~ 15:30)
-            current_time = now.time()
-            start_time_limit = datetime.strptime("09:00:00", "%H:%M:%S").time()
-            end_time_limit = datetime.strptime("15:30:00", "%H:%M:%S").time() # 정규장 종료
-            
-            in_operating_hours = start_time_limit <= current_time <= end_time_limit
+            # 정규장(09:00 ~ 15:30, 개장일)이 아니면 다음 장 시작 직전까지 대기 (장외 시간 폴링 없음)
+            if not market_session.is_open():
+                target = market_session.next_transition(phases=TRADING_PHASES)
+                next_open = target[0].strftime('%m-%d %H:%M') if target else 'unknown'
+                self.stdout.write(f"[{time.strftime('%H:%M:%S')}] Market Closed ({market_session.phase()}). Sleeping until {next_open}... 🌙")
 
-            if is_weekend or not in_operating_hours:
-                self.stdout.write(f"[{now.strftime('%H:%M:%S')}] Market Closed. Sleeping for 5 minutes... 🌙")
-                await asyncio.sleep(300) # 5분 대기
+                await market_session.wait_for(TRADING_PHASES, lead=WARMUP_SEC)
+                await self.warm_up()
+                await market_session.wait_for(TRADING_PHASES)
                 continue
 
             try:
@@ -52,13 +62,14 @@ class Command(BaseCommand):
                 start_time = time.time()
                 self.stdout.write(f"[{time.strftime('%H:%M:%S')}] Fetching Ranking API...", ending='')
                 
-                # KIS API Call (Async)
-                ranks = await kis_rest_client.get_fluctuation_rank()
+                # KIS API Call (Async) - 항상 새로 조회하여 웹 화면이 읽는 순위 캐시를 갱신
+                ranks = await kis_rest_client.get_fluctuation_rank(force_refresh=True)
                 
                 if not ranks:
                     self.stdout.write(self.style.WARNING(" Empty Data (Market Closed or Error)"))
                 else:
-                    self.stdout.write(self.style.SUCCESS(f" OK ({len(ranks)} items)"))
+                    churn = scheduler.observe(item.get('stck_shrn_iscd') for item in ranks[:30])
+                    self.stdout.write(self.style.SUCCESS(f" OK ({len(ranks)} items, churn {churn:.0%})"))
                     
                     # 2. Detect & Process Changes (Incremental Analysis)
                     # 이 메서드 내부에서 Redis Diff -> LLM Analysis -> DB Save -> Cache Update 수행
@@ -70,10 +81,12 @@ class Command(BaseCommand):
                     else:
                         self.stdout.write("   -> No changes or new entrants.")
 
-                # 3. Wait for next cycle (e.g., 60 seconds)
+                # 3. Wait for next cycle (Top 30 변동이 크면 짧게, 안정적이면 길게 / 시간당 조회 예산 준수)
                 elapsed = time.time() - start_time
-                wait_time = max(10, 60 - elapsed) # Ensure at least 60s interval
-                await asyncio.sleep(wait_time)
+                interval = scheduler.next_interval()
+                await scheduler.publish()
+                self.stdout.write(f"   -> Next fetch in {interval:.0f}s")
+                await asyncio.sleep(max(0, interval - elapsed))
 
             except Exception as e:
                 self.stdout.write(self.style.ERROR(f"\nError in sync loop: {e}"))
@@ -1,15 +1,16 @@
 import os
-import asyncio
 import json
 import logging
 from datetime import date
 from asgiref.sync import sync_to_async
 from django.db import transaction
-from openai import OpenAI
+from django.db.models import Q
 from stock_price.services.kis_rest_client import kis_rest_client
 from stock_theme.models import Theme, ThemeStock
 from stock_price.models import StockInfo
-from .news_collector import NewsCollector
+from .news_collector import NewsCollector, is_fallback_headlines
+from .llm_client import LLMClient
+from .decision_cache import theme_decision_cache
 from langsmith import traceable
 from langsmith.run_helpers import get_current_run_tree
 from django.core.cache import cache
@@ -19,11 +20,14 @@ logger = logging.getLogger(__name__)
 class ThemeAnalyzeService:
     def __init__(self):
         self.news_collector = NewsCollector()
-        self.client = OpenAI(
-            api_key=os.getenv("upstage_secret_key"),
-            base_url="https://api.upstage.ai/v1"
-        )
         self.model = "solar-pro2"
+        self.llm = LLMClient(model=self.model, api_key=os.getenv("upstage_secret_key"))
+        self.decision_cache = theme_decision_cache
+
+    async def aclose(self):
+        """현재 이벤트 루프의 뉴스/LLM 커넥션 정리 (워커/이벤트 루프 종료 전에 호출)"""
+        await self.news_collector.aclose()
+        await self.llm.aclose()
 
     async def analyze_and_save_themes(self):
         """
@@ -42,26 +46,18 @@ class ThemeAnalyzeService:
         # 상위 30개 분석 (히트맵 구성을 위해 확장)
         top_stocks = fluctuation_ranks[:30]
         
-        analysis_targets = []
-        total_stocks = len(top_stocks)
-        
-        for idx, item in enumerate(top_stocks, 1):
-            name = item.get('hts_kor_isnm')
-            code = item.get('stck_shrn_iscd')
-            
-            print(f"[ThemeService] Collecting news for {name} ({idx}/{total_stocks})...")
-            
-            # 뉴스 수집
-            news_list = self.news_collector.collect_news(name)
-            
-            analysis_targets.append({
-                "code": code,
-                "name": name,
+        # 뉴스 수집 (전 종목 병렬, 네이버 API 유량은 news_collector의 rate limiter가 제어)
+        print(f"[ThemeService] Collecting news for {len(top_stocks)} stocks...")
+        news_lists = await self.news_collector.collect_many([item.get('hts_kor_isnm') for item in top_stocks])
+
+        analysis_targets = [
+            {
+                "code": item.get('stck_shrn_iscd'),
+                "name": item.get('hts_kor_isnm'),
                 "news_headlines": news_list
-            })
-            
-            # API Rate Limit (429) 방지
-            await asyncio.sleep(0.5)
+            }
+            for item, news_list in zip(top_stocks, news_lists)
+        ]
 
         # 2. LLM 프롬프트 구성 (Micro-Theme 지향)
         prompt = f"""
@@ -91,106 +87,85 @@ class ThemeAnalyzeService:
         }}
         """
 
-        # 3. LLM 호출
+        # 3. LLM 호출 (스트리밍) + 4. DB 저장
+        # 테마 객체가 하나 완성될 때마다 저장하면서, 같은 종목/같은 이름의 이전 분석 테마를 같은 트랜잭션에서 교체한다.
+        # (히트맵에 이전 분석과 이번 분석이 겹쳐 보이지 않도록) 끝까지 성공하면 남은 이전 테마도 정리.
+        # 중간에 실패하면 이미 교체된 테마는 그대로 두고, 교체되지 않은 이전 테마는 유지.
         print(f"[ThemeService] Requesting analysis to {self.model}...")
+        previous_ids = set(await sync_to_async(list)(
+            Theme.objects.filter(date=date.today()).values_list('id', flat=True)
+        ))
+        saved_ids = []
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
+            async for theme_item in self.llm.stream_json_array(
+                [
                     {"role": "system", "content": "You are a helpful financial analyst specializing in Korean stock market trends. Respond only in JSON."},
                     {"role": "user", "content": prompt}
                 ],
-                stream=False
-            )
-            
-            content = response.choices[0].message.content
-            # Markdown code block 제거 (혹시 포함될 경우)
-            if content.startswith("```json"):
-                content = content[7:]
-            if content.endswith("```"):
-                content = content[:-3]
-            
-            result = json.loads(content)
-            
+                key="themes",
+            ):
+                theme_id = await sync_to_async(self._save_theme)(theme_item, previous_ids)
+                if theme_id:
+                    saved_ids.append(theme_id)
+                    print(f"[ThemeService] Saved theme: {theme_item.get('name')}")
         except Exception as e:
             logger.error(f"LLM Analysis Failed: {e}")
             print(f"Error: {e}")
             return
 
-        # 4. DB 저장
-        await sync_to_async(self._save_to_db)(result.get("themes", []))
-        print("[ThemeService] Analysis completed and saved.")
-
-    def _save_to_db(self, themes_data):
-        today = date.today()
-        
-        with transaction.atomic():
-            # (옵션) 오늘자 기존 분석 데이터가 있다면 삭제 후 재생성? or 추가?
-            # 여기서는 중복 방지를 위해 오늘자 테마 삭제 후 재생성 전략 사용
-            Theme.objects.filter(date=today).delete()
+        if not saved_ids:
+            logger.error("LLM Analysis returned no themes.")
+            return
 
-            for theme_item in themes_data:
-                theme_obj = Theme.objects.create(
-                    name=theme_item['name'],
-                    description=theme_item['description']
-                )
+        await sync_to_async(self._delete_themes)(previous_ids)
+        print("[ThemeService] Analysis completed and saved.")
 
-                for stock_item in theme_item.get('stocks', []):
-                    # StockInfo가 DB에 없으면 생성 (혹은 건너뛰기)
-                    stock_obj, created = StockInfo.objects.get_or_create(
-                        short_code=stock_item['code'],
-                        defaults={'name': stock_item['name']}
-                    )
-                    
-                    ThemeStock.objects.create(
-                        theme=theme_obj,
-                        stock=stock_obj,
-                        reason=stock_item.get('reason', '')
-                    )
-
-    async def analyze_single_stock_incremental(self, code, name):
+    def _save_theme(self, theme_item, previous_ids):
         """
-        신규 진입 종목 1개에 대해 '증분 테마 분석'을 수행한다.
-        기존에 생성된 테마 목록과 비교하여, 기존 테마에 편입시키거나 새로운 마이크로 테마를 생성한다.
+        스트리밍으로 완성된 테마 1개 저장 + 겹치는 이전 테마 교체 (한 트랜잭션)
+        previous_ids: 이번 분석 전 테마 id 집합. 교체된 id는 여기서 제거된다.
+        Returns: 생성된 Theme id (형식이 맞지 않으면 None)
         """
-        print(f"[ThemeService] Incremental Analysis for {name} ({code})...")
-        
-        today = date.today()
+        if not theme_item.get('name'):
+            return None
 
-        # [Distributed Lock] Prevent parallel processing for the same stock
-        lock_id = f"processing_lock:{today}:{code}"
-        # cache.add returns True if key didn't exist (Lock Acquired), False if existed (Locked)
-        is_locked = await sync_to_async(cache.add)(lock_id, "locked", timeout=60)
-        
-        if not is_locked:
-            print(f"[ThemeService] SKIP: {name} ({code}) is currently being processed by another worker.")
-            return False
+        with transaction.atomic():
+            theme_obj = Theme.objects.create(
+                name=theme_item['name'],
+                description=theme_item.get('description', '')
+            )
 
-        try:
-            # 0. 중복 분석 방지: 이미 오늘자 테마에 소속되어 있다면 분석 스킵
-            # Themes created today that contain this stock
-            already_processed = await sync_to_async(ThemeStock.objects.filter(
-                stock__short_code=code, 
-                theme__date=today
-            ).exists)()
-    
-            if already_processed:
-                print(f"[ThemeService] SKIP: {name} ({code}) is already in a theme today.")
-                return True
+            codes = []
+            for stock_item in theme_item.get('stocks', []):
+                # StockInfo가 DB에 없으면 생성 (혹은 건너뛰기)
+                stock_obj, created = StockInfo.objects.get_or_create(
+                    short_code=stock_item['code'],
+                    defaults={'name': stock_item['name']}
+                )
                 
-            # ... (Rest of the analysis logic)
-        except Exception as e:
-            logger.error(f"Analysis Error: {e}")
-            return False
-        finally:
-            # Release Lock
-            await sync_to_async(cache.delete)(lock_id)
+                ThemeStock.objects.create(
+                    theme=theme_obj,
+                    stock=stock_obj,
+                    reason=stock_item.get('reason', '')
+                )
+                codes.append(stock_item['code'])
 
-        # 1. 오늘 날짜의 기존 테마 목록 조회 (Sync to Async)
-        existing_themes = await sync_to_async(list)(Theme.objects.filter(date=today))
-        
+            # 같은 종목을 담았거나 이름이 같은 이전 분석 테마는 이번 테마로 대체
+            replaced = set(Theme.objects.filter(id__in=previous_ids).filter(
+                Q(name=theme_obj.name) | Q(stocks__stock__short_code__in=codes)
+            ).values_list('id', flat=True))
+            self._delete_themes(replaced)
+            previous_ids -= replaced
+        return theme_obj.id
+
+    def _delete_themes(self, theme_ids):
+        if theme_ids:
+            Theme.objects.filter(id__in=theme_ids).delete()
+
+    def _build_existing_themes_text(self, today):
+        """오늘자 테마 목록 -> LLM 컨텍스트 문자열 ("- ID 1: 테마명 (요약)" 줄 목록)"""
         existing_themes_prompt = []
-        for t in existing_themes:
+        for t in Theme.objects.filter(date=today):
             # Optimize Context: Truncate description to reduce context bloat
             # Take first sentence or max 100 chars
             short_desc = t.description.split('.')[0] 
@@ -199,63 +174,127 @@ class ThemeAnalyzeService:
             
             existing_themes_prompt.append(f"- ID {t.id}: {t.name} ({short_desc})")
             
-        existing_themes_text = "\n".join(existing_themes_prompt)
-        
-        if not existing_themes_text:
-            print("[ThemeService] No existing themes found for today. Skipping incremental.")
-            return False
+        return "\n".join(existing_themes_prompt)
+
+    async def analyze_stocks_incremental(self, stocks):
+        """
+        한 주기에 새로 진입한 종목들을 LLM 1회 호출로 함께 분류한다. (종목별 JOIN/CREATE/NONE)
+        기존 테마 컨텍스트를 한 번만 보내므로 종목 수만큼 반복되던 토큰/대기 시간이 줄어든다.
+        Args:
+            stocks: [(code, name), ...]
+        Returns: {code: 성공 여부} (이미 테마에 소속된 종목은 True)
+        """
+        today = date.today()
+        results = {code: False for code, _ in stocks}
+
+        # [Distributed Lock] 다른 워커가 처리 중인 종목은 제외
+        locked = []
+        for code, name in stocks:
+            lock_id = f"processing_lock:{today}:{code}"
+            if await sync_to_async(cache.add)(lock_id, "locked", timeout=120):
+                locked.append((code, name))
+            else:
+                print(f"[ThemeService] SKIP: {name} ({code}) is currently being processed by another worker.")
 
-        # 2. 뉴스 수집
-        news_list = self.news_collector.collect_news(name)
-        
-        # 3. LLM 프롬프트 구성
-        # 4. Agentic Analysis Loop (Replaces simple LLM call)
         try:
-            result = self._run_agentic_loop(name, code, news_list, existing_themes_text)
-            
-            action = result.get("action")
-            reason = result.get("reason", "")
-            
-            print(f"[ThemeService] LLM Decision for {name}: {action}")
-            
-            if action == "NONE":
-                return False
-                
-            # 5. DB 업데이트 (Sync to Async)
-            await sync_to_async(self._save_incremental_result)(code, name, result, today)
-            return True
-            
+            # 0. 중복 분석 방지: 이미 오늘자 테마에 소속된 종목은 스킵
+            already_processed = set(await sync_to_async(list)(ThemeStock.objects.filter(
+                stock__short_code__in=[code for code, _ in locked],
+                theme__date=today
+            ).values_list('stock__short_code', flat=True)))
+            for code in already_processed:
+                results[code] = True
+
+            targets = [(code, name) for code, name in locked if code not in already_processed]
+            if not targets:
+                return results
+
+            # 1. 기존 테마 목록 (전 종목 공통 컨텍스트)
+            existing_themes_text = await sync_to_async(self._build_existing_themes_text)(today)
+            if not existing_themes_text:
+                print("[ThemeService] No existing themes found for today. Skipping incremental.")
+                return results
+
+            # 2. 뉴스 수집 (병렬)
+            news_lists = await self.news_collector.collect_many([name for _, name in targets])
+
+            # 3. 판정 캐시 조회 (같은 뉴스 + 같은 테마 목록이면 이전 판정 재사용)
+            target_names = dict(targets)
+            target_news = dict(zip([code for code, _ in targets], news_lists))
+            cache_keys = {
+                code: self.decision_cache.make_key(code, target_news[code], existing_themes_text)
+                for code, _ in targets
+            }
+            cached = await self.decision_cache.get_many(list(cache_keys.values()))
+            decided = {code: cached[key] for code, key in cache_keys.items() if key in cached}
+            if decided:
+                print(f"[ThemeService] Reusing cached decisions for {len(decided)} stocks")
+
+            # 4. LLM 일괄 분류 (캐시 미스 종목만)
+            misses = [(code, name) for code, name in targets if code not in decided]
+            if misses:
+                print(f"[ThemeService] Batch Incremental Analysis for {len(misses)} stocks...")
+                decisions = await self._run_batch_classification(
+                    [
+                        {"code": code, "name": name, "news": target_news[code]}
+                        for code, name in misses
+                    ],
+                    existing_themes_text,
+                )
+                fresh = {
+                    decision.get("code"): decision
+                    for decision in decisions
+                    if decision.get("code") in target_names and decision.get("code") not in decided
+                    and decision.get("action") in ("JOIN", "CREATE", "NONE")
+                }
+                # 뉴스 수집 실패(더미/빈 헤드라인)로 내린 판정은 캐시하지 않음 -> 뉴스가 복구되면 다시 판정
+                await self.decision_cache.set_many({
+                    cache_keys[code]: decision
+                    for code, decision in fresh.items()
+                    if not is_fallback_headlines(target_names[code], target_news[code])
+                })
+                decided.update(fresh)
+
+            # 5. DB 업데이트
+            for code, decision in decided.items():
+                print(f"[ThemeService] LLM Decision for {target_names[code]}: {decision.get('action')}")
+
+            saved = await sync_to_async(self._save_batch_results)(decided, target_names, today)
+            for code in saved:
+                results[code] = True
+            return results
+
         except Exception as e:
-            logger.error(f"Incremental Analysis Failed: {e}")
-            print(f"Error ({name}): {e}")
-            return False
+            logger.error(f"Batch Incremental Analysis Failed: {e}")
+            print(f"Error (batch): {e}")
+            return results
+        finally:
+            for code, _ in locked:
+                await sync_to_async(cache.delete)(f"processing_lock:{today}:{code}")
 
-    @traceable(run_type="chain", name="Theme Analyst Agent")
-    def _run_agentic_loop(self, name, code, news_list, existing_themes_text):
+    @traceable(run_type="chain", name="Theme Analyst Agent (Batch)")
+    async def _run_batch_classification(self, targets, existing_themes_text):
         """
-        Agentic Workflow:
-        1. Hypothesis: Generate initial thought based on news.
-        2. Critique: Check against existing themes and guidelines.
-        3. Decision: Final Output.
+        여러 종목을 한 번에 분류 (Hypothesis -> Peer Check -> Critique -> Action)
+        Args:
+            targets: [{"code", "name", "news"}, ...]
+        Returns: [{"code", "action", "theme_id", "new_theme_name", "new_theme_desc", "reason"}, ...]
         """
-        # Dynamic Trace Naming for clearer UI in LangSmith
         rt = get_current_run_tree()
         if rt:
-            rt.name = f"Theme Analysis - {name} ({code})"
-        
-        # Step 1: Hypothesis & Critique (Chain-of-Thought Prompt)
+            rt.name = f"Theme Analysis - Batch ({len(targets)} stocks)"
+
         prompt = f"""
         You are a highly skilled Financial Theme Analyst.
         
-        [Target]
-        Stock: {name} ({code})
-        News: {json.dumps(news_list, ensure_ascii=False)}
+        [Targets]
+        {json.dumps(targets, ensure_ascii=False)}
         
         [Context - Existing Themes]
         {existing_themes_text}
         
         [Task]
-        Perform a step-by-step analysis to decide if this stock belongs to a theme.
+        For EACH target stock, perform a step-by-step analysis to decide if it belongs to a theme.
         
         1. **Hypothesis**: Based on the news, what is the specific market driver?
         2. **Peer Check**: Does this match any existing theme in [Context]?
@@ -263,45 +302,52 @@ class ThemeAnalyzeService:
         4. **Action**: Choose one of [JOIN, CREATE, NONE].
         
         **Constraint**:
+        - Return exactly one decision per target, using the target's 'code'.
         - If joining an existing theme, provide the 'theme_id'.
         - If creating a new theme, provide 'new_theme_name' (specific event-driven).
+        - If several targets share the same NEW driver, use the identical 'new_theme_name' for all of them.
         - **Crucial**: 'reason' must be a user-facing natural language sentence. NO ID mentions.
         
         [Output Format (JSON)]
         {{
-            "thought_process": "Your internal monologue and critique...",
-            "action": "JOIN" | "CREATE" | "NONE",
-            "theme_id": 123 (if JOIN),
-            "new_theme_name": "Name" (if CREATE),
-            "new_theme_desc": "Desc" (if CREATE),
-            "reason": "Public reason string (No IDs)"
+            "decisions": [
+                {{
+                    "code": "종목코드",
+                    "thought_process": "Short internal critique...",
+                    "action": "JOIN" | "CREATE" | "NONE",
+                    "theme_id": 123 (if JOIN),
+                    "new_theme_name": "Name" (if CREATE),
+                    "new_theme_desc": "Desc" (if CREATE),
+                    "reason": "Public reason string (No IDs)"
+                }}
+            ]
         }}
         """
 
-        response = self.client.chat.completions.create(
-            model=self.model,
-            messages=[
-                {"role": "system", "content": "You are a rational financial agent. Think step-by-step."},
-                {"role": "user", "content": prompt}
-            ],
-            stream=False
-        )
-        
-        content = response.choices[0].message.content
-        
-        # Parse JSON
-        import re
-        match = re.search(r'(\{.*\})', content, re.DOTALL)
-        if match:
-            return json.loads(match.group(1))
-        else:
-            return json.loads(content)
-
-            
-            action = result.get("action")
+        result = await self.llm.complete_json([
+            {"role": "system", "content": "You are a rational financial agent. Think step-by-step. Respond only in JSON."},
+            {"role": "user", "content": prompt}
+        ])
+        return result.get("decisions", [])
 
+    def _save_batch_results(self, decisions, names, today):
+        """
+        일괄 분류 결과 저장 (한 트랜잭션)
+        같은 배치에서 같은 이름으로 CREATE된 테마는 하나만 만들고 나머지 종목은 그 테마에 편입
+        Returns: 실제로 테마에 편입된 종목 코드 리스트 (NONE/없는 테마 ID/이름 없는 CREATE 제외 -> 선점 해제 후 재분류)
+        """
+        saved = []
+        created_themes = {}
+        with transaction.atomic():
+            for code, decision in decisions.items():
+                if decision.get("action") not in ("JOIN", "CREATE"):
+                    continue
+                if self._save_incremental_result(code, names[code], decision, today, created_themes):
+                    saved.append(code)
+        return saved
 
-    def _save_incremental_result(self, code, name, result, today):
+    def _save_incremental_result(self, code, name, result, today, created_themes=None):
+        """Returns: 종목이 테마에 편입(또는 이미 편입)되었으면 True"""
         action = result.get("action")
         reason = result.get("reason", "")
         
@@ -312,22 +358,35 @@ class ThemeAnalyzeService:
         if action == "JOIN":
             theme_id = result.get("theme_id")
             try:
-                theme_obj = Theme.objects.get(id=theme_id)
-                # 이미 있는지 확인
-                if not ThemeStock.objects.filter(theme=theme_obj, stock=stock_obj).exists():
-                    ThemeStock.objects.create(theme=theme_obj, stock=stock_obj, reason=reason)
-                    print(f"[ThemeService] Joined existing theme: {theme_obj.name}")
-            except Theme.DoesNotExist:
+                theme_obj = Theme.objects.get(id=theme_id, date=today)
+            except (Theme.DoesNotExist, ValueError, TypeError):
                 print(f"[ThemeService] Theme ID {theme_id} not found.")
+                return False
+            # 이미 있는지 확인
+            if not ThemeStock.objects.filter(theme=theme_obj, stock=stock_obj).exists():
+                ThemeStock.objects.create(theme=theme_obj, stock=stock_obj, reason=reason)
+                print(f"[ThemeService] Joined existing theme: {theme_obj.name}")
+            return True
 
         elif action == "CREATE":
             new_name = result.get("new_theme_name")
             new_desc = result.get("new_theme_desc")
-            if new_name:
+            if new_name and created_themes is not None and new_name in created_themes:
+                theme_obj = created_themes[new_name]
+                ThemeStock.objects.create(theme=theme_obj, stock=stock_obj, reason=reason)
+                print(f"[ThemeService] Joined theme created in this batch: {new_name}")
+            elif new_name:
                 theme_obj = Theme.objects.create(
                     name=new_name,
                     description=new_desc,
                     date=today
                 )
                 ThemeStock.objects.create(theme=theme_obj, stock=stock_obj, reason=reason)
+                if created_themes is not None:
+                    created_themes[new_name] = theme_obj
                 print(f"[ThemeService] Created new theme: {new_name}")
+            else:
+                return False
+            return True
+
+        return False
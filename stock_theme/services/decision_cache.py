@@ -0,0 +1,96 @@
+import re
+import hashlib
+import logging
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+# 판정 재사용 기간 (당일 재진입 대상, 다음 날에는 테마 목록 자체가 바뀜)
+DECISION_TTL_SEC = 60 * 60 * 12
+
+
+def _digest(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+
+
+def normalize_headline(title):
+    """대소문자/공백/문장부호 차이를 무시 (같은 기사가 언론사별로 조금씩 다르게 실리는 경우)"""
+    return re.sub(r'[\W_]+', '', title.lower())
+
+
+def headline_fingerprint(headlines):
+    """헤드라인 집합 해시 (순서/중복/표기 차이 무시)"""
+    normalized = sorted({normalize_headline(title) for title in headlines if title})
+    return _digest("\n".join(normalized))
+
+
+def theme_set_version(existing_themes_text):
+    """LLM에 전달한 기존 테마 컨텍스트의 버전 (테마가 추가/삭제/변경되면 바뀜)"""
+    return _digest(existing_themes_text)
+
+
+class ThemeDecisionCache:
+    """
+    증분 분석 LLM 판정(JOIN/CREATE/NONE) 캐시
+    - 키: (종목코드, 헤드라인 집합 해시, 기존 테마 목록 버전)
+    - 같은 종목이 같은 뉴스로 다시 Top 30에 들어오고 테마 목록도 그대로면 이전 판정을 재사용
+    - 적중/미스 횟수는 Redis(theme:decision_cache:hits / misses)에 누적하여 외부에서 확인 가능
+    """
+    KEY_PREFIX = "theme:decision:"
+    HITS_KEY = "theme:decision_cache:hits"
+    MISSES_KEY = "theme:decision_cache:misses"
+
+    def __init__(self, ttl=DECISION_TTL_SEC):
+        self.ttl = ttl
+
+    @classmethod
+    def make_key(cls, code, headlines, existing_themes_text):
+        return f"{cls.KEY_PREFIX}{code}:{headline_fingerprint(headlines)}:{theme_set_version(existing_themes_text)}"
+
+    async def get_many(self, keys):
+        """Returns: {key: 판정} (적중한 키만)"""
+        if not keys:
+            return {}
+        try:
+            found = await sync_to_async(cache.get_many)(keys)
+        except Exception as e:
+            logger.warning(f"Decision cache get error: {e}")
+            found = {}
+        await sync_to_async(self._record, thread_sensitive=False)(len(found), len(keys) - len(found))
+        return found
+
+    async def get(self, key):
+        return (await self.get_many([key])).get(key)
+
+    async def set_many(self, decisions):
+        """decisions: {key: 판정}. LLM이 정상 응답한 판정만 저장"""
+        if not decisions:
+            return
+        try:
+            await sync_to_async(cache.set_many)(decisions, self.ttl)
+        except Exception as e:
+            logger.warning(f"Decision cache set error: {e}")
+
+    async def set(self, key, decision):
+        await self.set_many({key: decision})
+
+    def _record(self, hits, misses):
+        try:
+            for key, count in ((self.HITS_KEY, hits), (self.MISSES_KEY, misses)):
+                if count:
+                    cache.add(key, 0, None)
+                    cache.incr(key, count)
+        except Exception as e:
+            logger.warning(f"Decision cache metrics error: {e}")
+
+    def stats(self):
+        """Returns: {"hits", "misses", "hit_rate"}"""
+        hits = cache.get(self.HITS_KEY) or 0
+        misses = cache.get(self.MISSES_KEY) or 0
+        total = hits + misses
+        return {"hits": hits, "misses": misses, "hit_rate": round(hits / total, 3) if total else 0.0}
+
+
+# 프로세스당 1개
+theme_decision_cache = ThemeDecisionCache()
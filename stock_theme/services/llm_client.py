@@ -0,0 +1,196 @@
+import os
+import re
+import json
+import time
+import asyncio
+import logging
+import weakref
+import httpx
+from openai import AsyncOpenAI
+
+logger = logging.getLogger(__name__)
+
+UPSTAGE_BASE_URL = "https://api.upstage.ai/v1"
+# 호출 1회 제한 시간 (초). 스트리밍은 전체 응답이 이 시간 안에 끝나야 한다
+LLM_TIMEOUT_SEC = float(os.getenv('LLM_TIMEOUT_SEC', '120'))
+# 동시에 진행 중인 LLM 호출 수 상한 (프로세스/이벤트 루프 단위)
+LLM_CONCURRENCY = int(os.getenv('LLM_CONCURRENCY', '4'))
+# 429/5xx/네트워크 오류 재시도 횟수 (openai SDK 내장 지수 백오프 사용)
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '2'))
+
+
+def parse_json_content(content):
+    """LLM 응답 문자열 -> dict (```json 코드 블록/앞뒤 설명 문장 제거)"""
+    match = re.search(r'(\{.*\})', content, re.DOTALL)
+    return json.loads(match.group(1) if match else content)
+
+
+class JSONArrayStreamParser:
+    """
+    스트리밍 JSON 증분 파서.
+    {"themes": [{...}, {...}]} 형태의 응답에서 key 배열의 객체가 하나 완성될 때마다 꺼낸다.
+    (문자열 안의 괄호/이스케이프를 구분하며, 이미 꺼낸 부분은 버퍼에서 제거)
+    """
+    def __init__(self, key):
+        self._marker = re.compile(r'"%s"\s*:\s*\[' % re.escape(key))
+        self._buffer = ""
+        self._pos = 0
+        self._in_array = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._start = None
+        self.done = False
+
+    def feed(self, chunk):
+        """Returns: 이번 chunk로 완성된 객체 리스트"""
+        if self.done or not chunk:
+            return []
+        self._buffer += chunk
+
+        if not self._in_array:
+            match = self._marker.search(self._buffer)
+            if not match:
+                return []
+            self._in_array = True
+            self._pos = match.end()
+
+        items = []
+        buffer = self._buffer
+        while self._pos < len(buffer):
+            ch = buffer[self._pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == '{':
+                if self._depth == 0:
+                    self._start = self._pos
+                self._depth += 1
+            elif ch == '}':
+                self._depth -= 1
+                if self._depth == 0:
+                    try:
+                        items.append(json.loads(buffer[self._start:self._pos + 1]))
+                    except ValueError as e:
+                        logger.warning(f"Skip malformed streamed object: {e}")
+                    self._start = None
+            elif ch == ']' and self._depth == 0:
+                self.done = True
+                break
+            self._pos += 1
+
+        # 완성된 부분 버리기 (진행 중인 객체 시작점부터만 보관)
+        keep_from = self._start if self._start is not None else self._pos
+        self._buffer = buffer[keep_from:]
+        self._pos -= keep_from
+        if self._start is not None:
+            self._start = 0
+        return items
+
+
+class LLMClient:
+    """
+    AsyncOpenAI 기반 LLM 호출 래퍼 (Upstage Solar, OpenAI 호환 API)
+    - 이벤트 루프별 AsyncClient (커넥션 유지) + 세마포어로 동시 호출 수 제한
+    - 호출별 제한 시간 / SDK 내장 재시도 (429, 5xx, 네트워크 오류)
+    - complete_json(): 전체 응답을 받아 JSON 파싱
+    - stream_json_array(): 스트리밍 응답에서 배열 원소가 완성될 때마다 yield
+    """
+    def __init__(self, model="solar-pro2", api_key=None, base_url=UPSTAGE_BASE_URL,
+                 timeout=LLM_TIMEOUT_SEC, concurrency=LLM_CONCURRENCY, max_retries=LLM_MAX_RETRIES):
+        self.model = model
+        self.api_key = api_key or os.getenv("upstage_secret_key")
+        self.base_url = base_url
+        self.timeout = timeout
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self._clients = weakref.WeakKeyDictionary()  # event loop -> AsyncOpenAI
+        self._semaphores = weakref.WeakKeyDictionary()  # event loop -> asyncio.Semaphore
+
+    def _get_client(self):
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            client = AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                timeout=httpx.Timeout(self.timeout, connect=5.0),
+                max_retries=self.max_retries,
+            )
+            self._clients[loop] = client
+        return client
+
+    def _semaphore(self):
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.concurrency)
+            self._semaphores[loop] = semaphore
+        return semaphore
+
+    async def aclose(self):
+        """현재 이벤트 루프의 AsyncOpenAI 클라이언트 종료"""
+        client = self._clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.close()
+
+    async def complete(self, messages, timeout=None):
+        """Returns: 응답 본문 문자열"""
+        async with self._semaphore():
+            response = await asyncio.wait_for(
+                self._get_client().chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    stream=False
+                ),
+                timeout or self.timeout,
+            )
+        return response.choices[0].message.content
+
+    async def complete_json(self, messages, timeout=None):
+        return parse_json_content(await self.complete(messages, timeout))
+
+    async def stream_json_array(self, messages, key, timeout=None):
+        """
+        스트리밍 호출. 응답 JSON의 key 배열 원소(객체)가 완성될 때마다 yield
+        (제한 시간은 응답 전체 기준, 청크가 끊겨도 적용. 초과 시 asyncio.TimeoutError)
+        """
+        limit = timeout or self.timeout
+        deadline = time.monotonic() + limit
+        parser = JSONArrayStreamParser(key)
+        async with self._semaphore():
+            stream = await asyncio.wait_for(
+                self._get_client().chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    stream=True
+                ),
+                limit,
+            )
+            try:
+                chunks = stream.__aiter__()
+                while True:
+                    # 다음 청크 대기에도 남은 시간을 적용 (응답이 멈춘 스트림이 세마포어를 계속 잡지 않도록)
+                    remaining = deadline - time.monotonic()
+                    try:
+                        if remaining <= 0:
+                            raise asyncio.TimeoutError
+                        chunk = await asyncio.wait_for(chunks.__anext__(), remaining)
+                    except StopAsyncIteration:
+                        break
+                    except asyncio.TimeoutError:
+                        raise asyncio.TimeoutError(f"LLM stream exceeded {limit}s")
+                    if not chunk.choices:
+                        continue
+                    for item in parser.feed(chunk.choices[0].delta.content or ""):
+                        yield item
+                    if parser.done:
+                        break
+            finally:
+                await stream.close()
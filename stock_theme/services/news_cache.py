@@ -0,0 +1,139 @@
+import os
+import time
+import hashlib
+import logging
+from email.utils import parsedate_to_datetime
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+# 정렬 방식별 신선도 유지 시간 (초). 이 시간 안의 재조회는 네이버 API를 호출하지 않는다.
+# 관련도순(sim)은 핵심 이슈라 천천히 바뀌고, 최신순(date)은 속보성이라 짧게 유지
+NEWS_TTL = {
+    'sim': float(os.getenv('NEWS_SIM_TTL', '1800')),
+    'date': float(os.getenv('NEWS_DATE_TTL', '180')),
+}
+# Redis 보관 기간 (신선도가 지나도 증분 조회의 기준/장애 시 대체 데이터로 사용)
+NEWS_RETENTION_SEC = 60 * 60 * 24
+# 종목/정렬별로 보관할 최대 헤드라인 수
+MAX_ITEMS = 20
+
+
+def title_hash(title):
+    return hashlib.sha1(title.encode('utf-8')).hexdigest()[:16]
+
+
+def parse_pub_date(value):
+    """네이버 pubDate (RFC 822, 예: 'Mon, 19 Oct 2026 09:05:00 +0900') -> timestamp. 실패 시 0"""
+    if not value:
+        return 0.0
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class NewsCache:
+    """
+    종목별 뉴스 헤드라인 캐시 (종목명 + 정렬 방식 기준)
+    - 메모리: 같은 프로세스 내 즉시 조회 / Redis (Django cache): 워커 간 공유, 24시간 보관
+    - 신선도(NEWS_TTL) 안에서는 API를 호출하지 않고 저장된 헤드라인을 반환
+    - 신선도가 지나면 다시 조회하되, 최신순은 마지막으로 본 pubDate 이후 기사만 앞에 붙인다
+    - 제목 해시로 중복 기사를 제거 (같은 기사가 여러 언론사/재조회로 반복되는 경우)
+    """
+    KEY_PREFIX = "news:"
+
+    def __init__(self):
+        self._memory = {}  # key -> entry
+
+    @classmethod
+    def make_key(cls, query, sort):
+        digest = hashlib.md5(query.encode('utf-8')).hexdigest()
+        return f"{cls.KEY_PREFIX}{sort}:{digest}"
+
+    async def get_or_fetch(self, query, sort, display, search):
+        """
+        Args:
+            search: 캐시 미스 시 호출할 코루틴 함수 search(query, display, sort)
+                    -> [{"title", "pub_date"}, ...] 또는 실패 시 None
+        Returns: 헤드라인 제목 리스트 (최대 display개)
+        """
+        key = self.make_key(query, sort)
+        entry = self._memory.get(key)
+        if not self._is_fresh(entry, sort):
+            # 다른 워커가 먼저 갱신했을 수 있으므로 Redis 확인
+            entry = await self._get_shared(key) or entry
+        if self._is_fresh(entry, sort):
+            self._memory[key] = entry
+            return self._titles(entry, display)
+
+        items = await search(query, display, sort)
+        if items is None:
+            # API 실패/한도 초과 시 오래된 헤드라인이라도 사용
+            return self._titles(entry, display) if entry else []
+
+        entry = self.merge(entry, items, sort)
+        await self._set(key, entry)
+        return self._titles(entry, display)
+
+    @staticmethod
+    def merge(entry, items, sort):
+        """
+        새 조회 결과를 기존 항목과 합친다.
+        - date: 마지막 pubDate 이후 기사만 추가 후 최신순 정렬
+        - sim: 새 결과 순서(관련도)를 우선하고 뒤에 기존 항목을 이어 붙임
+        """
+        previous = entry["items"] if entry else []
+        last_pub = entry["last_pub"] if entry else 0.0
+
+        fresh = []
+        for item in items:
+            pub = parse_pub_date(item.get("pub_date"))
+            if sort == 'date' and previous and pub <= last_pub:
+                continue
+            fresh.append({"title": item["title"], "hash": title_hash(item["title"]), "pub": pub})
+
+        merged = []
+        seen = set()
+        for item in fresh + previous:
+            if item["hash"] in seen:
+                continue
+            seen.add(item["hash"])
+            merged.append(item)
+
+        if sort == 'date':
+            merged.sort(key=lambda item: item["pub"], reverse=True)
+
+        merged = merged[:MAX_ITEMS]
+        return {
+            "items": merged,
+            "last_pub": max([last_pub] + [item["pub"] for item in merged]),
+            "fetched_at": time.time(),
+        }
+
+    @staticmethod
+    def _is_fresh(entry, sort):
+        return entry is not None and time.time() - entry["fetched_at"] < NEWS_TTL.get(sort, 0)
+
+    @staticmethod
+    def _titles(entry, display):
+        return [item["title"] for item in entry["items"][:display]]
+
+    async def _get_shared(self, key):
+        try:
+            return await sync_to_async(cache.get)(key)
+        except Exception as e:
+            logger.warning(f"News cache get error: {e}")
+            return None
+
+    async def _set(self, key, entry):
+        self._memory[key] = entry
+        try:
+            await sync_to_async(cache.set)(key, entry, NEWS_RETENTION_SEC)
+        except Exception as e:
+            logger.warning(f"News cache set error: {e}")
+
+
+# 프로세스당 1개
+news_cache = NewsCache()
@@ -1,64 +1,147 @@
 import os
-import time
-import json
+import asyncio
 import logging
-import urllib.request
-import urllib.parse
+import weakref
+from datetime import date
+import httpx
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from stock_price.services.rate_limiter import TokenBucketRateLimiter
+from .news_cache import news_cache as shared_news_cache
 
 logger = logging.getLogger(__name__)
 
+NAVER_NEWS_URL = "https://openapi.naver.com/v1/search/news"
+# 네이버 검색 API 한도: 애플리케이션당 초당 10건 / 하루 25,000건 (여유분을 두고 설정)
+NAVER_RATE_PER_SEC = float(os.getenv('NAVER_RATE_PER_SEC', '8'))
+NAVER_DAILY_QUOTA = int(os.getenv('NAVER_DAILY_QUOTA', '25000'))
+# 동시에 진행 중인 뉴스 검색 요청 수 상한
+NEWS_CONCURRENCY = int(os.getenv('NEWS_CONCURRENCY', '8'))
+
+# 네이버 검색 API 공용 유량 제어기 (토큰 버킷 + 세마포어 + 429 재시도)
+naver_rate_limiter = TokenBucketRateLimiter(
+    rate=NAVER_RATE_PER_SEC,
+    burst=max(int(NAVER_RATE_PER_SEC), 1),
+    concurrency=NEWS_CONCURRENCY,
+    name="Naver",
+)
+
+
+def fallback_headlines(stock_name):
+    """뉴스를 못 가져왔을 때 LLM에 대신 전달하는 더미 헤드라인"""
+    return [f"{stock_name} (Mock) 뉴스 데이터...", f"{stock_name} 관련 이슈 (Mock)"]
+
+
+def is_fallback_headlines(stock_name, headlines):
+    """실제 뉴스 없이 더미/빈 헤드라인인지 (이런 입력의 판정은 캐시하면 안 됨)"""
+    return not headlines or list(headlines) == fallback_headlines(stock_name)
+
+
+def _clean_title(item):
+    return item['title'].replace('<b>', '').replace('</b>', '').replace('&quot;', '"')
+
+
 class NewsCollector:
     """
-    종목별 관련 뉴스를 수집하는 클래스.
-    현재는 실제 뉴스 API가 연결되지 않았으므로, 
-    1) 추후 Naver/Google API 연동을 위한 인터페이스 정의
-    2) (임시) 종목명 기반의 더미 뉴스 데이터 생성 
-    역할을 수행합니다.
+    종목별 관련 뉴스(네이버 뉴스 검색 API 헤드라인)를 수집하는 클래스.
+    - 이벤트 루프별 AsyncClient 커넥션 풀 + naver_rate_limiter(초당 한도) + 일일 호출 한도 카운터
+    - news_cache로 신선도 유지 시간 안의 재조회는 API 호출 없이 응답
+    - collect_many(): 여러 종목을 병렬로 수집
+    API 키가 없거나 뉴스를 가져오지 못하면 종목명 기반 더미 헤드라인(fallback_headlines)을 돌려준다.
     """
-    def _fetch_naver_news(self, query, display, sort):
+    def __init__(self, rate_limiter=naver_rate_limiter, news_cache=shared_news_cache):
+        self.rate_limiter = rate_limiter
+        self.news_cache = news_cache
+        self._async_clients = weakref.WeakKeyDictionary()  # event loop -> httpx.AsyncClient
+
+    def _get_async_client(self):
+        """현재 이벤트 루프 전용 AsyncClient (없으면 생성)"""
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                timeout=httpx.Timeout(5.0),
+                limits=httpx.Limits(max_connections=NEWS_CONCURRENCY, max_keepalive_connections=NEWS_CONCURRENCY),
+            )
+            self._async_clients[loop] = client
+        return client
+
+    async def aclose(self):
+        """현재 이벤트 루프의 AsyncClient 종료 (워커/이벤트 루프 종료 전에 호출)"""
+        client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+    def _reserve_quota(self):
+        """오늘 호출 건수 1건 차감 (워커 간 공유). Returns: 일일 한도 내면 True"""
+        key = f"news:naver_quota:{date.today()}"
+        try:
+            cache.add(key, 0, 60 * 60 * 24)
+            used = cache.incr(key)
+        except Exception as e:
+            logger.warning(f"Naver quota counter error: {e}")
+            return True
+        if used > NAVER_DAILY_QUOTA:
+            logger.warning(f"Naver daily quota exhausted ({used - 1}/{NAVER_DAILY_QUOTA})")
+            return False
+        return True
+
+    async def _search_async(self, query, display, sort):
+        """
+        네이버 뉴스 검색 1회 호출
+        Returns: [{"title", "pub_date"}, ...] 또는 호출 불가/실패 시 None (캐시하지 않음)
+        """
         client_id = os.getenv("naver_client_id")
         client_secret = os.getenv("naver_secret")
-        
+
         if not client_id or not client_secret:
-            return []
+            return None
+
+        if not await sync_to_async(self._reserve_quota, thread_sensitive=False)():
+            return None
 
         try:
-            enc_text = urllib.parse.quote(query)
-            url = f"https://openapi.naver.com/v1/search/news?query={enc_text}&display={display}&sort={sort}"
-            
-            request = urllib.request.Request(url)
-            request.add_header("X-Naver-Client-Id", client_id)
-            request.add_header("X-Naver-Client-Secret", client_secret)
-            
-            response = urllib.request.urlopen(request, timeout=5)
-            if response.getcode() == 200:
-                data = json.loads(response.read().decode('utf-8'))
-                items = data.get('items', [])
-                
-                cleaned_items = []
-                for item in items:
-                    title = item['title'].replace('<b>', '').replace('</b>', '').replace('&quot;', '"')
-                    desc = item['description'].replace('<b>', '').replace('</b>', '').replace('&quot;', '"')
-                    cleaned_items.append(f"{title}") # 제목 위주로 전달 (요약은 LLM이)
-                return cleaned_items
-            return []
+            response = await self.rate_limiter.request(
+                self._get_async_client(),
+                "GET",
+                NAVER_NEWS_URL,
+                params={"query": query, "display": display, "sort": sort},
+                headers={"X-Naver-Client-Id": client_id, "X-Naver-Client-Secret": client_secret},
+            )
+            if response.status_code == 200:
+                return [
+                    {"title": _clean_title(item), "pub_date": item.get('pubDate')}
+                    for item in response.json().get('items', [])
+                ]
+            logger.error(f"Naver API Error ({sort}): HTTP {response.status_code}")
+            return None
         except Exception as e:
             logger.error(f"Naver API Error ({sort}): {e}")
-            return []
-
-    def collect_news(self, stock_name):
-        # 1. 관련도순 4개 (핵심 이슈 파악)
-        sim_news = self._fetch_naver_news(stock_name, 4, 'sim')
-        
-        
-        time.sleep(0.2)
-        # 2. 최신순 2개 (속보성 이슈 파악)
-        date_news = self._fetch_naver_news(stock_name, 2, 'date')
-        
+            return None
+
+    async def _fetch_naver_news_async(self, query, display, sort):
+        return await self.news_cache.get_or_fetch(query, sort, display, self._search_async)
+
+    def _merge(self, stock_name, sim_news, date_news):
         # 중복 제거 및 합치기
         all_news = list(dict.fromkeys(sim_news + date_news))
-        
+
         if not all_news:
-             return [f"{stock_name} (Mock) 뉴스 데이터...", f"{stock_name} 관련 이슈 (Mock)"]
-             
+             return fallback_headlines(stock_name)
+
         return all_news
+
+    async def collect_news_async(self, stock_name):
+        """관련도순 4개 (핵심 이슈) + 최신순 2개 (속보성 이슈)를 동시에 요청"""
+        sim_news, date_news = await asyncio.gather(
+            self._fetch_naver_news_async(stock_name, 4, 'sim'),
+            self._fetch_naver_news_async(stock_name, 2, 'date'),
+        )
+        return self._merge(stock_name, sim_news, date_news)
+
+    async def collect_many(self, stock_names):
+        """
+        여러 종목 뉴스 병렬 수집 (동시 요청 수/초당 요청 수는 rate_limiter가 제한)
+        Returns: stock_names와 같은 순서의 뉴스 목록 리스트
+        """
+        return await asyncio.gather(*(self.collect_news_async(name) for name in stock_names))
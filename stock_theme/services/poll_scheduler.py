@@ -0,0 +1,102 @@
+import os
+import time
+import logging
+from collections import deque
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+# 순위 조회 주기 범위 (초)
+MIN_INTERVAL_SEC = float(os.getenv('THEME_SYNC_MIN_INTERVAL', '15'))
+MAX_INTERVAL_SEC = float(os.getenv('THEME_SYNC_MAX_INTERVAL', '120'))
+# 시간당 순위 조회 예산 (기존 고정 60초 주기와 같은 평균 부하)
+BUDGET_PER_HOUR = int(os.getenv('THEME_SYNC_BUDGET_PER_HOUR', '60'))
+# 예산을 앞당겨 쓸 수 있는 최대 조회 수 (장 초반 등 변동이 클 때 연속 최소 주기 조회 허용량)
+BUDGET_BURST = int(os.getenv('THEME_SYNC_BUDGET_BURST', '10'))
+# 이 비율 이상 Top 30이 바뀌면 최소 주기로 조회
+HIGH_CHURN = 0.2
+# 변동률 지수이동평균 가중치 (최근 관측 반영 비율)
+CHURN_ALPHA = 0.5
+
+
+class AdaptivePollScheduler:
+    """
+    run_theme_sync 순위 조회 주기 조절기.
+    - Top 30 변동률(churn)이 높으면 (장 초반, 뉴스 급등) 최소 주기로, 안정적이면 최대 주기로 조회
+    - 시간당 예산은 토큰 버킷으로 분산: 초당 budget/3600개씩 채워지고 최대 burst개까지 모아 둘 수 있다.
+      버킷이 비면 다음 토큰이 찰 때까지만 주기를 늘리므로, 예산을 한꺼번에 쓰고 장시간 멈추는 일이 없다.
+    - 선택된 주기/변동률은 Redis(theme:sync_metrics)에 기록하여 외부에서 확인 가능 (publish)
+    """
+    METRICS_KEY = "theme:sync_metrics"
+    WINDOW_SEC = 60 * 60
+
+    def __init__(self, min_interval=MIN_INTERVAL_SEC, max_interval=MAX_INTERVAL_SEC, budget_per_hour=BUDGET_PER_HOUR, burst=BUDGET_BURST):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.budget_per_hour = budget_per_hour
+        self.burst = burst
+        self.refill_rate = budget_per_hour / self.WINDOW_SEC  # 초당 충전 토큰 수
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self.churn = 1.0  # 첫 조회 직후에는 빠르게 한 번 더 확인
+        self.interval = min_interval
+        self._previous_codes = None
+        self._fetches = deque()  # 최근 1시간 조회 시각 (monotonic, 지표용)
+
+    def observe(self, codes):
+        """
+        순위 조회 결과 반영
+        Args:
+            codes: 이번 조회의 Top 30 종목 코드 목록
+        Returns: 이번 조회의 변동률 (이전 대비 새로 들어온 종목 비율)
+        """
+        now = time.monotonic()
+        self._fetches.append(now)
+        self._refill(now)
+        self._tokens -= 1
+
+        current = set(codes)
+        if self._previous_codes is None or not current:
+            churn = self.churn
+        else:
+            churn = len(current - self._previous_codes) / len(current)
+            self.churn = CHURN_ALPHA * churn + (1 - CHURN_ALPHA) * self.churn
+        self._previous_codes = current
+        return churn
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.refill_rate)
+        self._updated = now
+
+    def next_interval(self):
+        """다음 조회까지 대기 시간 (초)"""
+        now = time.monotonic()
+        while self._fetches and now - self._fetches[0] >= self.WINDOW_SEC:
+            self._fetches.popleft()
+        self._refill(now)
+
+        ratio = min(self.churn / HIGH_CHURN, 1.0)
+        interval = self.max_interval - (self.max_interval - self.min_interval) * ratio
+
+        # 버킷이 비었으면 다음 토큰이 찰 때까지만 주기를 늘림
+        if self._tokens < 1 and self.refill_rate > 0:
+            interval = max(interval, (1 - self._tokens) / self.refill_rate)
+
+        self.interval = interval
+        return interval
+
+    async def publish(self):
+        """현재 주기/변동률을 Redis에 기록 (이벤트 루프를 막지 않도록 스레드에서 실행)"""
+        metrics = {
+            "interval_sec": round(self.interval, 1),
+            "churn": round(self.churn, 3),
+            "fetches_last_hour": len(self._fetches),
+            "budget_tokens": round(self._tokens, 2),
+            "budget_per_hour": self.budget_per_hour,
+            "updated_at": time.time(),
+        }
+        try:
+            await sync_to_async(cache.set, thread_sensitive=False)(self.METRICS_KEY, metrics, int(self.max_interval * 2))
+        except Exception as e:
+            logger.warning(f"[ThemeSync] Failed to publish scheduler metrics: {e}")
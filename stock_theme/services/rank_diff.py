@@ -0,0 +1,184 @@
+import json
+import logging
+from asgiref.sync import sync_to_async
+
+logger = logging.getLogger(__name__)
+
+EVENT_ENTERED = "entered"
+EVENT_EXITED = "exited"
+EVENT_MOVED_UP = "moved_up"
+EVENT_MOVED_DOWN = "moved_down"
+EVENT_RATE_CHANGED = "rate_changed"
+
+# 순위 변동 없이 등락률만 이만큼(%p) 이상 바뀌면 rate_changed 이벤트
+RATE_CHANGE_THRESHOLD = 1.0
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def build_snapshot(rank_data, limit=30):
+    """get_fluctuation_rank() 결과 -> {code: {"rank", "name", "rate", "price"}} (상위 limit개)"""
+    snapshot = {}
+    for idx, item in enumerate(rank_data[:limit], 1):
+        code = item.get('stck_shrn_iscd')
+        if not code:
+            continue
+        snapshot[code] = {
+            "rank": idx,
+            "name": item.get('hts_kor_isnm', code),
+            "rate": _to_float(item.get('prdy_ctrt')),
+            "price": item.get('stck_prpr'),
+        }
+    return snapshot
+
+
+def diff_rankings(previous, current, rate_threshold=RATE_CHANGE_THRESHOLD):
+    """
+    두 순위 스냅샷을 비교해 변동 이벤트 목록 생성 (변동폭이 큰 순서)
+    - entered / exited: 신규 진입 / 이탈
+    - moved_up / moved_down: 순위 상승 / 하락
+    - rate_changed: 순위는 같고 등락률만 크게 변동
+    Returns: [{"event", "code", "name", "rank", "prev_rank", "rate", "prev_rate", "price"}, ...]
+    """
+    events = []
+    for code, now in current.items():
+        before = previous.get(code)
+        event = {
+            "code": code,
+            "name": now["name"],
+            "rank": now["rank"],
+            "prev_rank": before["rank"] if before else None,
+            "rate": now["rate"],
+            "prev_rate": before["rate"] if before else None,
+            "price": now["price"],
+        }
+        if before is None:
+            event["event"] = EVENT_ENTERED
+        elif now["rank"] < before["rank"]:
+            event["event"] = EVENT_MOVED_UP
+        elif now["rank"] > before["rank"]:
+            event["event"] = EVENT_MOVED_DOWN
+        elif now["rate"] is not None and before["rate"] is not None and abs(now["rate"] - before["rate"]) >= rate_threshold:
+            event["event"] = EVENT_RATE_CHANGED
+        else:
+            continue
+        events.append(event)
+
+    for code, before in previous.items():
+        if code not in current:
+            events.append({
+                "event": EVENT_EXITED,
+                "code": code,
+                "name": before["name"],
+                "rank": None,
+                "prev_rank": before["rank"],
+                "rate": None,
+                "prev_rate": before["rate"],
+                "price": None,
+            })
+
+    events.sort(key=_priority)
+    return events
+
+
+def _priority(event):
+    # 신규 진입(상위 순위부터) -> 순위 변동폭 큰 순 -> 등락률 변동폭 큰 순 -> 이탈
+    kind = event["event"]
+    if kind == EVENT_ENTERED:
+        return (0, event["rank"])
+    if kind in (EVENT_MOVED_UP, EVENT_MOVED_DOWN):
+        return (1, -abs(event["prev_rank"] - event["rank"]))
+    if kind == EVENT_RATE_CHANGED:
+        return (2, -abs(event["rate"] - event["prev_rate"]))
+    return (3, event["prev_rank"])
+
+
+class RankChangeStream:
+    """
+    순위 변동 스트림.
+    연속된 순위 조회 결과를 비교해 이벤트를 만들고,
+    - Redis Stream (theme:rank_events)에 기록 (후속 분석/재생용)
+    - theme_global 그룹으로 rank_update 전송 (히트맵은 Top 30 전체가 아닌 변동분만 반영)
+    직전 스냅샷은 Redis(theme:rank_snapshot)에만 두고 WATCH/MULTI로 원자적으로 교체(compare-and-swap)한다.
+    여러 sync 워커가 동시에 돌아도 각 조회는 바로 앞에 저장된 스냅샷과만 비교되어 이벤트가 중복/모순되지 않는다.
+    Redis/채널 레이어 오류는 로그만 남기고 빈 결과를 돌려준다 (신규 진입 분석 루프를 멈추지 않도록).
+    """
+    STREAM_KEY = "theme:rank_events"
+    STREAM_MAXLEN = 5000
+    SNAPSHOT_KEY = "theme:rank_snapshot"
+    SNAPSHOT_TIMEOUT = 60 * 60 * 24
+
+    def _redis(self):
+        from django_redis import get_redis_connection
+        return get_redis_connection("default")
+
+    async def publish(self, rank_data):
+        """
+        Args:
+            rank_data (list): get_fluctuation_rank() 결과
+        Returns:
+            list: 이번 조회에서 발생한 이벤트 (변동폭 큰 순). 직전 스냅샷이 없거나 오류 시 빈 리스트
+        """
+        current = build_snapshot(rank_data)
+        if not current:
+            return []
+
+        try:
+            previous = await sync_to_async(self._swap_snapshot, thread_sensitive=False)(current)
+        except Exception as e:
+            logger.warning(f"[RankStream] Snapshot swap error: {e}")
+            return []
+
+        events = diff_rankings(previous, current) if previous is not None else []
+        if not events:
+            return []
+
+        try:
+            await sync_to_async(self._append_to_stream, thread_sensitive=False)(events)
+        except Exception as e:
+            logger.warning(f"[RankStream] Redis stream append error: {e}")
+
+        try:
+            from channels.layers import get_channel_layer
+            await get_channel_layer().group_send(
+                "theme_global",
+                {"type": "rank_update", "events": events}
+            )
+        except Exception as e:
+            logger.warning(f"[RankStream] Broadcast error: {e}")
+        return events
+
+    def _swap_snapshot(self, current):
+        """
+        직전 스냅샷을 읽고 current로 교체 (WATCH 중 다른 워커가 먼저 바꾸면 다시 시도)
+        Returns: 교체 전 스냅샷 (없으면 None)
+        """
+        from redis.exceptions import WatchError
+
+        with self._redis().pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(self.SNAPSHOT_KEY)
+                    raw = pipe.get(self.SNAPSHOT_KEY)
+                    pipe.multi()
+                    pipe.set(self.SNAPSHOT_KEY, json.dumps(current), ex=self.SNAPSHOT_TIMEOUT)
+                    pipe.execute()
+                    return json.loads(raw) if raw else None
+                except WatchError:
+                    continue
+
+    def _append_to_stream(self, events):
+        pipe = self._redis().pipeline(transaction=False)
+        for event in events:
+            pipe.xadd(
+                self.STREAM_KEY,
+                {key: json.dumps(value) for key, value in event.items()},
+                maxlen=self.STREAM_MAXLEN,
+                approximate=True,
+            )
+        pipe.execute()
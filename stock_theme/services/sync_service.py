@@ -1,6 +1,10 @@
+import time
 import logging
+from asgiref.sync import sync_to_async
 from django.core.cache import cache
+from django_redis import get_redis_connection
 from .analyze_service import ThemeAnalyzeService
+from .rank_diff import RankChangeStream
 from stock_theme.models import Theme, ThemeStock
 from stock_price.models import StockInfo
 
@@ -9,24 +13,88 @@ logger = logging.getLogger(__name__)
 class ThemeSyncService:
     """
     실시간 랭킹과 테마 분석 데이터 간의 동기화를 담당하는 서비스.
-    Redis 캐시를 사용하여 '신규 진입 종목'을 감지하고, 증분 분석(Incremental Analysis)을 수행한다.
+    Redis 네이티브 SET/ZSET으로 '신규 진입 종목'을 감지하고, 증분 분석(Incremental Analysis)을 수행한다.
+    - theme:top30:analyzed (SET): 오늘 분석을 마친 종목 코드
+    - theme:top30:current (ZSET): 최근 조회한 Top 30 (score = 순위)
+    - theme:top30:claims (ZSET): 분석 중인 종목 (score = 선점 만료 시각). 여러 워커가 같은 종목을 중복 분석하지 않도록 함
     """
-    CACHE_KEY_TOP30 = "theme:current_top_30"
+    KEY_ANALYZED = "theme:top30:analyzed"
+    KEY_CURRENT = "theme:top30:current"
+    KEY_CLAIMS = "theme:top30:claims"
     CACHE_TIMEOUT = 60 * 60 * 24  # 24시간 (장 마감 후 초기화 고려)
+    CLAIM_TIMEOUT = 60 * 10  # 분석 중 워커가 죽어도 10분 뒤 다른 워커가 재시도
+    # 이전 버전이 Django cache에 pickle된 set으로 저장하던 키 (첫 조회 때 analyzed SET으로 옮기고 삭제)
+    LEGACY_KEY_TOP30 = "theme:current_top_30"
+
+    # 신규 진입 감지 + 선점을 Redis 1회 왕복으로 원자적으로 처리
+    # KEYS: analyzed, current, claims / ARGV: now, claim_ttl, state_ttl, 종목코드들(순위 순)
+    # Returns: 분석 이력도 없고 다른 워커가 선점하지도 않은 종목 (순위 순)
+    DIFF_AND_CLAIM_LUA = """
+    local now = tonumber(ARGV[1])
+    local claim_until = now + tonumber(ARGV[2])
+    redis.call('DEL', KEYS[2])
+    redis.call('ZREMRANGEBYSCORE', KEYS[3], '-inf', now)
+    local claimed = {}
+    for i = 4, #ARGV do
+        local code = ARGV[i]
+        redis.call('ZADD', KEYS[2], i - 3, code)
+        if redis.call('SISMEMBER', KEYS[1], code) == 0 and not redis.call('ZSCORE', KEYS[3], code) then
+            redis.call('ZADD', KEYS[3], claim_until, code)
+            table.insert(claimed, code)
+        end
+    end
+    redis.call('EXPIRE', KEYS[2], ARGV[3])
+    redis.call('EXPIRE', KEYS[3], ARGV[3])
+    return claimed
+    """
 
     def __init__(self):
         self.analyze_service = ThemeAnalyzeService()
+        self.rank_stream = RankChangeStream()
+        self._diff_and_claim = None
+        self._legacy_migrated = False
+
+    def _redis(self):
+        return get_redis_connection("default")
+
+    def _migrate_legacy_top30(self):
+        """theme:current_top_30 (pickle set)에 남은 분석 이력을 analyzed SET으로 옮기고 삭제"""
+        self._legacy_migrated = True
+        try:
+            legacy_codes = cache.get(self.LEGACY_KEY_TOP30)
+            if legacy_codes:
+                pipe = self._redis().pipeline()
+                pipe.sadd(self.KEY_ANALYZED, *legacy_codes)
+                pipe.expire(self.KEY_ANALYZED, self.CACHE_TIMEOUT)
+                pipe.execute()
+            cache.delete(self.LEGACY_KEY_TOP30)
+        except Exception as e:
+            logger.warning(f"[ThemeSync] Legacy top-30 cache migration failed: {e}")
+
+    def _claim_new_entrants(self, ranked_codes, now=None):
+        """현재 Top 30 저장 + 신규 진입 종목 선점 (원자적). Returns: 이번 워커가 선점한 종목 코드 리스트 (순위 순)"""
+        if not self._legacy_migrated:
+            self._migrate_legacy_top30()
+        if self._diff_and_claim is None:
+            self._diff_and_claim = self._redis().register_script(self.DIFF_AND_CLAIM_LUA)
+
+        claimed = self._diff_and_claim(
+            keys=[self.KEY_ANALYZED, self.KEY_CURRENT, self.KEY_CLAIMS],
+            args=[now or time.time(), self.CLAIM_TIMEOUT, self.CACHE_TIMEOUT, *ranked_codes],
+        )
+        return [code.decode() if isinstance(code, bytes) else code for code in claimed]
 
-    def _get_cached_top30(self):
-        """Redis에서 이전에 분석했던 Top 30 종목 코드 집합(Set)을 가져온다."""
-        cached_data = cache.get(self.CACHE_KEY_TOP30)
-        if cached_data is None:
-            return set()
-        return cached_data
+    def _mark_analyzed(self, codes):
+        """분석 완료 종목을 analyzed SET에 추가하고 선점 해제"""
+        pipe = self._redis().pipeline()
+        pipe.sadd(self.KEY_ANALYZED, *codes)
+        pipe.expire(self.KEY_ANALYZED, self.CACHE_TIMEOUT)
+        pipe.zrem(self.KEY_CLAIMS, *codes)
+        pipe.execute()
 
-    def _update_cached_top30(self, stock_codes_list):
-        """새로운 Top 30 리스트로 캐시를 갱신한다."""
-        cache.set(self.CACHE_KEY_TOP30, set(stock_codes_list), self.CACHE_TIMEOUT)
+    def _release_claims(self, codes):
+        """분석 실패 종목은 선점만 해제 -> 다음 루프때 다시 시도"""
+        self._redis().zrem(self.KEY_CLAIMS, *codes)
 
     async def detect_and_process_changes(self, current_rank_data):
         """
@@ -44,21 +112,25 @@ class ThemeSyncService:
         if not current_rank_data:
             return []
 
-        # 1. Diff Calculation
-        current_codes = {item['stck_shrn_iscd'] for item in current_rank_data if 'stck_shrn_iscd' in item}
-        cached_codes = self._get_cached_top30()
-        
-        new_entrants_codes = current_codes - cached_codes
+        # 0. 순위 변동 이벤트 발행 (진입/이탈/순위 상승·하락/등락률 변동 -> Redis Stream + 히트맵)
+        await self.rank_stream.publish(current_rank_data)
+
+        # 1. Diff & Claim (Redis 1회 왕복: Top 30 ZSET 갱신 + 미분석 종목 선점)
+        ranked_codes = []
+        for item in current_rank_data:
+            code = item.get('stck_shrn_iscd')
+            if code and code not in ranked_codes:
+                ranked_codes.append(code)
+        new_entrants_codes = await sync_to_async(self._claim_new_entrants, thread_sensitive=False)(ranked_codes)
         
         if not new_entrants_codes:
-            # 변경 없음
+            # 변경 없음 (또는 다른 워커가 이미 처리 중)
             return []
 
         # [Cold Start Check]
         from datetime import date
         today = date.today()
         # Sync-to-Async DB check
-        from asgiref.sync import sync_to_async
         themes_exist = await sync_to_async(Theme.objects.filter(date=today).exists)()
 
         if not themes_exist:
@@ -66,8 +138,8 @@ class ThemeSyncService:
             await self.analyze_service.analyze_and_save_themes()
             
             # Update cache with ALL current codes (since we just analyzed them all)
-            all_current_codes = {item['stck_shrn_iscd'] for item in current_rank_data if 'stck_shrn_iscd' in item}
-            self._update_cached_top30(all_current_codes)
+            all_current_codes = set(ranked_codes)
+            await sync_to_async(self._mark_analyzed, thread_sensitive=False)(ranked_codes)
             
             # Broadcast Refresh
             from channels.layers import get_channel_layer
@@ -83,32 +155,38 @@ class ThemeSyncService:
 
         logger.info(f"[ThemeSync] New entrants detected: {new_entrants_codes}")
         
-        processed_stocks = []
-        
         # 2. Process New Entrants
         # 한꺼번에 너무 많이 요청하면 LLM 부하가 걸리므로, 최대 5개까지만 처리 (Throttling)
-        targets_to_process = list(new_entrants_codes)[:5] 
+        # 순위가 높은 종목(가장 크게 움직인 종목)부터 분석 (선점 결과가 이미 순위 순)
+        targets_to_process = new_entrants_codes[:5]
+        # 이번에 처리하지 않는 종목은 선점 해제 -> 다음 루프때 다시 시도
+        if new_entrants_codes[5:]:
+            await sync_to_async(self._release_claims, thread_sensitive=False)(new_entrants_codes[5:])
         
         # Mapping for quick access
         code_to_data = {item['stck_shrn_iscd']: item for item in current_rank_data}
 
-        for code in targets_to_process:
-            stock_data = code_to_data.get(code)
-            name = stock_data.get('hts_kor_isnm', 'Unknown')
-            
-            # 3. Incremental Analysis (LLM)
-            # 기존 analyze_service에 'analyze_single_stock' 메서드를 추가해야 함.
-            success = await self.analyze_service.analyze_single_stock_incremental(code, name)
-            
-            if success:
-                processed_stocks.append(code)
+        # 3. Incremental Analysis (LLM) - 이번 주기 신규 진입 종목을 1회 호출로 일괄 분류
+        try:
+            results = await self.analyze_service.analyze_stocks_incremental([
+                (code, code_to_data.get(code, {}).get('hts_kor_isnm', 'Unknown'))
+                for code in targets_to_process
+            ])
+        except Exception as e:
+            # 예외로 빠져나가도 선점은 해제 (10분 만료를 기다리지 않고 다음 루프때 재시도)
+            logger.error(f"[ThemeSync] Incremental analysis error: {e}")
+            results = {}
+        processed_stocks = [code for code in targets_to_process if results.get(code)]
                 
-        # 4. Update Cache (성공한 것들만 캐시에 추가하여 다음번에 중복 분석 방지)
-        # 실패한 종목은 캐시에 넣지 않음 -> 다음 루프때 다시 시도.
+        # 4. Update Cache (성공한 것들만 analyzed SET에 추가하여 다음번에 중복 분석 방지)
+        # 실패한 종목은 선점만 해제 -> 다음 루프때 다시 시도.
         # 단, 계속 실패하면 무한 루프 돌 수 있으므로 별도 '실패 캐시' 관리 필요하지만 일단 단순화.
+        failed_stocks = [code for code in targets_to_process if code not in processed_stocks]
+        if failed_stocks:
+            await sync_to_async(self._release_claims, thread_sensitive=False)(failed_stocks)
+
         if processed_stocks:
-            updated_cache = cached_codes.union(set(processed_stocks))
-            self._update_cached_top30(updated_cache)
+            await sync_to_async(self._mark_analyzed, thread_sensitive=False)(processed_stocks)
             logger.info(f"[ThemeSync] Successfully processed & cached: {processed_stocks}")
             
             # 5. Broadcast Update to WebSocket (Global Group)
@@ -28,7 +28,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
         // Use Top 30 List from Server if available (Preferred)
         if (top30List && top30List.length > 0) {
-            top30List.forEach(item => {
+            top30List.forEach((item, idx) => {
                 const code = item.code;
                 const name = item.name;
                 const rate = item.rate;
@@ -37,6 +37,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 const block = document.createElement('div');
                 block.className = 'mini-block';
                 block.id = `mini-block-${code}`;
+                block.dataset.rank = idx + 1;
                 block.innerHTML = `
                     <div class="code" id="mini-name-${code}">${name}</div>
                     <div class="rate" id="mini-rate-${code}">${rate}%</div>
@@ -107,22 +108,31 @@ document.addEventListener('DOMContentLoaded', () => {
 
     if (isMarketOpen) {
         const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
-        const wsUrl = `${protocol}//${window.location.host}/ws/stock/`;
+        // Compact 모드: 필드명 없는 위치 배열로 수신 (종목 수가 많아 전송량 절감)
+        const wsUrl = `${protocol}//${window.location.host}/ws/stock/?format=compact`;
         const socket = new WebSocket(wsUrl);
+        let schema = null;
 
         socket.onopen = function (e) {
             console.log("[WS] Connected");
             if (targetStockCodes.length > 0) {
-                targetStockCodes.forEach(code => {
-                    socket.send(JSON.stringify({ 'type': 'subscribe', 'code': code }));
-                });
+                socket.send(JSON.stringify({ 'type': 'subscribe', 'data': { 'codes': targetStockCodes } }));
             }
         };
 
         socket.onmessage = function (e) {
             const data = JSON.parse(e.data);
-            if (data.type === 'stock_update') {
-                updateStockBlock(data.data);
+            if (Array.isArray(data)) {
+                data.forEach(row => {
+                    // 히트맵은 체결(E) 레코드만 사용
+                    if (row[0] !== 'E') return;
+                    const record = StockUtils.decodeCompact(schema, row);
+                    if (record) updateStockBlock(record);
+                });
+            } else if (data.type === 'schema') {
+                schema = data.fields;
+            } else if (data.type === 'rank_update') {
+                applyRankEvents(data.events || []);
             } else if (data.type === 'theme_update') {
                 console.log("[WS] Theme Update Received! Reloading...", data);
                 // Simple sync strategy: Reload page to fetch new structure
@@ -134,13 +144,11 @@ document.addEventListener('DOMContentLoaded', () => {
         console.log("[WS] Market is Closed. WebSocket connection skipped.");
     }
 
-    function updateStockBlock(data) {
-        const code = data.stock_code;
-        const priceData = data.output;
-        if (!priceData) return;
-
-        const rate = parseFloat(priceData.prdy_ctrt);
-        const volume = parseInt(priceData.acml_vol);
+    function updateStockBlock(record) {
+        const code = record.MKSC_SHRN_ISCD;
+        const rate = parseFloat(record.PRDY_CTRT);
+        const volume = parseInt(record.ACML_VOL);
+        if (!code || isNaN(rate)) return;
 
         document.querySelectorAll(`#rate-${code}`).forEach(el => {
             el.textContent = `${rate > 0 ? '+' : ''}${rate}%`;
@@ -156,6 +164,46 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
+    // [Rank Stream] Top 30 전체를 다시 그리지 않고 변동분(진입/이탈/순위 이동/등락률 변동)만 반영
+    function applyRankEvents(events) {
+        if (!leftPanelContainer || events.length === 0) return;
+
+        events.forEach(ev => {
+            let block = document.getElementById(`mini-block-${ev.code}`);
+
+            if (ev.event === 'exited') {
+                if (block) block.remove();
+                return;
+            }
+
+            if (!block) {
+                block = document.createElement('div');
+                block.className = 'mini-block';
+                block.id = `mini-block-${ev.code}`;
+                block.innerHTML = `
+                    <div class="code" id="mini-name-${ev.code}">${ev.name}</div>
+                    <div class="rate" id="mini-rate-${ev.code}"></div>
+                `;
+                leftPanelContainer.appendChild(block);
+            }
+            block.dataset.rank = ev.rank;
+
+            if (ev.rate !== null) {
+                document.getElementById(`mini-rate-${ev.code}`).textContent = `${ev.rate > 0 ? '+' : ''}${ev.rate.toFixed(2)}%`;
+                updateBlockStyle(block, ev.rate, 0);
+            }
+        });
+
+        // 순위 순서로 재배치 (순위 정보가 없는 기존 블록은 현재 위치 유지)
+        const blocks = Array.from(leftPanelContainer.children);
+        blocks.forEach((block, idx) => {
+            if (!block.dataset.rank) block.dataset.rank = idx + 1;
+        });
+        blocks
+            .sort((a, b) => parseInt(a.dataset.rank) - parseInt(b.dataset.rank))
+            .forEach(block => leftPanelContainer.appendChild(block));
+    }
+
     function updateBlockStyle(element, rate, volume) {
         element.classList.remove('bg-up-1', 'bg-up-2', 'bg-up-3', 'bg-up-4', 'bg-down-1', 'bg-down-2');
         if (rate >= 15) element.classList.add('bg-up-4');
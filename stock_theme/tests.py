@@ -1,10 +1,25 @@
-from django.test import TestCase, Client
+from django.test import TestCase, SimpleTestCase, Client
 from django.urls import reverse
-from unittest.mock import patch, AsyncMock
+from unittest import skipUnless
+from unittest.mock import patch, AsyncMock, MagicMock
 from datetime import date, timedelta
 from .models import Theme, ThemeStock
+from .services.poll_scheduler import AdaptivePollScheduler
+from .services.rank_diff import build_snapshot, diff_rankings, RankChangeStream
+from .services.news_collector import NewsCollector, fallback_headlines
+from .services.news_cache import NewsCache
+from .services.analyze_service import ThemeAnalyzeService
+from .services.llm_client import JSONArrayStreamParser, LLMClient
+from .services.decision_cache import headline_fingerprint
+from .services.sync_service import ThemeSyncService
+from django.core.cache import cache
 from stock_price.models import StockInfo
+import os
+import time
 import json
+import asyncio
+import httpx
+from asgiref.sync import async_to_sync, sync_to_async
 
 class StockThemeViewTests(TestCase):
     def setUp(self):
@@ -167,3 +182,507 @@ class StockThemeViewTests(TestCase):
              print("[TEST] Invalid date handled with status:", response.status_code)
         
         # Note: If this fails, we need to fix the view to wrap filter in try-except.
+
+
+class AdaptivePollSchedulerTest(SimpleTestCase):
+    def test_interval_follows_churn(self):
+        """
+        [Service] Top 30 변동이 크면 주기가 짧아지고, 안정되면 최대 주기까지 늘어나는지 테스트
+        """
+        scheduler = AdaptivePollScheduler(min_interval=15, max_interval=120, budget_per_hour=1000)
+        codes = [f"{n:06d}" for n in range(30)]
+
+        scheduler.observe(codes)
+        self.assertEqual(scheduler.next_interval(), 15)
+
+        # 30종목 중 12종목 교체 (40%) -> 최소 주기 유지
+        scheduler.observe(codes[12:] + [f"{n:06d}" for n in range(100, 112)])
+        self.assertEqual(scheduler.next_interval(), 15)
+
+        # 변화 없음이 이어지면 최대 주기로 수렴
+        for _ in range(10):
+            scheduler.observe(codes[12:] + [f"{n:06d}" for n in range(100, 112)])
+        self.assertGreater(scheduler.next_interval(), 110)
+        print("[TEST] 변동률 기반 조회 주기 확인")
+
+    def test_budget_caps_fetch_rate(self):
+        """
+        [Edge Case] 시간당 조회 예산(버킷)을 다 쓰면 변동률이 높아도 다음 토큰이 찰 때까지 주기를 늘리는지 테스트
+        """
+        scheduler = AdaptivePollScheduler(min_interval=15, max_interval=120, budget_per_hour=3, burst=3)
+        for n in range(3):
+            scheduler.observe([f"{n:06d}"])
+
+        self.assertAlmostEqual(scheduler.next_interval(), 1200, delta=1)
+        print("[TEST] 조회 예산 제한 확인")
+
+    def test_budget_is_paced_not_blocked(self):
+        """
+        [Edge Case] 장 초반 최소 주기로 버킷을 다 써도 1시간 창이 지날 때까지 멈추지 않고 충전 속도(60초)로 계속 조회하는지 테스트
+        """
+        scheduler = AdaptivePollScheduler(min_interval=15, max_interval=120, budget_per_hour=60, burst=5)
+        for n in range(5):
+            scheduler.observe([f"{n:06d}"])
+
+        # 버킷 소진 후에도 약 45분이 아니라 토큰 1개 충전 시간(3600/60 = 60초)만 대기
+        self.assertAlmostEqual(scheduler.next_interval(), 60, delta=1)
+        asyncio.run(scheduler.publish())
+        self.assertEqual(cache.get(AdaptivePollScheduler.METRICS_KEY)["budget_per_hour"], 60)
+        print("[TEST] 조회 예산 분산 확인")
+
+
+class RankDiffTest(SimpleTestCase):
+    def _rank(self, *rows):
+        return [{'stck_shrn_iscd': code, 'hts_kor_isnm': code, 'prdy_ctrt': rate, 'stck_prpr': '1000'} for code, rate in rows]
+
+    def test_diff_emits_ordered_events(self):
+        """
+        [Service] 연속된 순위 스냅샷에서 진입/이탈/순위 이동/등락률 변동 이벤트를 변동폭 순으로 만드는지 테스트
+        """
+        previous = build_snapshot(self._rank(('A', '20.0'), ('B', '15.0'), ('C', '10.0'), ('D', '8.0'), ('E', '5.0')))
+        current = build_snapshot(self._rank(('A', '22.0'), ('D', '16.0'), ('B', '14.5'), ('C', '9.0'), ('F', '7.0')))
+
+        events = diff_rankings(previous, current)
+        summary = [(ev['event'], ev['code'], ev['prev_rank'], ev['rank']) for ev in events]
+
+        self.assertEqual(summary, [
+            ('entered', 'F', None, 5),
+            ('moved_up', 'D', 4, 2),
+            ('moved_down', 'B', 2, 3),
+            ('moved_down', 'C', 3, 4),
+            ('rate_changed', 'A', 1, 1),
+            ('exited', 'E', 5, None),
+        ])
+        print("[TEST] 순위 변동 이벤트 확인")
+
+    def test_publish_survives_redis_and_channel_errors(self):
+        """[Edge Case] 스냅샷/브로드캐스트 오류가 나도 publish가 예외를 던지지 않음 (sync 루프 유지)"""
+        stream = RankChangeStream()
+        rank_data = [
+            {'stck_shrn_iscd': 'A', 'hts_kor_isnm': 'A', 'prdy_ctrt': '10.0'},
+            {'stck_shrn_iscd': 'B', 'hts_kor_isnm': 'B', 'prdy_ctrt': '9.0'},
+        ]
+
+        # Redis 장애: 비교 기준이 없으므로 이벤트 없음
+        with patch.object(stream, '_redis', side_effect=ConnectionError("redis down")):
+            self.assertEqual(async_to_sync(stream.publish)(rank_data), [])
+
+        # 스냅샷 교체는 성공했지만 Stream 기록/그룹 전송이 실패: 이벤트는 그대로 반환
+        previous = build_snapshot(rank_data[:1])
+        layer = MagicMock()
+        layer.group_send = AsyncMock(side_effect=RuntimeError("channel layer down"))
+        with patch.object(stream, '_swap_snapshot', return_value=previous), \
+             patch.object(stream, '_append_to_stream', side_effect=ConnectionError("redis down")), \
+             patch('channels.layers.get_channel_layer', return_value=layer):
+            events = async_to_sync(stream.publish)(rank_data)
+
+        self.assertEqual([(e['event'], e['code']) for e in events], [('entered', 'B')])
+        layer.group_send.assert_awaited_once()
+        print("[TEST] publish 오류 격리 확인")
+
+
+class NewsCollectorTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    class FakeLimiter:
+        """네이버 API 대신 0.1초 뒤 검색어를 제목으로 돌려주는 가짜 유량 제어기"""
+        def __init__(self):
+            self.calls = 0
+
+        async def request(self, client, method, url, params=None, headers=None):
+            self.calls += 1
+            await asyncio.sleep(0.1)
+            title = f"<b>{params['query']}</b> {params['sort']}"
+            return httpx.Response(200, json={"items": [{"title": title, "description": ""}]})
+
+    @patch.dict(os.environ, {"naver_client_id": "id", "naver_secret": "secret"})
+    def test_collect_many_runs_in_parallel(self):
+        """
+        [Service] 여러 종목 뉴스를 병렬로 수집하고, 입력 순서대로 결과를 돌려주는지 테스트
+        """
+        limiter = self.FakeLimiter()
+        collector = NewsCollector(rate_limiter=limiter, news_cache=NewsCache())
+        names = [f"종목{n}" for n in range(10)]
+
+        async def run():
+            try:
+                return await collector.collect_many(names)
+            finally:
+                await collector.aclose()
+
+        started = time.monotonic()
+        results = asyncio.run(run())
+        elapsed = time.monotonic() - started
+
+        self.assertEqual(limiter.calls, 20)
+        self.assertEqual(results[3], ["종목3 sim", "종목3 date"])
+        self.assertLess(elapsed, 1.0)  # 순차 수집이었다면 2초 이상
+        print(f"[TEST] 뉴스 병렬 수집 확인 ({elapsed:.2f}s)")
+
+    def test_news_cache_serves_repeat_and_merges_newer(self):
+        """
+        [Service] 신선도 안의 재조회는 API를 호출하지 않고, 만료 후에는 마지막 pubDate 이후 기사만 추가하는지 테스트
+        """
+        news_cache = NewsCache()
+        responses = [
+            [{"title": "A 공시", "pub_date": "Mon, 19 Oct 2026 09:00:00 +0900"},
+             {"title": "B 수주", "pub_date": "Mon, 19 Oct 2026 08:00:00 +0900"}],
+            [{"title": "C 급등", "pub_date": "Mon, 19 Oct 2026 09:30:00 +0900"},
+             {"title": "A 공시", "pub_date": "Mon, 19 Oct 2026 09:00:00 +0900"},
+             {"title": "D 과거", "pub_date": "Mon, 19 Oct 2026 07:00:00 +0900"}],
+        ]
+        calls = []
+
+        async def search(query, display, sort):
+            calls.append(query)
+            return responses[len(calls) - 1]
+
+        async def run():
+            first = await news_cache.get_or_fetch("삼성전자", "date", 3, search)
+            repeat = await news_cache.get_or_fetch("삼성전자", "date", 3, search)
+            # 신선도 만료 처리
+            key = NewsCache.make_key("삼성전자", "date")
+            news_cache._memory[key]["fetched_at"] -= 3600
+            refreshed = await news_cache.get_or_fetch("삼성전자", "date", 3, search)
+            return first, repeat, refreshed
+
+        with patch.object(cache, 'get', return_value=None):
+            first, repeat, refreshed = asyncio.run(run())
+
+        self.assertEqual(first, ["A 공시", "B 수주"])
+        self.assertEqual(repeat, first)
+        self.assertEqual(len(calls), 2)
+        # 중복(A)과 마지막 pubDate 이전 기사(D)는 제외
+        self.assertEqual(refreshed, ["C 급등", "A 공시", "B 수주"])
+        print("[TEST] 뉴스 캐시 재사용/증분 병합 확인")
+
+
+@patch.dict(os.environ, {"upstage_secret_key": "test-key"})
+class BatchIncrementalAnalysisTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.theme = Theme.objects.create(name='AI 반도체 수주', description='HBM 공급 계약. 추가 설명')
+        StockInfo.objects.create(short_code='000001', name='기존종목', market='KOSPI')
+        ThemeStock.objects.create(theme=self.theme, stock=StockInfo.objects.get(short_code='000001'))
+
+    def test_batch_classifies_all_entrants_in_one_call(self):
+        """
+        [Service] 신규 진입 종목들을 LLM 1회 호출로 분류하고, 같은 신규 테마는 하나만 생성하는지 테스트
+        """
+        service = ThemeAnalyzeService()
+        decisions = [
+            {"code": "000002", "action": "JOIN", "theme_id": self.theme.id, "reason": "HBM 납품"},
+            {"code": "000003", "action": "CREATE", "new_theme_name": "원전 수출", "new_theme_desc": "체코 원전", "reason": "원전 수주"},
+            {"code": "000004", "action": "CREATE", "new_theme_name": "원전 수출", "new_theme_desc": "체코 원전", "reason": "기자재 공급"},
+            {"code": "000005", "action": "NONE"},
+        ]
+        stocks = [('000001', '기존종목'), ('000002', '종목2'), ('000003', '종목3'), ('000004', '종목4'), ('000005', '종목5')]
+
+        with patch.object(service.news_collector, 'collect_many', AsyncMock(side_effect=lambda names: [[n] for n in names])), \
+             patch.object(service, '_run_batch_classification', AsyncMock(return_value=decisions)) as mock_llm:
+            # async_to_sync: DB 작업이 테스트 트랜잭션과 같은 스레드에서 실행되도록
+            results = async_to_sync(service.analyze_stocks_incremental)(stocks)
+
+        self.assertEqual(mock_llm.call_count, 1)
+        sent_codes = [target['code'] for target in mock_llm.call_args[0][0]]
+        self.assertEqual(sent_codes, ['000002', '000003', '000004', '000005'])  # 이미 소속된 000001 제외
+        self.assertEqual(results, {'000001': True, '000002': True, '000003': True, '000004': True, '000005': False})
+
+        new_themes = Theme.objects.filter(name='원전 수출')
+        self.assertEqual(new_themes.count(), 1)
+        self.assertEqual(new_themes.first().stocks.count(), 2)
+        self.assertTrue(ThemeStock.objects.filter(theme=self.theme, stock__short_code='000002').exists())
+        print("[TEST] 신규 진입 종목 일괄 분류 확인")
+
+
+    def test_join_to_missing_theme_is_not_reported_saved(self):
+        """
+        [Edge Case] 존재하지 않는 테마 ID로 JOIN한 종목은 저장 성공으로 반환하지 않는지 테스트 (선점 해제 후 재분류)
+        """
+        service = ThemeAnalyzeService()
+        decisions = [
+            {"code": "000002", "action": "JOIN", "theme_id": self.theme.id + 999, "reason": "없는 테마"},
+            {"code": "000003", "action": "CREATE", "reason": "이름 없는 신규 테마"},
+            {"code": "000004", "action": "JOIN", "theme_id": self.theme.id, "reason": "HBM 납품"},
+        ]
+        stocks = [('000002', '종목2'), ('000003', '종목3'), ('000004', '종목4')]
+
+        with patch.object(service.news_collector, 'collect_many', AsyncMock(side_effect=lambda names: [[n] for n in names])), \
+             patch.object(service, '_run_batch_classification', AsyncMock(return_value=decisions)):
+            results = async_to_sync(service.analyze_stocks_incremental)(stocks)
+
+        self.assertEqual(results, {'000002': False, '000003': False, '000004': True})
+        self.assertFalse(ThemeStock.objects.filter(stock__short_code__in=['000002', '000003']).exists())
+        print("[TEST] 없는 테마 JOIN 저장 제외 확인")
+
+    def test_repeat_entrant_reuses_cached_decision(self):
+        """
+        [Service] 같은 뉴스 + 같은 테마 목록으로 재진입한 종목은 LLM을 다시 호출하지 않는지 테스트
+        """
+        service = ThemeAnalyzeService()
+        news = {'종목2': ['HBM 공급 계약 체결!'], '종목3': ['단순 수급']}
+
+        async def classify(targets, existing_themes_text):
+            return [{"code": target['code'], "action": "NONE"} for target in targets]
+
+        stocks = [('000002', '종목2'), ('000003', '종목3')]
+        with patch.object(service.news_collector, 'collect_many', AsyncMock(side_effect=lambda names: [news[n] for n in names])), \
+             patch.object(service, '_run_batch_classification', AsyncMock(side_effect=classify)) as mock_llm:
+            async_to_sync(service.analyze_stocks_incremental)(stocks)
+            # 표기만 다른 같은 헤드라인 -> 적중 / 새 뉴스 -> 미스
+            news['종목2'] = ['hbm 공급 계약  체결']
+            news['종목3'] = ['단순 수급', '신규 공시']
+            async_to_sync(service.analyze_stocks_incremental)(stocks)
+
+        self.assertEqual(mock_llm.call_count, 2)
+        self.assertEqual([target['code'] for target in mock_llm.call_args[0][0]], ['000003'])
+        self.assertEqual(service.decision_cache.stats(), {"hits": 1, "misses": 3, "hit_rate": 0.25})
+        self.assertEqual(headline_fingerprint(['A', 'B']), headline_fingerprint(['b ', 'a', 'A']))
+        print("[TEST] LLM 판정 캐시 재사용 확인")
+
+    def test_fallback_headlines_are_not_cached(self):
+        """
+        [Edge Case] 뉴스 수집 실패 시의 더미 헤드라인으로 내린 판정은 캐시하지 않는지 테스트
+        """
+        service = ThemeAnalyzeService()
+        stocks = [('000002', '종목2')]
+
+        async def classify(targets, existing_themes_text):
+            return [{"code": target['code'], "action": "NONE"} for target in targets]
+
+        with patch.object(service.news_collector, 'collect_many', AsyncMock(side_effect=lambda names: [fallback_headlines(n) for n in names])), \
+             patch.object(service, '_run_batch_classification', AsyncMock(side_effect=classify)) as mock_llm:
+            async_to_sync(service.analyze_stocks_incremental)(stocks)
+            async_to_sync(service.analyze_stocks_incremental)(stocks)
+
+        self.assertEqual(mock_llm.call_count, 2)
+        self.assertEqual(service.decision_cache.stats()["hits"], 0)
+        print("[TEST] 더미 뉴스 판정 캐시 제외 확인")
+
+    def test_streamed_theme_replaces_overlapping_previous_theme(self):
+        """
+        [Service] 스트리밍으로 저장된 테마가 같은 종목의 이전 테마를 즉시 교체해 두 분석이 겹쳐 보이지 않는지 테스트
+        """
+        service = ThemeAnalyzeService()
+        other = Theme.objects.create(name='조선 수주', description='LNG선')
+        StockInfo.objects.create(short_code='000009', name='조선주', market='KOSPI')
+        ThemeStock.objects.create(theme=other, stock=StockInfo.objects.get(short_code='000009'))
+        seen_during_stream = []
+
+        async def stream(messages, key):
+            yield {"name": "HBM 증설", "description": "", "stocks": [{"code": "000001", "name": "기존종목", "reason": "HBM"}]}
+            seen_during_stream.append(await sync_to_async(list)(Theme.objects.values_list('name', flat=True)))
+            yield {"name": "원전 수출", "description": "", "stocks": [{"code": "000003", "name": "종목3", "reason": "원전"}]}
+
+        with patch('stock_theme.services.analyze_service.kis_rest_client.get_fluctuation_rank',
+                   AsyncMock(return_value=[{'stck_shrn_iscd': '000001', 'hts_kor_isnm': '기존종목'}])), \
+             patch.object(service.news_collector, 'collect_many', AsyncMock(return_value=[['HBM']])), \
+             patch.object(service.llm, 'stream_json_array', stream):
+            async_to_sync(service.analyze_and_save_themes)()
+
+        # 첫 테마 저장 직후: 000001을 담던 이전 테마는 이미 교체됨, 겹치지 않는 테마만 남음
+        self.assertEqual(sorted(seen_during_stream[0]), ['HBM 증설', '조선 수주'])
+        self.assertEqual(sorted(Theme.objects.values_list('name', flat=True)), ['HBM 증설', '원전 수출'])
+        print("[TEST] 스트리밍 테마 교체 확인")
+
+class JSONArrayStreamParserTest(SimpleTestCase):
+    def test_yields_each_object_as_it_completes(self):
+        """
+        [Service] 스트리밍 조각이 임의 위치에서 잘려도 테마 객체가 완성될 때마다 하나씩 꺼내는지 테스트
+        """
+        payload = json.dumps({"themes": [
+            {"name": "원전 {수출}", "stocks": [{"code": "000001", "reason": "\"체코\" 수주"}]},
+            {"name": "AI 반도체", "stocks": []},
+        ]}, ensure_ascii=False)
+        content = "```json\n" + payload + "\n```"
+
+        parser = JSONArrayStreamParser("themes")
+        completed = []
+        for i in range(0, len(content), 7):
+            items = parser.feed(content[i:i + 7])
+            completed.append(len(items))
+            for item in items:
+                self.assertIn("name", item)
+
+        self.assertEqual(sum(completed), 2)
+        self.assertTrue(parser.done)
+        # 두 객체가 서로 다른 조각에서 완성됨 (응답 끝까지 기다리지 않음)
+        self.assertEqual([n for n in completed if n], [1, 1])
+        print("[TEST] 스트리밍 JSON 증분 파싱 확인")
+
+    def test_stalled_stream_times_out(self):
+        """
+        [Edge Case] 청크가 끊긴 스트림도 제한 시간 안에 중단되고 세마포어를 돌려주는지 테스트
+        """
+        class StalledStream:
+            close = AsyncMock()
+
+            def __aiter__(self):
+                return self
+
+            async def __anext__(self):
+                await asyncio.sleep(10)
+
+        llm = LLMClient(api_key="test-key", timeout=0.05, concurrency=1)
+        client = MagicMock()
+        client.chat.completions.create = AsyncMock(return_value=StalledStream())
+
+        async def scenario():
+            with patch.object(llm, '_get_client', return_value=client):
+                with self.assertRaises(asyncio.TimeoutError):
+                    async for _ in llm.stream_json_array([], key="themes"):
+                        pass
+            return llm._semaphore().locked()
+
+        started = time.monotonic()
+        self.assertFalse(asyncio.run(scenario()))
+        self.assertLess(time.monotonic() - started, 1)
+        StalledStream.close.assert_awaited_once()
+        print("[TEST] 멈춘 스트림 제한 시간 확인")
+
+
+def _redis_available():
+    try:
+        from django_redis import get_redis_connection
+        return bool(get_redis_connection("default").ping())
+    except Exception:
+        return False
+
+
+@skipUnless(_redis_available(), "Redis(django_redis 캐시 백엔드)가 필요한 테스트")
+class TopEntrantClaimRedisTest(SimpleTestCase):
+    """DIFF_AND_CLAIM_LUA를 실제 Redis에서 실행 (운영 키와 겹치지 않도록 test: 접두어 사용)"""
+    def setUp(self):
+        self.service = ThemeSyncService()
+        self.service.KEY_ANALYZED = "test:theme:top30:analyzed"
+        self.service.KEY_CURRENT = "test:theme:top30:current"
+        self.service.KEY_CLAIMS = "test:theme:top30:claims"
+        self.service._legacy_migrated = True
+        self.addCleanup(self.service._redis().delete,
+                        self.service.KEY_ANALYZED, self.service.KEY_CURRENT, self.service.KEY_CLAIMS)
+
+    def test_second_claim_claims_nothing(self):
+        """
+        [Service] 같은 종목을 두 번째로 선점하려 하면 아무것도 선점하지 못하는지 테스트 (워커 간 중복 분석 방지)
+        """
+        self.assertEqual(self.service._claim_new_entrants(['000001', '000002']), ['000001', '000002'])
+        self.assertEqual(self.service._claim_new_entrants(['000002', '000001']), [])
+        ranking = self.service._redis().zrange(self.service.KEY_CURRENT, 0, -1)
+        self.assertEqual([code.decode() for code in ranking], ['000002', '000001'])
+        print("[TEST] 중복 선점 방지 확인")
+
+    def test_analyzed_codes_are_skipped(self):
+        """
+        [Service] 분석 완료(analyzed) 종목은 선점 대상에서 빠지는지 테스트
+        """
+        self.service._claim_new_entrants(['000001'])
+        self.service._mark_analyzed(['000001'])
+
+        self.assertEqual(self.service._claim_new_entrants(['000003', '000001']), ['000003'])
+        self.assertIsNone(self.service._redis().zscore(self.service.KEY_CLAIMS, '000001'))
+        print("[TEST] 분석 완료 종목 제외 확인")
+
+    def test_expired_and_released_claims_are_reclaimed(self):
+        """
+        [Edge Case] 선점 만료 또는 선점 해제된 종목은 다시 선점되는지 테스트
+        """
+        now = time.time()
+        self.assertEqual(self.service._claim_new_entrants(['000001', '000002'], now=now), ['000001', '000002'])
+
+        self.service._release_claims(['000002'])
+        self.assertEqual(self.service._claim_new_entrants(['000001', '000002'], now=now + 1), ['000002'])
+
+        later = now + ThemeSyncService.CLAIM_TIMEOUT + 1
+        self.assertEqual(self.service._claim_new_entrants(['000001'], now=later), ['000001'])
+        print("[TEST] 만료/해제된 선점 재선점 확인")
+
+
+@skipUnless(_redis_available(), "Redis(django_redis 캐시 백엔드)가 필요한 테스트")
+class RankSnapshotSwapRedisTest(SimpleTestCase):
+    """RankChangeStream 직전 스냅샷 교체를 실제 Redis에서 실행"""
+    def setUp(self):
+        self.stream = RankChangeStream()
+        self.stream.SNAPSHOT_KEY = "test:theme:rank_snapshot"
+        self.addCleanup(self.stream._redis().delete, self.stream.SNAPSHOT_KEY)
+
+    def test_each_swap_returns_the_snapshot_it_replaced(self):
+        """
+        [Service] 워커 여러 개가 번갈아 교체해도 각 교체는 바로 앞 스냅샷을 돌려받는지 테스트 (이벤트 중복 방지)
+        """
+        first = {'A': {"rank": 1, "name": "A", "rate": 1.0, "price": "100"}}
+        second = {'B': {"rank": 1, "name": "B", "rate": 2.0, "price": "200"}}
+        other_worker = RankChangeStream()
+        other_worker.SNAPSHOT_KEY = self.stream.SNAPSHOT_KEY
+
+        self.assertIsNone(self.stream._swap_snapshot(first))
+        self.assertEqual(other_worker._swap_snapshot(second), first)
+        self.assertEqual(self.stream._swap_snapshot(first), second)
+        print("[TEST] 스냅샷 교체 확인")
+
+
+@patch.dict(os.environ, {"upstage_secret_key": "test-key"})
+class DetectAndProcessChangesTest(TestCase):
+    def test_deferred_and_failed_claims_are_released(self):
+        """
+        [Service] 처리 한도(5개)를 넘어 미룬 종목과 분석에 실패한 종목은 선점을 해제하고, 성공한 종목만 analyzed에 기록하는지 테스트
+        """
+        Theme.objects.create(name='AI 반도체 수주', description='HBM')
+        service = ThemeSyncService()
+        codes = [f"{n:06d}" for n in range(1, 8)]
+        ranks = [{'stck_shrn_iscd': code, 'hts_kor_isnm': f"종목{code}"} for code in codes]
+        succeeded = {'000001': True, '000002': False, '000003': True, '000004': True, '000005': False}
+
+        claim, release, mark = MagicMock(return_value=codes), MagicMock(), MagicMock()
+        with patch.object(service.rank_stream, 'publish', AsyncMock(return_value=[])), \
+             patch.object(service, '_claim_new_entrants', claim), \
+             patch.object(service, '_release_claims', release), \
+             patch.object(service, '_mark_analyzed', mark), \
+             patch.object(service.analyze_service, 'analyze_stocks_incremental', AsyncMock(return_value=succeeded)):
+            processed = async_to_sync(service.detect_and_process_changes)(ranks)
+
+        self.assertEqual(processed, ['000001', '000003', '000004'])
+        claim.assert_called_once_with(codes)
+        released = [call.args[0] for call in release.call_args_list]
+        self.assertEqual(released, [['000006', '000007'], ['000002', '000005']])
+        mark.assert_called_once_with(['000001', '000003', '000004'])
+        print("[TEST] 미처리/실패 종목 선점 해제 확인")
+
+    def test_analysis_error_releases_all_claims(self):
+        """
+        [Edge Case] 분석 중 예외가 나도 선점한 종목을 모두 해제하는지 테스트
+        """
+        Theme.objects.create(name='AI 반도체 수주', description='HBM')
+        service = ThemeSyncService()
+        codes = ['000001', '000002']
+        ranks = [{'stck_shrn_iscd': code, 'hts_kor_isnm': code} for code in codes]
+
+        release = MagicMock()
+        with patch.object(service.rank_stream, 'publish', AsyncMock(return_value=[])), \
+             patch.object(service, '_claim_new_entrants', MagicMock(return_value=codes)), \
+             patch.object(service, '_release_claims', release), \
+             patch.object(service, '_mark_analyzed', MagicMock()) as mark, \
+             patch.object(service.analyze_service, 'analyze_stocks_incremental', AsyncMock(side_effect=RuntimeError("LLM down"))):
+            processed = async_to_sync(service.detect_and_process_changes)(ranks)
+
+        self.assertEqual(processed, [])
+        release.assert_called_once_with(codes)
+        mark.assert_not_called()
+        print("[TEST] 분석 예외 시 선점 해제 확인")
+
+    def test_legacy_top30_key_is_migrated_and_deleted(self):
+        """
+        [Edge Case] 이전 버전의 theme:current_top_30 (pickle set)을 analyzed SET으로 옮기고 삭제하는지 테스트
+        """
+        cache.set(ThemeSyncService.LEGACY_KEY_TOP30, {'000001', '000002'})
+        service = ThemeSyncService()
+        redis = MagicMock()
+
+        with patch.object(service, '_redis', return_value=redis):
+            service._migrate_legacy_top30()
+
+        pipe = redis.pipeline.return_value
+        self.assertEqual(pipe.sadd.call_args.args[0], ThemeSyncService.KEY_ANALYZED)
+        self.assertEqual(set(pipe.sadd.call_args.args[1:]), {'000001', '000002'})
+        self.assertIsNone(cache.get(ThemeSyncService.LEGACY_KEY_TOP30))
+        print("[TEST] 이전 Top 30 캐시 키 이전 확인")
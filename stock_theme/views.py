@@ -8,6 +8,7 @@ import asyncio
 from django.db.models import Count
 
 from stock_price.services.kis_rest_client import kis_rest_client
+from stock_price.services.kis_snapshot import snapshot_store
 from stock_price.utils import is_market_open, is_market_open_async
 
 import time
@@ -101,21 +102,25 @@ class ThemeHeatmapView(View):
         latest_themes, stock_codes = await get_theme_data()
         logger.info(f"[ThemeHeatmapView] DB Fetch took {time.time() - step1_start:.4f}s")
         
-        # 3. Parallel Execution: Rank API + All Theme Stocks Price API + Market Status
+        # 3. Last-Value Cache: 실시간 수집 중인 종목은 REST 호출 없이 스냅샷 사용
+        snapshots = await snapshot_store.get_many(list(stock_codes))
+        missing_codes = [code for code in stock_codes if 'exec' not in snapshots.get(code, {})]
+
+        # 4. Parallel Execution: Rank API + Missing Theme Stocks Price API + Market Status
         step2_start = time.time()
         
         task_rank = asyncio.create_task(kis_rest_client.get_fluctuation_rank())
-        task_prices = asyncio.create_task(kis_rest_client.fetch_prices_batch(list(stock_codes)))
+        task_prices = asyncio.create_task(kis_rest_client.fetch_prices_batch(missing_codes))
         task_market = asyncio.create_task(is_market_open_async())
         
         rank_data, batch_prices, is_open = await asyncio.gather(task_rank, task_prices, task_market)
-        logger.info(f"[ThemeHeatmapView] Parallel API Fetch (Rank + {len(stock_codes)} Stocks + MarketStatus) took {time.time() - step2_start:.4f}s")
+        logger.info(f"[ThemeHeatmapView] Parallel API Fetch (Rank + {len(missing_codes)}/{len(stock_codes)} Stocks + MarketStatus) took {time.time() - step2_start:.4f}s")
         
-        # 4. Merge Data
+        # 5. Merge Data
         top_30_list = []
         initial_price_data = {}
         
-        # 4-1. Process Rank Data (For Top 30 List + identifying overlapping stocks)
+        # 5-1. Process Rank Data (For Top 30 List + identifying overlapping stocks)
         if rank_data:
             for item in rank_data:
                 code = item.get('stck_shrt_cd') or item.get('STCK_SHRT_CD') or item.get('stck_shrn_iscd') or item.get('STCK_SHRN_ISCD')
@@ -139,7 +144,7 @@ class ThemeHeatmapView(View):
                             'volume': '0' # Rank API might not give volume in same format, or we ignore
                         }
         
-        # 4-2. Process Batch Price Data (Fill in the rest or overwrite)
+        # 5-2. Process Batch Price Data (Fill in the rest or overwrite)
         if batch_prices:
             for code, data in batch_prices.items():
                 # If we prefer the dedicated price API data (usually more detailed), execute this:
@@ -152,7 +157,18 @@ class ThemeHeatmapView(View):
                     'volume': data.get('acml_vol', '0'),
                 }
 
-        # 5. Build Context & Return Response
+        # 5-3. Process Snapshot Data (실시간 체결 스냅샷이 가장 최신)
+        for code, snapshot in snapshots.items():
+            record = snapshot.get('exec')
+            if not record:
+                continue
+            initial_price_data[code] = {
+                'rate': f"{record.get('PRDY_CTRT') or 0:.2f}",
+                'current_price': f"{record.get('STCK_PRPR') or 0:.0f}",
+                'volume': f"{record.get('ACML_VOL') or 0:.0f}",
+            }
+
+        # 6. Build Context & Return Response
         context = {
             'themes': latest_themes,
             'is_market_open': is_open,